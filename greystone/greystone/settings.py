@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'quotes.instrumentation.QueryStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -86,6 +87,68 @@ DATABASES = {
     }
 }
 
+# Production SQLite profile (QUOTES_SQLITE_PROFILE=production): WAL and
+# tuned pragmas, write transactions that wait for the lock up front and
+# retried lock errors (see quotes/backends/sqlite3/base.py).  It leaves
+# quote recomputes synchronous; to funnel them through a single
+# 'run_quote_worker --processes 1' as well, also set
+# QUOTES_RECOMPUTE_IN_BACKGROUND=1.  Compare the setups with
+# 'manage.py bench_sqlite_writers'.
+
+QUOTES_SQLITE_PROFILE = os.environ.get('QUOTES_SQLITE_PROFILE', 'default')
+QUOTES_SQLITE_PRODUCTION_OPTIONS = {
+    # Seconds a connection waits for the write lock.
+    'timeout': 20,
+    'lock_retries': 5,
+    'pragmas': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        # Negative: KiB, so 64 MiB of page cache per connection.
+        'cache_size': -64000,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    },
+}
+
+if QUOTES_SQLITE_PROFILE == 'production':
+    DATABASES['default'].update({
+        'ENGINE': 'quotes.backends.sqlite3',
+        'OPTIONS': QUOTES_SQLITE_PRODUCTION_OPTIONS,
+    })
+
+
+# Caches
+# https://docs.djangoproject.com/en/2.0/topics/cache/
+#
+# The 'quotes' cache holds rendered quote pages and API payloads (see
+# quotes/cache.py).  The local-memory backend is per process; use the
+# file backend when several processes serve requests so invalidations
+# reach all of them.
+
+QUOTES_CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'quotes': {
+        'BACKEND': QUOTES_CACHE_BACKENDS[
+            os.environ.get('QUOTES_CACHE_BACKEND', 'locmem')
+        ],
+        'LOCATION': os.environ.get(
+            'QUOTES_CACHE_LOCATION',
+            os.path.join(BASE_DIR, '.quotes-cache')
+        ),
+        'TIMEOUT': int(os.environ.get('QUOTES_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
@@ -136,4 +199,29 @@ REST_FRAMEWORK = {
 }
 
 
+# Debt rate (see quotes/rates.py).  The rate curve table is used when it
+# has rows in effect, the base rate plus spread otherwise.  After the
+# rates change, reprice stored quotes with 'manage.py requote_all'.
+
+QUOTES_RATE_SOURCE = os.environ.get(
+    'QUOTES_RATE_SOURCE', 'quotes.rates.curve_rate'
+)
+QUOTES_BASE_RATE = float(os.environ.get('QUOTES_BASE_RATE', 2.98))
+QUOTES_RATE_SPREAD = float(os.environ.get('QUOTES_RATE_SPREAD', 2.00))
+QUOTES_RATE_CURVE_TTL = int(os.environ.get('QUOTES_RATE_CURVE_TTL', 60))
+
+
+# Background jobs (see quotes/jobs.py), run by 'manage.py run_quote_worker'.
+# With QUOTES_RECOMPUTE_IN_BACKGROUND, quotes touched by an edit are
+# requoted by the worker instead of before the response is sent.
+
+QUOTES_RECOMPUTE_IN_BACKGROUND = \
+    os.environ.get('QUOTES_RECOMPUTE_IN_BACKGROUND', '') == '1'
+QUOTES_JOB_STALE_AFTER = int(os.environ.get('QUOTES_JOB_STALE_AFTER', 600))
+
+
+# Request instrumentation (see quotes/instrumentation.py)
 
+QUOTES_STATS_SAMPLE_RATE = float(
+    os.environ.get('QUOTES_STATS_SAMPLE_RATE', 0.1)
+)
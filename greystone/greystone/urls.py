@@ -23,6 +23,7 @@ from rest_framework import routers
 from rest_framework.urlpatterns import format_suffix_patterns
 
 from quotes import views
+from quotes.instrumentation import metrics_view
 
 
 router = routers.DefaultRouter()
@@ -30,6 +31,7 @@ router.register(r'addresses', views.AddressesViewSet)
 router.register(r'rent', views.RentViewSet)
 router.register(r'expense', views.ExpenseViewSet)
 router.register(r'caprate', views.CapRateViewSet)
+router.register(r'results', views.ResultViewSet)
 
 
 urlpatterns = [
@@ -41,6 +43,56 @@ urlpatterns = [
     path('api-auth/', 
         include('rest_framework.urls')
     ),
+    path(
+        'api/rent-roll/import/',
+        views.RentRollImportView.as_view(),
+        name='rent_roll_import'
+    ),
+    path(
+        'api/addresses/<int:pk>/rent-roll/',
+        views.RentRollView.as_view(),
+        name='rent_roll'
+    ),
+    path(
+        'api/quotes/',
+        views.QuoteCreateView.as_view(),
+        name='quote_create'
+    ),
+    path(
+        'api/what-if/',
+        views.WhatIfView.as_view(),
+        name='what_if'
+    ),
+    path(
+        'api/requote-all/',
+        views.RequoteAllView.as_view(),
+        name='requote_all'
+    ),
+    path(
+        'api/jobs/<int:pk>/',
+        views.JobView.as_view(),
+        name='job_status'
+    ),
+    path(
+        'api/portfolio/',
+        views.PortfolioSummaryView.as_view(),
+        name='portfolio_summary'
+    ),
+    path(
+        'api/sensitivity/',
+        views.SensitivityView.as_view(),
+        name='sensitivity'
+    ),
+    path(
+        'export/quotes.<str:export_format>',
+        views.QuoteExportView.as_view(),
+        name='quote_export'
+    ),
+    path(
+        'metrics/',
+        metrics_view,
+        name='metrics'
+    ),
     path(
         'address-list/', 
         views.AddressListView.as_view(),
@@ -96,6 +148,11 @@ urlpatterns = [
         views.RentDeleteView.as_view(),
         name='rent_delete'
     ),
+    path(
+        'rent-roll/<int:pk>/',
+        views.RentRollEditView.as_view(),
+        name='rent_roll_edit'
+    ),
     path(
         'rent-duplicate/', 
         views.RentDuplicateView.as_view(),
@@ -1,3 +1,8 @@
 from django.contrib import admin
 
 # Register your models here.
+from quotes.models import Job, RateCurve
+
+
+admin.site.register(RateCurve)
+admin.site.register(Job)
@@ -0,0 +1,87 @@
+import random
+import time
+
+from django.db.backends.sqlite3 import base
+
+
+"""
+SQLite backend for serving concurrent writers from one database file.
+
+Selected by the production SQLite profile in greystone/settings.py.  On
+top of the stock backend it
+
+- applies OPTIONS['pragmas'] to every new connection (WAL journaling so
+  readers never block the writer, synchronous=NORMAL, a larger page
+  cache and memory-mapped reads);
+- starts atomic blocks with BEGIN IMMEDIATE, so a transaction takes the
+  write lock when it begins and waits for it under the busy timeout.  A
+  plain BEGIN takes it on the first write instead, and SQLite fails such
+  an upgrade at once with "database is locked" when another connection
+  got there first;
+- retries statements run outside a transaction, BEGIN IMMEDIATE among
+  them, that still fail with "database is locked", up to
+  OPTIONS['lock_retries'] times with jittered exponential backoff.
+  Statements inside a transaction are not retried: the transaction
+  already holds the write lock.
+"""
+
+
+DEFAULT_LOCK_RETRIES = 5
+RETRY_BASE_DELAY = 0.05
+RETRY_MAX_DELAY = 2.0
+
+OperationalError = base.Database.OperationalError
+
+
+def is_locked_error(error):
+    return 'locked' in str(error)
+
+
+class SQLiteCursorWrapper(base.SQLiteCursorWrapper):
+
+    def _retry(self, run, *args):
+        retries = self.lock_retries
+        attempt = 0
+        while True:
+            try:
+                return run(self, *args)
+            except OperationalError as e:
+                if attempt >= retries or not is_locked_error(e) or \
+                        self.connection.in_transaction:
+                    raise
+            # Full jitter: concurrent writers that collided wake at
+            # different times instead of colliding again.
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)
+            time.sleep(random.uniform(0, delay))
+            attempt += 1
+
+    def execute(self, query, params=None):
+        return self._retry(base.SQLiteCursorWrapper.execute, query, params)
+
+    def executemany(self, query, param_list):
+        return self._retry(base.SQLiteCursorWrapper.executemany, query, param_list)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        kwargs = super(DatabaseWrapper, self).get_connection_params()
+        self.pragmas = kwargs.pop('pragmas', {})
+        self.lock_retries = kwargs.pop('lock_retries', DEFAULT_LOCK_RETRIES)
+        return kwargs
+
+    def init_connection_state(self):
+        cursor = self.create_cursor()
+        try:
+            for name, value in self.pragmas.items():
+                cursor.execute('PRAGMA %s = %s' % (name, value))
+        finally:
+            cursor.close()
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=SQLiteCursorWrapper)
+        cursor.lock_retries = self.lock_retries
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute("BEGIN IMMEDIATE")
@@ -0,0 +1,144 @@
+import platform
+import statistics
+import time
+
+import django
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from quotes.models import Rent, Result
+from quotes.synthetic import generate_portfolio
+
+
+"""
+Performance benchmark suite.
+
+run_benchmarks() builds a synthetic portfolio and times the quote hot
+paths - Result.save, the bulk requote, the wizard and list views and
+every API endpoint - returning a JSON-ready dict so runs can be compared
+across commits.  It writes to the current database, so run it through
+'manage.py bench_quotes', which uses a throwaway test database.
+"""
+
+
+API_ENDPOINTS = (
+    'address-list',
+    'rent-list',
+    'expense-list',
+    'caprate-list',
+    'result-list',
+)
+
+
+def _measure(func, repeat):
+    """
+    Call `func` `repeat` times and summarize wall time (ms) and queries
+    """
+    timings = []
+    queries = []
+    errors = []
+    for i in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            try:
+                func()
+            except Exception as e:
+                errors.append("%s: %s" % (type(e).__name__, e))
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(captured))
+    stats = {
+        'repeat': repeat,
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'queries': max(queries),
+    }
+    if errors:
+        stats['errors'] = sorted(set(errors))
+    return stats
+
+
+def _expect_status(response, *statuses):
+    if response.status_code not in statuses:
+        raise AssertionError(
+            "%s returned HTTP %d" % (response.request['PATH_INFO'], response.status_code)
+        )
+
+
+def run_benchmarks(properties=100, min_units=10, max_units=100, seed=0,
+        repeat=5):
+    report = {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'properties': properties,
+        'min_units': min_units,
+        'max_units': max_units,
+        'seed': seed,
+        'benchmarks': {},
+    }
+    benchmarks = report['benchmarks']
+
+    start = time.perf_counter()
+    address_ids = generate_portfolio(
+        properties,
+        min_units=min_units,
+        max_units=max_units,
+        seed=seed,
+    )
+    benchmarks['generate_portfolio'] = {
+        'ms': round((time.perf_counter() - start) * 1000, 3),
+        'units': Rent.objects.count(),
+    }
+
+    address_id = address_ids[len(address_ids) // 2]
+    result = Result.objects.get(address_id=address_id)
+    benchmarks['result_save'] = _measure(result.save, repeat)
+    benchmarks['bulk_requote'] = _measure(Result.objects.requote, repeat)
+    benchmarks['bulk_requote_refresh_rents'] = _measure(
+        lambda: Result.objects.requote(refresh_rents=True),
+        repeat,
+    )
+
+    client = Client()
+    user = User.objects.create_user('benchmark', password='benchmark')
+    client.force_login(user)
+
+    benchmarks['result_list'] = _measure(
+        lambda: _expect_status(client.get(reverse('result_list')), 200),
+        repeat,
+    )
+    benchmarks['result_detail'] = _measure(
+        lambda: _expect_status(
+            client.get(reverse('result_detail', kwargs={'pk': result.pk})),
+            200,
+        ),
+        repeat,
+    )
+
+    rent = Rent.objects.filter(address_id=address_id).order_by('id').first()
+    form = {
+        'monthly_rent': rent.monthly_rent,
+        'unit_number': rent.unit_number,
+        'vacancy': rent.vacancy,
+        'bedrooms': rent.bedrooms,
+        'bathrooms': rent.bathrooms,
+        'update_rent': "Update next unit",
+    }
+    benchmarks['rent_update_navigation'] = _measure(
+        lambda: _expect_status(
+            client.post(reverse('rent_update', kwargs={'pk': rent.pk}), form),
+            302,
+        ),
+        repeat,
+    )
+
+    for name in API_ENDPOINTS:
+        benchmarks['api:%s' % name] = _measure(
+            lambda: _expect_status(client.get(reverse(name)), 200),
+            repeat,
+        )
+    return report
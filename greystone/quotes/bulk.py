@@ -0,0 +1,96 @@
+from django.db import connections, router, transaction
+from django.db.models import Case, Value, When
+
+
+"""
+Bulk write helpers.
+
+Django 2.0 has no QuerySet.bulk_update, so this module provides the same
+thing: one UPDATE ... SET col = CASE id WHEN ... END per batch instead of
+one UPDATE per row.  It also only sets primary keys after bulk_create on
+PostgreSQL, so bulk_create_with_ids reads them back by a unique key.
+id_batches splits long id lists so no IN (...) list outgrows SQLite's
+limit on bound parameters.
+"""
+
+
+# Ids per IN (...) list, well within SQLite's 999 bound parameters
+# together with the rest of a statement's parameters.
+IN_LIST_SIZE = 500
+
+
+def id_batches(ids, size=IN_LIST_SIZE):
+    """
+    `ids` in sorted lists of at most `size`
+    """
+    ids = sorted(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def bulk_create_with_ids(model, objs, unique_fields, batch_size=500):
+    """
+    bulk_create `objs` and set their primary keys on every backend by
+    reading them back through `unique_fields`, which must be unique
+    together.  Returns `objs`.
+    """
+    model.objects.bulk_create(objs, batch_size=batch_size)
+    missing = [obj for obj in objs if obj.pk is None]
+    if not missing:
+        return objs
+
+    lookup_field = unique_fields[0]
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start:start + batch_size]
+        keys = {
+            tuple(getattr(obj, field) for field in unique_fields): obj
+            for obj in batch
+        }
+        rows = model.objects. \
+            filter(**{
+                '%s__in' % lookup_field:
+                    {getattr(obj, lookup_field) for obj in batch}
+            }). \
+            values_list('pk', *unique_fields)
+        for row in rows:
+            obj = keys.get(tuple(row[1:]))
+            if obj is not None:
+                obj.pk = row[0]
+    return objs
+
+
+def bulk_update(model, objs, fields, batch_size=500):
+    """
+    Write `fields` of every object in `objs` back to the database,
+    `batch_size` rows per UPDATE statement.  Returns the number of rows
+    updated.
+    """
+    objs = [obj for obj in objs if obj.pk is not None]
+    if not objs or not fields:
+        return 0
+
+    model_fields = [model._meta.get_field(name) for name in fields]
+    db = router.db_for_write(model)
+    # Every row binds its pk in the IN list and a (pk, value) pair in
+    # the CASE of every field.
+    max_batch_size = connections[db].ops. \
+        bulk_batch_size(['pk'] + [name for name in fields for i in (0, 1)], objs)
+    batch_size = min(batch_size, max_batch_size) or 1
+    updated = 0
+    with transaction.atomic(using=db, savepoint=False):
+        for start in range(0, len(objs), batch_size):
+            batch = objs[start:start + batch_size]
+            updates = {}
+            for field in model_fields:
+                whens = [
+                    When(pk=obj.pk, then=Value(
+                        getattr(obj, field.attname),
+                        output_field=field,
+                    ))
+                    for obj in batch
+                ]
+                updates[field.attname] = Case(*whens, output_field=field)
+            updated += model._base_manager.db_manager(db). \
+                filter(pk__in=[obj.pk for obj in batch]). \
+                update(**updates)
+    return updated
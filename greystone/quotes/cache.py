@@ -0,0 +1,165 @@
+import threading
+from collections import Counter
+
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from rest_framework.response import Response
+
+from quotes import oncommit
+
+
+"""
+Read cache for quote pages and API payloads.
+
+Entries are stored in the 'quotes' cache (see CACHES in settings) and
+registered under the address they belong to.  Saving or deleting any
+Address, Expense, CapRate, Rent or Result row of an address - or
+requoting it in bulk - calls invalidate(), which drops exactly that
+address's entries.  Inside a transaction the entries are dropped when it
+commits, so a reader running before the commit cannot cache the old rows
+again for the whole timeout.  Pages that render a CSRF token are never
+cached.  Hits and misses are counted per kind of entry and served on
+/metrics/.
+"""
+
+
+CACHE_ALIAS = 'quotes'
+
+_lock = threading.Lock()
+hits = Counter()
+misses = Counter()
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _registry_key(address_id):
+    return 'quote-keys:%s' % address_id
+
+
+def lookup(kind, key):
+    value = get_cache().get(key)
+    with _lock:
+        if value is None:
+            misses[kind] += 1
+        else:
+            hits[kind] += 1
+    return value
+
+
+def store(address_id, key, value):
+    """
+    Cache `value` under `key` and register it with `address_id`
+    """
+    cache = get_cache()
+    registry_key = _registry_key(address_id)
+    keys = cache.get(registry_key) or []
+    if key not in keys:
+        keys.append(key)
+        cache.set(registry_key, keys, None)
+    cache.set(key, value)
+
+
+def invalidate(address_id, using=None):
+    invalidate_many([address_id], using=using)
+
+
+def _drop(address_ids):
+    cache = get_cache()
+    registry_keys = [_registry_key(address_id) for address_id in address_ids]
+    if not registry_keys:
+        return
+    registries = cache.get_many(registry_keys)
+    keys = [key for entries in registries.values() for key in entries]
+    cache.delete_many(keys + list(registries))
+
+
+_invalidations = oncommit.CommitBatch(
+    lambda address_ids, using: _drop(address_ids)
+)
+
+
+def invalidate_many(address_ids, using=None):
+    """
+    Drop every cached entry of the given addresses, once the current
+    transaction commits
+    """
+    _invalidations.add(address_ids, using=using)
+
+
+def counters():
+    with _lock:
+        return dict(hits), dict(misses)
+
+
+def render_prometheus():
+    hit_counts, miss_counts = counters()
+    lines = []
+    for metric, counts, description in (
+            ('quotes_cache_hits_total', hit_counts, "Quote cache hits."),
+            ('quotes_cache_misses_total', miss_counts, "Quote cache misses.")):
+        lines.append('# HELP %s %s' % (metric, description))
+        lines.append('# TYPE %s counter' % metric)
+        for kind, count in sorted(counts.items()):
+            lines.append('%s{kind="%s"} %d' % (metric, kind, count))
+    return '\n'.join(lines) + '\n'
+
+
+class CachedDetailMixin(object):
+    """
+    Serves a DetailView's rendered page from the quote cache
+    """
+    cache_kind = None
+
+    def get_cache_address_id(self, obj):
+        return obj.address_id
+
+    def get(self, request, *args, **kwargs):
+        kind = self.cache_kind or self.model._meta.model_name
+        key = 'page:%s:%s' % (kind, kwargs[self.pk_url_kwarg])
+        content = lookup(kind, key)
+        if content is not None:
+            return HttpResponse(content)
+
+        response = super(CachedDetailMixin, self).get(request, *args, **kwargs)
+        response.render()
+        # A page with a CSRF token belongs to one visitor.
+        if response.status_code == 200 and \
+                not request.META.get('CSRF_COOKIE_USED'):
+            store(self.get_cache_address_id(self.object), key, response.content)
+        return response
+
+
+class CachedRetrieveMixin(object):
+    """
+    Serves a ViewSet's retrieve payload from the quote cache
+    """
+
+    def get_cache_address_id(self, obj):
+        return obj.address_id
+
+    def get_retrieve_payload(self, request, *args, **kwargs):
+        """
+        (address id, representation) of the requested object
+        """
+        instance = self.get_object()
+        data = dict(self.get_serializer(instance).data)
+        return self.get_cache_address_id(instance), data
+
+    def retrieve(self, request, *args, **kwargs):
+        kind = 'api:%s' % self.queryset.model._meta.model_name
+        key = '%s:%s:%s:%s' % (
+            kind,
+            request.get_host(),
+            kwargs[self.lookup_url_kwarg or self.lookup_field],
+            request.META.get('QUERY_STRING', ''),
+        )
+        data = lookup(kind, key)
+        if data is None:
+            address_id, data = self.get_retrieve_payload(
+                request, *args, **kwargs
+            )
+            store(address_id, key, data)
+        return Response(data)
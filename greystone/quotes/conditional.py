@@ -0,0 +1,143 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import urlencode
+
+from quotes.models import Address, CollectionVersion
+
+
+"""
+Conditional GET for quote reads.
+
+Every Address carries a version that is bumped whenever the address or
+any of its expense, cap rate, rent or result rows change (see
+quotes/signals.py and ResultManager.requote).  Detail responses get a
+strong ETag built from that one integer, read with a single indexed
+lookup, so a client revalidating an unchanged quote receives
+304 Not Modified without the quote or its rent roll being loaded.
+
+List responses get a collection ETag from the CollectionVersion counter,
+which moves with every address version bump and whenever an address is
+created or deleted - again a single primary key lookup.  API ETags also
+cover the normalized query parameters, so ?fields= and ?include=
+variants never validate each other.
+"""
+
+
+CONDITIONAL_METHODS = ('GET', 'HEAD')
+
+
+def object_version(model, pk):
+    """
+    Version of the address owning the `model` row `pk`, or None when
+    the row does not exist
+    """
+    lookup = 'version' if model is Address else 'address__version'
+    return model.objects. \
+        filter(pk=pk). \
+        values_list(lookup, flat=True). \
+        first()
+
+
+def collection_version():
+    return CollectionVersion.objects.current()
+
+
+def normalized_query(request):
+    """
+    Query parameters in a canonical order
+    """
+    return urlencode(sorted(request.GET.lists()), doseq=True)
+
+
+def make_etag(*parts):
+    """
+    Strong ETag for a representation identified by `parts`
+    """
+    digest = hashlib.sha1(
+        ':'.join(str(part) for part in parts).encode('utf-8')
+    ).hexdigest()
+    return '"%s"' % digest
+
+
+def conditional_response(request, etag):
+    """
+    304 response when the request already holds `etag`, otherwise None
+    """
+    if request.method not in CONDITIONAL_METHODS:
+        return None
+    return get_conditional_response(request, etag=etag)
+
+
+class ConditionalDetailMixin(object):
+    """
+    Strong ETag and 304 Not Modified for a DetailView
+    """
+
+    def get(self, request, *args, **kwargs):
+        model = self.get_queryset().model
+        version = object_version(model, kwargs[self.pk_url_kwarg])
+        if version is None:
+            return super(ConditionalDetailMixin, self).get(request, *args, **kwargs)
+
+        etag = make_etag(
+            'page',
+            model._meta.model_name,
+            kwargs[self.pk_url_kwarg],
+            version,
+        )
+        response = conditional_response(request, etag)
+        if response is None:
+            response = super(ConditionalDetailMixin, self).get(request, *args, **kwargs)
+            response['ETag'] = etag
+        return response
+
+
+class ConditionalViewSetMixin(object):
+    """
+    Strong ETags and 304 Not Modified for a ViewSet's retrieve and list
+    """
+
+    def _conditional(self, etag, action, request, *args, **kwargs):
+        response = conditional_response(request, etag)
+        if response is not None:
+            return response
+        response = action(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        model = self.get_queryset().model
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        version = object_version(model, pk)
+        retrieve = super(ConditionalViewSetMixin, self).retrieve
+        if version is None:
+            return retrieve(request, *args, **kwargs)
+
+        etag = make_etag(
+            'api',
+            model._meta.model_name,
+            pk,
+            version,
+            normalized_query(request),
+            request.accepted_renderer.format,
+        )
+        return self._conditional(etag, retrieve, request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        etag = make_etag(
+            'api',
+            self.get_queryset().model._meta.model_name,
+            request.path,
+            normalized_query(request),
+            collection_version(),
+            request.accepted_renderer.format,
+        )
+        return self._conditional(
+            etag,
+            super(ConditionalViewSetMixin, self).list,
+            request,
+            *args,
+            **kwargs
+        )
@@ -0,0 +1,104 @@
+from django.db import transaction
+
+from quotes.bulk import bulk_create_with_ids
+from quotes.models import Address, CapRate, Expense, Rent, Result
+
+
+"""
+One-shot quote creation.
+
+create_quotes() takes validated quote documents - an address, its
+expenses, cap rate and rent roll - and writes all of them in a single
+transaction with bulk inserts, computing each Result once at the end.
+It replaces the 4 + N requests of the address/expense/cap rate/rent
+wizard for API clients.
+"""
+
+
+ADDRESS_FIELDS = ('street', 'city', 'state', 'zip_code')
+EXPENSE_FIELDS = (
+    'marketing',
+    'taxes',
+    'insurance',
+    'repairs',
+    'administration',
+)
+RENT_FIELDS = (
+    'unit_number',
+    'monthly_rent',
+    'vacancy',
+    'bedrooms',
+    'bathrooms',
+)
+
+
+def existing_addresses(documents):
+    """
+    The (street, city, state, zip_code) keys of `documents` that are
+    already in the database, found with one query
+    """
+    keys = {
+        tuple(document[field] for field in ADDRESS_FIELDS)
+        for document in documents
+    }
+    if not keys:
+        return set()
+    rows = Address.objects. \
+        filter(street__in={key[0] for key in keys}). \
+        values_list(*ADDRESS_FIELDS)
+    return keys & set(rows)
+
+
+def create_quotes(documents, batch_size=500):
+    """
+    Create the addresses, expenses, cap rates and rent rolls of
+    `documents` and quote them.  Returns the new address ids in
+    document order.
+    """
+    with transaction.atomic():
+        addresses = [
+            Address(**{field: document[field] for field in ADDRESS_FIELDS})
+            for document in documents
+        ]
+        bulk_create_with_ids(
+            Address,
+            addresses,
+            ADDRESS_FIELDS,
+            batch_size=batch_size,
+        )
+
+        expenses = []
+        cap_rates = []
+        rents = []
+        for address, document in zip(addresses, documents):
+            expense = Expense(
+                expense_id=address.pk,
+                address_id=address.pk,
+                **{field: document['expense'][field] for field in EXPENSE_FIELDS}
+            )
+            expense.annual_expense = expense.get_annual_expense
+            expenses.append(expense)
+            cap_rates.append(CapRate(
+                cap_rate_id=address.pk,
+                address_id=address.pk,
+                cap_rate=document['cap_rate'],
+            ))
+            for unit in document.get('rent_roll', []):
+                rent = Rent(
+                    address_id=address.pk,
+                    **{field: unit[field] for field in RENT_FIELDS}
+                )
+                rent.annual_unit_rent = rent.get_annual_unit_rent
+                rents.append(rent)
+
+        Expense.objects.bulk_create(expenses, batch_size=batch_size)
+        CapRate.objects.bulk_create(cap_rates, batch_size=batch_size)
+        Rent.objects.bulk_create(rents, batch_size=batch_size)
+
+        address_ids = [address.pk for address in addresses]
+        for start in range(0, len(address_ids), batch_size):
+            Result.objects.requote(
+                address_ids[start:start + batch_size],
+                refresh_rents=True,
+            )
+    return address_ids
@@ -0,0 +1,236 @@
+import functools
+
+import numpy as np
+
+
+"""
+Underwriting engine for commercial property quotes.
+
+Every function here works on column arrays, so a single property and a
+whole portfolio go through exactly the same code: one NumPy pass computes
+NOI, debt payment, property value, DSCR loan and final loan amount for
+every row at once.  Nothing in this module touches the ORM - callers
+(Result.save, the bulk requote in ResultManager, the API) fetch the
+input columns and write the outputs back.
+
+The math follows propertymetrics.com -
+https://www.propertymetrics.com/blog/2014/01/03/how-commercial-real-estate-loan-underwriting-works/
+"""
+
+
+# Default debt rate components; the rate actually quoted comes from
+# quotes.rates.get_debt_rate().
+BASE_RATE = 2.98
+RATE_SPREAD = 2.00
+DSCR = 1.25
+TERM_MONTHS = 120
+PAYMENTS_PER_YEAR = 12
+
+# Annuity factors for every rate from 0% to RATE_LADDER_MAX in
+# RATE_LADDER_STEP increments and every standard term are precomputed
+# on first use; anything else goes through a bounded LRU cache.
+RATE_LADDER_STEP = 0.01
+RATE_LADDER_MAX = 15.00
+STANDARD_TERMS = (60, 84, 120, 180, 240, 300, 360)
+ANNUITY_CACHE_SIZE = 4096
+
+RESULT_FIELDS = (
+    'noi',
+    'debt_payment',
+    'property_value',
+    'dscr_loan_amount',
+    'loan_amount',
+)
+
+
+def annuity_factor(debt_rate, term=TERM_MONTHS,
+        periods_per_year=PAYMENTS_PER_YEAR):
+    """
+    Present value of 1 paid every period for `term` months at
+    `debt_rate` percent, computed directly
+    """
+    debt_rate = np.asarray(debt_rate, dtype=np.float64)
+    periods = np.asarray(term, dtype=np.float64) * periods_per_year / 12
+    period_rate = (debt_rate / 100) / periods_per_year
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factor = (1 - (1 + period_rate) ** -periods) / period_rate
+    return np.where(period_rate == 0, periods, factor)
+
+
+@functools.lru_cache(maxsize=1)
+def _annuity_table():
+    """
+    Monthly annuity factors for the standard rate ladder, shaped
+    (rates, STANDARD_TERMS)
+    """
+    steps = int(round(RATE_LADDER_MAX / RATE_LADDER_STEP)) + 1
+    rates = np.arange(steps) * RATE_LADDER_STEP
+    return annuity_factor(
+        rates[:, np.newaxis],
+        np.array(STANDARD_TERMS)[np.newaxis, :],
+    )
+
+
+@functools.lru_cache(maxsize=ANNUITY_CACHE_SIZE)
+def _cached_annuity_factor(debt_rate, term, periods_per_year):
+    if periods_per_year == PAYMENTS_PER_YEAR and term in STANDARD_TERMS:
+        step = debt_rate / RATE_LADDER_STEP
+        if 0 <= step <= RATE_LADDER_MAX / RATE_LADDER_STEP and \
+                abs(step - round(step)) < 1e-6:
+            return float(
+                _annuity_table()[int(round(step)), STANDARD_TERMS.index(term)]
+            )
+    return float(annuity_factor(debt_rate, term, periods_per_year))
+
+
+def cached_annuity_factor(debt_rate, term=TERM_MONTHS,
+        periods_per_year=PAYMENTS_PER_YEAR):
+    """
+    annuity_factor for a single (rate, term, frequency), looked up in the
+    precomputed ladder or the LRU cache.  The factors are float64, which
+    keeps loans accurate to well under a cent.
+    """
+    return _cached_annuity_factor(
+        round(float(debt_rate), 6),
+        int(term),
+        int(periods_per_year),
+    )
+
+
+def annuity_factors(debt_rates, terms=TERM_MONTHS,
+        periods_per_year=PAYMENTS_PER_YEAR):
+    """
+    Vectorized cached_annuity_factor: each distinct (rate, term) pair in
+    the inputs is looked up once and the factors are scattered back
+    """
+    debt_rates, terms = np.broadcast_arrays(
+        np.round(np.asarray(debt_rates, dtype=np.float64), 6),
+        np.asarray(terms, dtype=np.float64),
+    )
+    if debt_rates.size == 0:
+        return np.zeros(debt_rates.shape)
+    pairs = np.stack([debt_rates.ravel(), terms.ravel()])
+    unique_pairs, inverse = np.unique(pairs, axis=1, return_inverse=True)
+    factors = np.array([
+        cached_annuity_factor(debt_rate, term, periods_per_year)
+        for debt_rate, term in unique_pairs.T
+    ])
+    return factors[inverse].reshape(debt_rates.shape)
+
+
+def underwrite(annual_rent, annual_expense, cap_rate, debt_rate,
+        term=TERM_MONTHS, dscr=DSCR):
+    """
+    Size loans for every property in the input columns.
+
+    `annual_rent` and `annual_expense` are in dollars, `cap_rate` and
+    `debt_rate` in percent, `term` in months.  Scalars broadcast against
+    arrays.  Returns a dict of int64 arrays keyed by RESULT_FIELDS,
+    truncated to whole dollars like the IntegerFields on Result.
+    """
+    annual_rent = np.asarray(annual_rent, dtype=np.float64)
+    annual_expense = np.asarray(annual_expense, dtype=np.float64)
+    cap_rate = np.asarray(cap_rate, dtype=np.float64)
+
+    noi = annual_rent - annual_expense
+    debt_payment = noi / dscr
+    with np.errstate(divide='ignore', invalid='ignore'):
+        property_value = np.where(cap_rate > 0, noi / (cap_rate / 100), 0)
+    dscr_loan_amount = (debt_payment / PAYMENTS_PER_YEAR) * \
+        annuity_factors(debt_rate, term)
+    loan_amount = np.minimum(property_value, dscr_loan_amount)
+
+    results = {
+        'noi': noi,
+        'debt_payment': debt_payment,
+        'property_value': property_value,
+        'dscr_loan_amount': dscr_loan_amount,
+        'loan_amount': loan_amount,
+    }
+    for field, values in results.items():
+        results[field] = np.trunc(values).astype(np.int64)
+    return results
+
+
+def underwrite_one(annual_rent, annual_expense, cap_rate, debt_rate,
+        term=TERM_MONTHS, dscr=DSCR):
+    """
+    Size a single loan, returning plain ints keyed by RESULT_FIELDS
+    """
+    results = underwrite(
+        annual_rent or 0,
+        annual_expense or 0,
+        cap_rate or 0,
+        debt_rate,
+        term=term,
+        dscr=dscr,
+    )
+    return {field: int(values) for field, values in results.items()}
+
+
+def _loan_coefficients(debt_rates, terms, dscrs):
+    """
+    Loan per dollar of NOI under the DSCR approach, shaped
+    (rates, 1, terms, dscrs) so it broadcasts against a cap rate axis
+    """
+    debt_rates = np.asarray(debt_rates, dtype=np.float64)
+    terms = np.asarray(terms, dtype=np.float64)
+    dscrs = np.asarray(dscrs, dtype=np.float64)
+    factors = annuity_factors(
+        debt_rates[:, np.newaxis],
+        terms[np.newaxis, :],
+    )
+    return factors[:, np.newaxis, :, np.newaxis] / \
+        (12 * dscrs[np.newaxis, np.newaxis, np.newaxis, :])
+
+
+def _value_coefficients(cap_rates):
+    """
+    Property value per dollar of NOI for each cap rate (0 when the cap
+    rate is not positive, like underwrite())
+    """
+    cap_rates = np.asarray(cap_rates, dtype=np.float64)
+    with np.errstate(divide='ignore'):
+        return np.where(cap_rates > 0, 100 / cap_rates, 0)
+
+
+def sensitivity_grid(noi, cap_rate, debt_rates, terms, dscrs,
+        cap_rates=None, chunk_size=2000):
+    """
+    Total loan amount of the properties for every combination of debt
+    rate x cap rate x term x DSCR threshold.
+
+    `noi` and `cap_rate` are per-property columns.  When `cap_rates` is
+    given every property is revalued at each of those cap rates;
+    otherwise the cap rate axis has length 1 and each property keeps its
+    own.  Returns an array shaped (rates, cap rates, terms, dscrs).
+
+    Both approaches are linear in NOI, so a loan is NOI times the lesser
+    (for negative NOI, the greater) of two coefficients that depend only
+    on the grid.  Totals over an explicit cap rate axis are therefore
+    computed from the positive and negative NOI sums without touching
+    individual properties.
+    """
+    noi = np.asarray(noi, dtype=np.float64)
+    cap_rate = np.asarray(cap_rate, dtype=np.float64)
+    loan_coefficients = _loan_coefficients(debt_rates, terms, dscrs)
+
+    if cap_rates is not None:
+        value_coefficients = _value_coefficients(cap_rates)[
+            np.newaxis, :, np.newaxis, np.newaxis
+        ]
+        lower = np.minimum(value_coefficients, loan_coefficients)
+        upper = np.maximum(value_coefficients, loan_coefficients)
+        return noi[noi > 0].sum() * lower + noi[noi < 0].sum() * upper
+
+    value_coefficients = _value_coefficients(cap_rate)
+    totals = np.zeros(loan_coefficients.shape)
+    for start in range(0, len(noi), chunk_size):
+        chunk_noi = noi[start:start + chunk_size, np.newaxis,
+            np.newaxis, np.newaxis, np.newaxis]
+        chunk_value = chunk_noi * value_coefficients[
+            start:start + chunk_size, np.newaxis, np.newaxis,
+            np.newaxis, np.newaxis]
+        loans = np.trunc(np.minimum(chunk_value, chunk_noi * loan_coefficients))
+        totals += loans.sum(axis=0)
+    return totals
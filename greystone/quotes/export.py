@@ -0,0 +1,141 @@
+import csv
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from quotes.models import Result
+from quotes.pagination import RESULT_FILTERS
+
+
+"""
+Streaming export of every quote joined with its address, expense and
+cap rate.
+
+export_rows() reads the joined columns with a single values_list query
+iterated in chunks (a server-side cursor where the database has one), so
+rows are produced one chunk at a time and memory stays flat however
+large the book is.  export_chunks() turns them into CSV or NDJSON text,
+gzip-compressed on the fly when asked, for StreamingHttpResponse and
+'manage.py export_quotes' alike.
+"""
+
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_CHUNK_SIZE = 2000
+# Rows are written in blocks of about this many bytes.
+WRITE_BUFFER_SIZE = 64 * 1024
+
+EXPORT_COLUMNS = (
+    ('result_id', 'id'),
+    ('address_id', 'address_id'),
+    ('street', 'address__street'),
+    ('city', 'address__city'),
+    ('state', 'address__state'),
+    ('zip_code', 'address__zip_code'),
+    ('annual_property_rent', 'annual_property_rent'),
+    ('annual_expense', 'address__expense__annual_expense'),
+    ('cap_rate', 'address__caprate__cap_rate'),
+    ('debt_rate', 'debt_rate'),
+    ('noi', 'noi'),
+    ('debt_payment', 'debt_payment'),
+    ('property_value', 'property_value'),
+    ('dscr_loan_amount', 'dscr_loan_amount'),
+    ('loan_amount', 'loan_amount'),
+)
+LOAN_FILTERS = {
+    'min_loan': 'loan_amount__gte',
+    'max_loan': 'loan_amount__lte',
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def export_filters(params):
+    """
+    ORM lookups for the state, zip, min_loan and max_loan parameters
+    """
+    filters = {}
+    for param, field in RESULT_FILTERS.items():
+        value = params.get(param)
+        if value:
+            filters[field] = value
+    for param, lookup in LOAN_FILTERS.items():
+        value = params.get(param)
+        if value in (None, ''):
+            continue
+        try:
+            filters[lookup] = int(value)
+        except (TypeError, ValueError):
+            raise ExportError("%s must be a whole number." % param)
+    return filters
+
+
+def export_rows(filters=None, chunk_size=EXPORT_CHUNK_SIZE):
+    return Result.objects. \
+        filter(**(filters or {})). \
+        order_by('pk'). \
+        values_list(*[lookup for column, lookup in EXPORT_COLUMNS]). \
+        iterator(chunk_size=chunk_size)
+
+
+class _Echo(object):
+    """
+    File-like object handing csv.writer's output straight back
+    """
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([column for column, lookup in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _ndjson_lines(rows):
+    columns = [column for column, lookup in EXPORT_COLUMNS]
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + '\n'
+
+
+def _buffered(lines):
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= WRITE_BUFFER_SIZE:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def _gzipped(blocks):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_chunks(format='csv', filters=None, compress=False,
+        chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Bytes of the export in `format`, one block at a time
+    """
+    if format not in EXPORT_FORMATS:
+        raise ExportError(
+            "Expected one of: %s." % ', '.join(EXPORT_FORMATS)
+        )
+    rows = export_rows(filters, chunk_size=chunk_size)
+    lines = _csv_lines(rows) if format == 'csv' else _ndjson_lines(rows)
+    blocks = _buffered(lines)
+    return _gzipped(blocks) if compress else blocks
@@ -0,0 +1,131 @@
+from decimal import Decimal
+
+from django.db import models
+from django.http import Http404
+
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+
+
+"""
+Fast read path for the model ViewSets.
+
+GET list and retrieve skip model instances and serializer fields: rows
+come from values() and are turned into plain dicts by a handful of
+converters built once per request from the serializer's Meta.fields.
+Hyperlinks are formatted from a URL template reversed once per request
+instead of once per row.  The output matches the ViewSet's serializer,
+and ?fields=a,b narrows it to a sparse fieldset.  Writes still go
+through the serializer.
+"""
+
+
+FIELDS_PARAM = 'fields'
+PK_PLACEHOLDER = '__pk__'
+
+
+def _link(prefix, suffix):
+    def convert(pk):
+        if pk is None:
+            return None
+        return '%s%s%s' % (prefix, pk, suffix)
+    return convert
+
+
+def _decimal(decimal_places):
+    exponent = Decimal(1).scaleb(-decimal_places)
+
+    def convert(value):
+        if value is None:
+            return None
+        return str(Decimal(value).quantize(exponent))
+    return convert
+
+
+class ValuesReadMixin(object):
+    """
+    Serves a ModelViewSet's list, and the retrieve payload read by
+    CachedRetrieveMixin (which must follow it in the bases), from
+    values() rows
+    """
+    # Column holding the address that cached payloads are filed under.
+    address_field = 'address_id'
+
+    def get_read_fields(self):
+        """
+        Output fields: the serializer's, or the requested subset of them
+        """
+        available = list(self.get_serializer_class().Meta.fields)
+        requested = self.request.query_params.get(FIELDS_PARAM)
+        if not requested:
+            return available
+        names = [name.strip() for name in requested.split(',') if name.strip()]
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            raise serializers.ValidationError({
+                FIELDS_PARAM: [
+                    "Unknown fields: %s. Expected some of: %s."
+                    % (', '.join(unknown), ', '.join(available))
+                ],
+            })
+        return names
+
+    def get_read_columns(self, names):
+        """
+        (output name, values() lookup, converter) for every field
+        """
+        opts = self.get_queryset().model._meta
+        columns = []
+        for name in names:
+            field = opts.get_field(name)
+            convert = None
+            if field.is_relation:
+                url = reverse(
+                    '%s-detail' % field.related_model._meta.model_name,
+                    kwargs={'pk': PK_PLACEHOLDER},
+                    request=self.request,
+                )
+                convert = _link(*url.split(PK_PLACEHOLDER, 1))
+                lookup = field.attname
+            else:
+                lookup = name
+                if isinstance(field, models.DecimalField):
+                    convert = _decimal(field.decimal_places)
+            columns.append((name, lookup, convert))
+        return columns
+
+    def _values(self, queryset, columns):
+        lookups = [lookup for name, lookup, convert in columns]
+        return queryset.values(*set(lookups + [self.address_field]))
+
+    def represent(self, row, columns):
+        data = {}
+        for name, lookup, convert in columns:
+            value = row[lookup]
+            data[name] = convert(value) if convert else value
+        return data
+
+    def list(self, request, *args, **kwargs):
+        columns = self.get_read_columns(self.get_read_fields())
+        rows = self._values(self.filter_queryset(self.get_queryset()), columns)
+        page = self.paginate_queryset(rows)
+        data = [
+            self.represent(row, columns)
+            for row in (page if page is not None else rows)
+        ]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def get_retrieve_payload(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        columns = self.get_read_columns(self.get_read_fields())
+        rows = self._values(
+            self.filter_queryset(self.get_queryset()),
+            columns,
+        ).filter(**{self.lookup_field: kwargs[lookup_url_kwarg]})
+        row = rows.first()
+        if row is None:
+            raise Http404
+        return row[self.address_field], self.represent(row, columns)
@@ -0,0 +1,50 @@
+from django import forms
+
+from quotes.models import Rent
+from quotes.rentroll import UNIT_FIELDS, duplicate_unit_numbers
+
+
+class BaseRentRollFormSet(forms.BaseModelFormSet):
+    """
+    Every unit of one property's rent roll, validated together
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.address_id = kwargs.pop('address_id')
+        super(BaseRentRollFormSet, self).__init__(*args, **kwargs)
+
+    def get_changes(self):
+        """
+        (creates, updates, deletes) from the submitted forms, as for
+        rentroll.apply_rent_roll_changes
+        """
+        creates, updates, deletes = [], [], []
+        for form in self.forms:
+            if form in self.deleted_forms:
+                if form.instance.pk is not None:
+                    deletes.append(form.instance.pk)
+            elif form.has_changed():
+                if form.instance.pk is None:
+                    creates.append(form.instance)
+                else:
+                    updates.append(form.instance)
+        return creates, updates, deletes
+
+    def clean(self):
+        super(BaseRentRollFormSet, self).clean()
+        if any(self.errors):
+            return
+        duplicates = duplicate_unit_numbers(self.address_id, *self.get_changes())
+        if duplicates:
+            raise forms.ValidationError(
+                "Unit numbers must be unique: %s." % ', '.join(duplicates)
+            )
+
+
+RentRollFormSet = forms.modelformset_factory(
+    Rent,
+    formset=BaseRentRollFormSet,
+    fields=UNIT_FIELDS,
+    extra=3,
+    can_delete=True,
+)
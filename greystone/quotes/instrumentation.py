@@ -0,0 +1,355 @@
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+
+from quotes import cache
+
+
+"""
+Per-route request instrumentation.
+
+QueryStatsMiddleware samples requests and records, per URL name, a
+latency histogram, the number of SQL queries, time spent in SQL and how
+many queries repeated an earlier statement of the same request (the N+1
+pattern).  The numbers are served in the Prometheus text format by
+metrics_view and periodically written to QUOTES_STATS_DIR, one file per
+process, where 'manage.py query_stats' merges them and folds the files
+of exited processes into one.
+
+Settings:
+    QUOTES_STATS_SAMPLE_RATE   fraction of requests measured (default 0.1)
+    QUOTES_STATS_DIR           snapshot directory (default: temp dir)
+    QUOTES_STATS_FLUSH_SECONDS seconds between snapshots (default 10)
+"""
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_DUPLICATE_STATEMENTS = 20
+UNMATCHED_ROUTE = '<unmatched>'
+# Counters of processes that have exited, see load_snapshots().
+RETIRED_SNAPSHOT = 'retired.json'
+
+
+def get_sample_rate():
+    return getattr(settings, 'QUOTES_STATS_SAMPLE_RATE', 0.1)
+
+
+def get_stats_dir():
+    return getattr(
+        settings,
+        'QUOTES_STATS_DIR',
+        os.path.join(tempfile.gettempdir(), 'greystone-stats'),
+    )
+
+
+def _empty_route():
+    return {
+        'requests': 0,
+        'latency_seconds': 0.0,
+        'latency_buckets': [0] * len(LATENCY_BUCKETS),
+        'queries': 0,
+        'sql_seconds': 0.0,
+        'duplicate_queries': 0,
+        'requests_with_duplicates': 0,
+        'duplicate_statements': {},
+    }
+
+
+class RouteStats(object):
+    """
+    Thread-safe per-route counters for one process
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.last_flush = time.time()
+
+    def record(self, route, latency, queries, sql_seconds, duplicates):
+        with self.lock:
+            stats = self.routes.setdefault(route, _empty_route())
+            stats['requests'] += 1
+            stats['latency_seconds'] += latency
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    stats['latency_buckets'][i] += 1
+            stats['queries'] += queries
+            stats['sql_seconds'] += sql_seconds
+            duplicate_count = sum(duplicates.values())
+            stats['duplicate_queries'] += duplicate_count
+            if duplicate_count:
+                stats['requests_with_duplicates'] += 1
+                statements = Counter(stats['duplicate_statements'])
+                statements.update(duplicates)
+                stats['duplicate_statements'] = dict(
+                    statements.most_common(MAX_DUPLICATE_STATEMENTS)
+                )
+
+    def snapshot(self):
+        with self.lock:
+            return json.loads(json.dumps(self.routes))
+
+    def reset(self):
+        with self.lock:
+            self.routes = {}
+
+    def flush(self, force=False):
+        """
+        Write this process's counters to QUOTES_STATS_DIR
+        """
+        interval = getattr(settings, 'QUOTES_STATS_FLUSH_SECONDS', 10)
+        now = time.time()
+        if not force and now - self.last_flush < interval:
+            return
+        self.last_flush = now
+        stats_dir = get_stats_dir()
+        try:
+            os.makedirs(stats_dir, exist_ok=True)
+            path = os.path.join(stats_dir, '%d.json' % os.getpid())
+            with open(path + '.tmp', 'w') as snapshot_file:
+                json.dump(self.snapshot(), snapshot_file)
+            os.replace(path + '.tmp', path)
+        except OSError:
+            pass
+
+
+route_stats = RouteStats()
+
+
+def merge_snapshots(snapshots):
+    """
+    Sum per-route counters from several processes
+    """
+    merged = {}
+    for routes in snapshots:
+        for route, stats in routes.items():
+            total = merged.setdefault(route, _empty_route())
+            for key in ('requests', 'latency_seconds', 'queries',
+                    'sql_seconds', 'duplicate_queries',
+                    'requests_with_duplicates'):
+                total[key] += stats[key]
+            total['latency_buckets'] = [
+                a + b for a, b in
+                zip(total['latency_buckets'], stats['latency_buckets'])
+            ]
+            statements = Counter(total['duplicate_statements'])
+            statements.update(stats['duplicate_statements'])
+            total['duplicate_statements'] = dict(statements)
+    return merged
+
+
+def _process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _retire(stats_dir, retired, snapshots):
+    """
+    Fold the snapshots of processes that have exited into
+    RETIRED_SNAPSHOT and remove their files
+    """
+    path = os.path.join(stats_dir, RETIRED_SNAPSHOT)
+    merged = merge_snapshots(
+        [snapshots.get(RETIRED_SNAPSHOT, {})] +
+        [snapshots[name] for name in retired]
+    )
+    try:
+        with open(path + '.tmp', 'w') as snapshot_file:
+            json.dump(merged, snapshot_file)
+        os.replace(path + '.tmp', path)
+        for name in retired:
+            os.remove(os.path.join(stats_dir, name))
+    except OSError:
+        pass
+
+
+def load_snapshots(stats_dir=None):
+    """
+    Read every process's snapshot.  The snapshots of processes no longer
+    running are folded into one file on the way, so the directory does
+    not grow with every worker restart.
+    """
+    stats_dir = stats_dir or get_stats_dir()
+    if not os.path.isdir(stats_dir):
+        return []
+    snapshots = {}
+    for name in sorted(os.listdir(stats_dir)):
+        if name.endswith('.json'):
+            try:
+                with open(os.path.join(stats_dir, name)) as snapshot_file:
+                    snapshots[name] = json.load(snapshot_file)
+            except (OSError, ValueError):
+                continue
+    retired = [
+        name for name in snapshots
+        if name[:-len('.json')].isdigit() and
+        not _process_exists(int(name[:-len('.json')]))
+    ]
+    if retired:
+        _retire(stats_dir, retired, snapshots)
+    return list(snapshots.values())
+
+
+class QueryCollector(object):
+    """
+    execute_wrapper that counts and times the queries of one request
+    """
+
+    def __init__(self):
+        self.statements = Counter()
+        self.sql_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - start
+            self.statements[sql] += 1
+
+    @property
+    def queries(self):
+        return sum(self.statements.values())
+
+    @property
+    def duplicates(self):
+        return {
+            sql: count - 1 for sql, count in self.statements.items()
+            if count > 1
+        }
+
+
+def _route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None or not match.url_name:
+        return UNMATCHED_ROUTE
+    return match.view_name
+
+
+def _count_streaming(content, collector, finish):
+    """
+    Iterate a streaming response's content under `collector`, then call
+    `finish` once the response is consumed or closed
+    """
+    content = iter(content)
+    try:
+        while True:
+            with connection.execute_wrapper(collector):
+                try:
+                    chunk = next(content)
+                except StopIteration:
+                    return
+            yield chunk
+    finally:
+        finish()
+
+
+class QueryStatsMiddleware(object):
+    """
+    Records latency and SQL statistics for a sample of requests.  For a
+    streaming response they are recorded once its content has been sent,
+    so the queries run while streaming are counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= get_sample_rate():
+            return self.get_response(request)
+
+        collector = QueryCollector()
+        start = time.perf_counter()
+        with connection.execute_wrapper(collector):
+            response = self.get_response(request)
+        route = _route_name(request)
+
+        def finish():
+            route_stats.record(
+                route,
+                time.perf_counter() - start,
+                collector.queries,
+                collector.sql_seconds,
+                collector.duplicates,
+            )
+            route_stats.flush()
+
+        if response.streaming:
+            response.streaming_content = _count_streaming(
+                response.streaming_content,
+                collector,
+                finish,
+            )
+        else:
+            finish()
+        return response
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(routes):
+    lines = [
+        '# HELP quotes_request_duration_seconds Latency of sampled requests.',
+        '# TYPE quotes_request_duration_seconds histogram',
+    ]
+    for route, stats in sorted(routes.items()):
+        label = 'route="%s"' % _escape(route)
+        for bound, count in zip(LATENCY_BUCKETS, stats['latency_buckets']):
+            lines.append(
+                'quotes_request_duration_seconds_bucket{%s,le="%s"} %d'
+                % (label, bound, count)
+            )
+        lines.append(
+            'quotes_request_duration_seconds_bucket{%s,le="+Inf"} %d'
+            % (label, stats['requests'])
+        )
+        lines.append(
+            'quotes_request_duration_seconds_sum{%s} %f'
+            % (label, stats['latency_seconds'])
+        )
+        lines.append(
+            'quotes_request_duration_seconds_count{%s} %d'
+            % (label, stats['requests'])
+        )
+
+    counters = (
+        ('quotes_request_queries_total', 'queries', "SQL queries run by sampled requests.", '%d'),
+        ('quotes_request_sql_seconds_total', 'sql_seconds', "Time spent in SQL by sampled requests.", '%f'),
+        ('quotes_request_duplicate_queries_total', 'duplicate_queries', "Queries repeating an earlier statement of the same request.", '%d'),
+        ('quotes_requests_with_duplicate_queries_total', 'requests_with_duplicates', "Sampled requests that repeated a statement.", '%d'),
+    )
+    for metric, key, description, number_format in counters:
+        lines.append('# HELP %s %s' % (metric, description))
+        lines.append('# TYPE %s counter' % metric)
+        for route, stats in sorted(routes.items()):
+            lines.append(
+                ('%s{route="%s"} ' + number_format)
+                % (metric, _escape(route), stats[key])
+            )
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    This process's request and cache statistics in the Prometheus text
+    format
+    """
+    return HttpResponse(
+        render_prometheus(route_stats.snapshot()) + cache.render_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
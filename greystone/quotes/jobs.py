@@ -0,0 +1,363 @@
+import json
+import multiprocessing
+import os
+import socket
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from quotes.models import Job, Result
+
+
+"""
+Background jobs stored in the database.
+
+enqueue() adds a Job row and returns at once; 'manage.py run_quote_worker'
+runs the queue.  A worker claims the oldest runnable job with a
+conditional UPDATE (status still queued), so when several workers poll
+the same table each job goes to exactly one of them.  With more than one
+process the claimed jobs run in a process pool.  Handlers report
+progress as they go, which also serves as a heartbeat: a running job
+that has not reported for QUOTES_JOB_STALE_AFTER seconds is assumed to
+have lost its worker and is queued again.  A job that raises is retried
+with exponential backoff until it has been attempted max_attempts times.
+
+Requote jobs are coalesced: the worker that claims one also claims every
+other runnable requote job and runs a single requote over the union of
+their addresses.  A single worker process ('run_quote_worker
+--processes 1') thereby funnels all background requotes through one
+batched writer, which is what SQLite wants.
+"""
+
+
+REQUOTE_BATCH_SIZE = 500
+# Most requote jobs folded into one run.
+COALESCE_LIMIT = 500
+RETRY_DELAY = 30
+
+
+class JobError(ValueError):
+    """
+    A job that cannot succeed however often it is retried
+    """
+    pass
+
+
+class _Progress(object):
+    """
+    Callable handed to job handlers to record items done (and in total)
+    for the jobs being run
+    """
+
+    def __init__(self, job_ids):
+        self.job_ids = job_ids
+
+    def __call__(self, done, total=None):
+        changes = {'progress': done, 'heartbeat_at': timezone.now()}
+        if total is not None:
+            changes['total'] = total
+        Job.objects.filter(pk__in=self.job_ids).update(**changes)
+
+
+def requote_job(payload, progress):
+    """
+    Requote `address_ids` (every quoted address if missing), a batch at
+    a time
+    """
+    address_ids = payload.get('address_ids')
+    if address_ids is None:
+        address_ids = list(
+            Result.objects.order_by('address_id').values_list('address_id', flat=True)
+        )
+    progress(0, len(address_ids))
+    requoted = 0
+    for start in range(0, len(address_ids), REQUOTE_BATCH_SIZE):
+        requoted += Result.objects.requote(
+            address_ids[start:start + REQUOTE_BATCH_SIZE],
+            refresh_rents=payload.get('refresh_rents', False),
+        )
+        progress(min(start + REQUOTE_BATCH_SIZE, len(address_ids)))
+    return {'requoted': requoted}
+
+
+def requote_all_job(payload, progress):
+    from quotes.repricing import requote_all
+
+    total = Result.objects.count()
+    progress(0, total)
+    return requote_all(
+        chunk_size=payload.get('chunk_size', 2000),
+        batch_size=payload.get('batch_size', 500),
+        resume=payload.get('resume', False),
+        progress=lambda run: progress(min(run.requoted, total)),
+    )
+
+
+def import_rent_roll_job(payload, progress):
+    from quotes.rentroll import import_rent_roll
+
+    lines = payload['rent_roll'].splitlines(True)
+    progress(0, len(lines))
+    report = import_rent_roll(
+        lines,
+        format=payload.get('format', 'csv'),
+        progress=progress,
+    )
+    progress(len(lines))
+    return report
+
+
+JOB_KINDS = {
+    'requote': requote_job,
+    'requote_all': requote_all_job,
+    'import_rent_roll': import_rent_roll_job,
+}
+
+
+def enqueue(kind, payload=None, max_attempts=3):
+    if kind not in JOB_KINDS:
+        raise JobError(
+            "Expected a job kind of: %s." % ', '.join(sorted(JOB_KINDS))
+        )
+    return Job.objects.create(
+        kind=kind,
+        payload=json.dumps(payload or {}, cls=DjangoJSONEncoder),
+        max_attempts=max_attempts,
+    )
+
+
+def requeue_stale(stale_after=None):
+    """
+    Queue again (or fail, when out of attempts) running jobs that have
+    not reported progress for `stale_after` seconds
+    """
+    if stale_after is None:
+        stale_after = getattr(settings, 'QUOTES_JOB_STALE_AFTER', 600)
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        heartbeat_at__lt=now - timedelta(seconds=stale_after),
+    )
+    error = "Worker stopped reporting progress."
+    failed = stale. \
+        filter(attempts__gte=F('max_attempts')). \
+        update(status=Job.FAILED, error=error, finished_at=now)
+    requeued = stale. \
+        filter(attempts__lt=F('max_attempts')). \
+        update(status=Job.QUEUED, error=error, run_after=now)
+    return requeued + failed
+
+
+def claim(worker):
+    """
+    Mark the oldest runnable job as running for `worker` and return its
+    id, or None when the queue is empty
+    """
+    while True:
+        now = timezone.now()
+        job_id = Job.objects. \
+            filter(status=Job.QUEUED, run_after__lte=now). \
+            order_by('pk'). \
+            values_list('pk', flat=True). \
+            first()
+        if job_id is None:
+            return None
+        claimed = Job.objects. \
+            filter(pk=job_id, status=Job.QUEUED). \
+            update(
+                status=Job.RUNNING,
+                worker=worker,
+                attempts=F('attempts') + 1,
+                started_at=now,
+                heartbeat_at=now,
+            )
+        if claimed:
+            return job_id
+        # Another worker got there first.
+
+
+def _absorb_requotes(job, payload):
+    """
+    Claim the other runnable requote jobs along with `job`.  Returns them
+    and the payload requoting the addresses of all of them.
+    """
+    now = timezone.now()
+    candidates = list(
+        Job.objects. \
+            filter(kind='requote', status=Job.QUEUED, run_after__lte=now). \
+            order_by('pk'). \
+            values_list('pk', flat=True)[:COALESCE_LIMIT]
+    )
+    if not candidates:
+        return [], payload
+    # Tells the jobs claimed here apart from any claimed concurrently.
+    claimed_by = '%s+%d' % (job.worker, job.pk)
+    Job.objects. \
+        filter(pk__in=candidates, status=Job.QUEUED). \
+        update(
+            status=Job.RUNNING,
+            worker=claimed_by,
+            attempts=F('attempts') + 1,
+            started_at=now,
+            heartbeat_at=now,
+        )
+    absorbed = list(
+        Job.objects.filter(pk__in=candidates, status=Job.RUNNING, worker=claimed_by)
+    )
+
+    address_ids = set()
+    refresh_rents = False
+    for item in [payload] + [other.get_payload for other in absorbed]:
+        if address_ids is not None:
+            if item.get('address_ids') is None:
+                address_ids = None
+            else:
+                address_ids.update(item['address_ids'])
+        refresh_rents = refresh_rents or item.get('refresh_rents', False)
+    return absorbed, {
+        'address_ids': sorted(address_ids) if address_ids is not None else None,
+        'refresh_rents': refresh_rents,
+    }
+
+
+def _finish(batch, error, retry):
+    """
+    Record a failed run of the jobs in `batch`.  Returns the new status
+    of the first of them.
+    """
+    now = timezone.now()
+    statuses = []
+    for job in batch:
+        if retry and job.attempts < job.max_attempts:
+            delay = RETRY_DELAY * 2 ** (job.attempts - 1)
+            changes = {
+                'status': Job.QUEUED,
+                'run_after': now + timedelta(seconds=delay),
+            }
+        else:
+            changes = {'status': Job.FAILED, 'finished_at': now}
+        Job.objects. \
+            filter(pk=job.pk, status=Job.RUNNING). \
+            update(error=error, heartbeat_at=now, **changes)
+        statuses.append(changes['status'])
+    return statuses[0]
+
+
+def run_job(job_id):
+    """
+    Run a claimed job, and any requote jobs coalesced with it, and record
+    the outcome.  Returns the job's new status.
+    """
+    job = Job.objects.get(pk=job_id)
+    batch = [job]
+    payload = job.get_payload
+    handler = JOB_KINDS.get(job.kind)
+    try:
+        if handler is None:
+            raise JobError("Unknown job kind %r." % job.kind)
+        if job.kind == 'requote':
+            absorbed, payload = _absorb_requotes(job, payload)
+            batch += absorbed
+        result = handler(payload, _Progress([member.pk for member in batch]))
+    except JobError as e:
+        return _finish(batch, str(e), retry=False)
+    except Exception:
+        return _finish(batch, traceback.format_exc(), retry=True)
+
+    if len(batch) > 1:
+        result['coalesced_jobs'] = [member.pk for member in batch]
+    now = timezone.now()
+    Job.objects. \
+        filter(pk__in=[member.pk for member in batch], status=Job.RUNNING). \
+        update(
+            status=Job.DONE,
+            result=json.dumps(result, cls=DjangoJSONEncoder),
+            error='',
+            heartbeat_at=now,
+            finished_at=now,
+        )
+    return Job.DONE
+
+
+def worker_name():
+    return '%s:%d' % (socket.gethostname(), os.getpid())
+
+
+def _run_inline(name, poll_interval, burst, log):
+    while True:
+        close_old_connections()
+        requeue_stale()
+        job_id = claim(name)
+        if job_id is None:
+            if burst:
+                return
+            time.sleep(poll_interval)
+            continue
+        log(job_id, run_job(job_id))
+
+
+def process_pool(processes):
+    """
+    A ProcessPoolExecutor whose `processes` workers have Django set up
+    """
+    # Workers are spawned rather than forked so none of them inherits the
+    # parent's database connection.
+    return ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup,
+    )
+
+
+def _run_pool(name, processes, poll_interval, burst, log):
+    pool = process_pool(processes)
+    in_flight = {}
+    with pool:
+        while True:
+            close_old_connections()
+            requeue_stale()
+            while len(in_flight) < processes:
+                job_id = claim(name)
+                if job_id is None:
+                    break
+                in_flight[pool.submit(run_job, job_id)] = job_id
+            if not in_flight:
+                if burst:
+                    return
+                time.sleep(poll_interval)
+                continue
+            done, pending = wait(
+                in_flight,
+                timeout=poll_interval,
+                return_when=FIRST_COMPLETED,
+            )
+            for future in done:
+                job_id = in_flight.pop(future)
+                try:
+                    log(job_id, future.result())
+                except Exception as e:
+                    # The job stays running and is picked up again by
+                    # requeue_stale() once its heartbeat goes stale.
+                    log(job_id, 'crashed: %s' % e)
+
+
+def run_worker(processes=1, poll_interval=1.0, burst=False, log=None):
+    """
+    Claim and run jobs until interrupted, or with `burst` until the
+    queue is empty.  `log` is called with (job id, outcome) for every
+    job run.
+    """
+    log = log or (lambda job_id, outcome: None)
+    name = worker_name()
+    if processes > 1:
+        _run_pool(name, processes, poll_interval, burst, log)
+    else:
+        _run_inline(name, poll_interval, burst, log)
@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from quotes.benchmarks import run_benchmarks
+
+
+class Command(BaseCommand):
+    help = "Benchmark the quote hot paths on a synthetic portfolio in a throwaway test database and print JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--properties', type=int, default=100)
+        parser.add_argument('--min-units', type=int, default=10)
+        parser.add_argument('--max-units', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--label', help="Free-form label stored with the run, e.g. a commit hash")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            report = run_benchmarks(
+                properties=options['properties'],
+                min_units=options['min_units'],
+                max_units=options['max_units'],
+                seed=options['seed'],
+                repeat=options['repeat'],
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report['label'] = options['label']
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output)
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,60 @@
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from quotes.sqlite_benchmark import run_writer_benchmark
+from quotes.synthetic import generate_portfolio
+
+
+class Command(BaseCommand):
+    help = "Compare concurrent-writer throughput of the stock and production SQLite setups on a synthetic portfolio and print JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--properties', type=int, default=50)
+        parser.add_argument('--min-units', type=int, default=10)
+        parser.add_argument('--max-units', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--transactions', type=int, default=50, help="Edits committed by each writer")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("This benchmark compares SQLite setups only")
+        if min(options['properties'], options['writers'], options['transactions']) < 1:
+            raise CommandError("--properties, --writers and --transactions must be positive")
+
+        with tempfile.TemporaryDirectory() as directory:
+            template = os.path.join(directory, 'template.sqlite3')
+            connection.settings_dict['TEST']['NAME'] = template
+            setup_test_environment()
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                address_ids = generate_portfolio(
+                    options['properties'],
+                    min_units=options['min_units'],
+                    max_units=options['max_units'],
+                    seed=options['seed'],
+                )
+                connection.close()
+                report = run_writer_benchmark(
+                    template,
+                    directory,
+                    address_ids,
+                    writers=options['writers'],
+                    transactions=options['transactions'],
+                )
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output)
+        else:
+            self.stdout.write(output)
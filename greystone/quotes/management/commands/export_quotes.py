@@ -0,0 +1,50 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quotes.export import (
+    EXPORT_FORMATS, ExportError, export_chunks, export_filters
+)
+
+
+class Command(BaseCommand):
+    help = "Stream every quote as CSV or NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=EXPORT_FORMATS,
+            default='csv',
+        )
+        parser.add_argument('--state')
+        parser.add_argument('--zip')
+        parser.add_argument('--min-loan')
+        parser.add_argument('--max-loan')
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help="Compress the output",
+        )
+        parser.add_argument(
+            '--output',
+            help="File to write (default: standard output)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            chunks = export_chunks(
+                options['format'],
+                filters=export_filters(options),
+                compress=options['gzip'],
+            )
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
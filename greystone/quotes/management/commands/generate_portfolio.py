@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quotes.synthetic import generate_portfolio
+
+
+class Command(BaseCommand):
+    help = "Create a reproducible synthetic portfolio of quoted properties"
+
+    def add_arguments(self, parser):
+        parser.add_argument('properties', type=int)
+        parser.add_argument('--min-units', type=int, default=10)
+        parser.add_argument('--max-units', type=int, default=1000)
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help="Same seed, same portfolio; use a new seed to add more properties",
+        )
+
+    def handle(self, *args, **options):
+        if not 1 <= options['min_units'] <= options['max_units']:
+            raise CommandError("Expected 1 <= --min-units <= --max-units")
+        address_ids = generate_portfolio(
+            options['properties'],
+            min_units=options['min_units'],
+            max_units=options['max_units'],
+            seed=options['seed'],
+        )
+        self.stdout.write("Created %d quoted properties." % len(address_ids))
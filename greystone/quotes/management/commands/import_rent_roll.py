@@ -0,0 +1,43 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quotes.rentroll import IMPORT_FORMATS, import_rent_roll
+
+
+class Command(BaseCommand):
+    help = "Bulk import a CSV or JSONL rent roll and requote every touched property"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format',
+            choices=IMPORT_FORMATS,
+            help="File format (default: guessed from the file extension)",
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=400,
+            help="Rows written per bulk insert",
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format']
+        if format is None:
+            extension = os.path.splitext(path)[1].lstrip('.').lower()
+            format = 'jsonl' if extension in ('jsonl', 'ndjson') else 'csv'
+
+        try:
+            with open(path, 'rb') as rent_roll:
+                report = import_rent_roll(
+                    rent_roll,
+                    format=format,
+                    chunk_size=options['chunk_size'],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+
+        self.stdout.write(json.dumps(report, indent=2))
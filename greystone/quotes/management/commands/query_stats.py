@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+
+from quotes.instrumentation import load_snapshots, merge_snapshots
+
+
+SORT_KEYS = {
+    'latency': 'latency_seconds',
+    'queries': 'queries',
+    'sql': 'sql_seconds',
+    'duplicates': 'duplicate_queries',
+}
+
+
+class Command(BaseCommand):
+    help = "Show the most expensive routes recorded by QueryStatsMiddleware"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10)
+        parser.add_argument(
+            '--sort',
+            choices=sorted(SORT_KEYS),
+            default='queries',
+            help="Rank routes by their per-request average of this measure",
+        )
+        parser.add_argument('--dir', help="Snapshot directory (default: QUOTES_STATS_DIR)")
+
+    def handle(self, *args, **options):
+        routes = merge_snapshots(load_snapshots(options['dir']))
+        if not routes:
+            self.stdout.write("No request statistics recorded yet.")
+            return
+
+        key = SORT_KEYS[options['sort']]
+        ranked = sorted(
+            routes.items(),
+            key=lambda item: item[1][key] / item[1]['requests'],
+            reverse=True,
+        )[:options['top']]
+
+        self.stdout.write(
+            "%-30s %9s %10s %9s %10s %9s"
+            % ('route', 'requests', 'avg ms', 'queries', 'sql ms', 'dupes')
+        )
+        for route, stats in ranked:
+            requests = stats['requests']
+            self.stdout.write(
+                "%-30s %9d %10.1f %9.1f %10.1f %9.1f"
+                % (
+                    route,
+                    requests,
+                    stats['latency_seconds'] * 1000 / requests,
+                    stats['queries'] / requests,
+                    stats['sql_seconds'] * 1000 / requests,
+                    stats['duplicate_queries'] / requests,
+                )
+            )
+            statements = sorted(
+                stats['duplicate_statements'].items(),
+                key=lambda item: item[1],
+                reverse=True,
+            )[:3]
+            for sql, count in statements:
+                self.stdout.write("    %6d x repeated: %s" % (count, sql[:100]))
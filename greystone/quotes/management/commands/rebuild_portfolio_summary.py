@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from quotes.models import PortfolioSummary
+
+
+class Command(BaseCommand):
+    help = "Recompute the portfolio summary totals from every quote"
+
+    def handle(self, *args, **options):
+        rows = PortfolioSummary.objects.rebuild()
+        self.stdout.write("Rebuilt %d summary rows." % rows)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from quotes.models import Result
+
+
+class Command(BaseCommand):
+    help = "Verify stored annual property rents against the rent rolls and repair drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Report drift without repairing it",
+        )
+
+    def handle(self, *args, **options):
+        repair = not options['dry_run']
+        drifted = Result.objects.reconcile_rents(repair=repair)
+        for address_id, (stored, actual) in sorted(drifted.items()):
+            self.stdout.write(
+                "Address %s: stored %s, rent roll %s"
+                % (address_id, stored, actual)
+            )
+        if not drifted:
+            self.stdout.write("All annual property rents match their rent rolls.")
+        elif repair:
+            self.stdout.write("Repaired %d quotes." % len(drifted))
+        else:
+            self.stdout.write("%d quotes drifted." % len(drifted))
@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quotes.repricing import requote_all
+
+
+class Command(BaseCommand):
+    help = "Reprice every quote at the current debt rate"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help="Spread chunks across this many processes",
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help="Continue the last unfinished run at the same debt rate",
+        )
+
+    def handle(self, *args, **options):
+        if min(options['chunk_size'], options['batch_size'], options['workers']) < 1:
+            raise CommandError("Sizes and --workers must be positive")
+
+        def progress(run):
+            self.stderr.write(
+                "Repriced %d quotes through result %d"
+                % (run.requoted, run.last_result_id)
+            )
+
+        report = requote_all(
+            chunk_size=options['chunk_size'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            resume=options['resume'],
+            progress=progress,
+        )
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quotes.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (requotes, repricing, imports)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            help="Run up to this many jobs at once, each in its own process",
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the queue is empty",
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help="Exit once the queue is empty",
+        )
+
+    def handle(self, *args, **options):
+        if options['processes'] < 1 or options['poll_interval'] <= 0:
+            raise CommandError("--processes and --poll-interval must be positive")
+
+        def log(job_id, outcome):
+            self.stderr.write("Job %d: %s" % (job_id, outcome))
+
+        run_worker(
+            processes=options['processes'],
+            poll_interval=options['poll_interval'],
+            burst=options['burst'],
+            log=log,
+        )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quotes.models import Rent
+
+
+class Command(BaseCommand):
+    help = "Raise or lower monthly rents by a percentage in one statement"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'percent',
+            type=float,
+            help="Percentage change, e.g. 3 or -2.5",
+        )
+        parser.add_argument('--state')
+        parser.add_argument('--zip')
+        parser.add_argument('--address', type=int)
+
+    def handle(self, *args, **options):
+        rents = Rent.objects.all()
+        if options['state']:
+            rents = rents.filter(address__state=options['state'])
+        if options['zip']:
+            rents = rents.filter(address__zip_code=options['zip'])
+        if options['address']:
+            rents = rents.filter(address_id=options['address'])
+        try:
+            updated = rents.scale_rents(options['percent'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write("Updated %d units." % updated)
@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quotes.models import Result
+from quotes.sensitivity import parse_grid, sensitivity
+
+
+class Command(BaseCommand):
+    help = "Print the loan amount matrix over a grid of debt rates, cap rates, terms and DSCRs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--address', type=int, help="Address id (default: whole portfolio)")
+        parser.add_argument('--state')
+        parser.add_argument('--zip', dest='zip_code')
+        parser.add_argument('--debt-rates', dest='debt_rates', help="e.g. 3:8:0.25 or 4.5,5,5.5")
+        parser.add_argument('--cap-rates', dest='cap_rates', help="Default: each property's own cap rate")
+        parser.add_argument('--terms', help="Amortization terms in months, e.g. 120,240,360")
+        parser.add_argument('--dscrs', help="DSCR thresholds, e.g. 1.2,1.25,1.35")
+
+    def handle(self, *args, **options):
+        try:
+            grid = parse_grid(options)
+            matrix = sensitivity(
+                grid,
+                address_id=options['address'],
+                state=options['state'],
+                zip_code=options['zip_code'],
+            )
+        except (ValueError, Result.DoesNotExist) as e:
+            raise CommandError(e)
+        self.stdout.write(json.dumps(matrix))
@@ -0,0 +1,21 @@
+# Generated by Django 2.0.5 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0019_auto_20180814_1439'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['state', 'id'], name='quotes_addr_state_105d2d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['zip_code', 'id'], name='quotes_addr_zip_cod_6e83bc_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.0.5 on 2026-10-18 17:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0021_address_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepricingRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('debt_rate', models.DecimalField(decimal_places=2, max_digits=6, verbose_name='debt Rate')),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='started')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='finished')),
+                ('last_result_id', models.PositiveIntegerField(default=0, verbose_name='last Result repriced')),
+                ('requoted', models.PositiveIntegerField(default=0, verbose_name='quotes repriced')),
+            ],
+        ),
+    ]
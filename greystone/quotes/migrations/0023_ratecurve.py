@@ -0,0 +1,28 @@
+# Generated by Django 2.0.5 on 2026-10-18 17:16
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0022_repricingrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateCurve',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('effective_date', models.DateField(verbose_name='effective Date')),
+                ('tenor_months', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)], verbose_name='tenor (in months)')),
+                ('index_rate', models.DecimalField(decimal_places=3, max_digits=6, verbose_name='index Rate')),
+                ('spread', models.DecimalField(decimal_places=3, max_digits=6, verbose_name='spread')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='ratecurve',
+            unique_together={('tenor_months', 'effective_date')},
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.0.5 on 2026-10-18 17:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0023_ratecurve'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rent',
+            index=models.Index(fields=['address', 'id'], name='quotes_rent_address_8b6e38_idx'),
+        ),
+    ]
@@ -0,0 +1,122 @@
+from django.db import migrations
+
+
+# Keep Rent.annual_unit_rent and Expense.annual_expense in step with the
+# columns they are derived from for every write, including
+# QuerySet.update, bulk_create and bulk_update.  Other backends rely on
+# the Python fallback in Rent.save and Expense.save.
+#
+# SQLite drops a table's triggers when a migration rebuilds the table,
+# so a later migration altering quotes_rent or quotes_expense there must
+# recreate them.
+
+EXPENSE_COLUMNS = ('marketing', 'taxes', 'insurance', 'repairs', 'administration')
+ANNUAL_EXPENSE = ' + '.join('NEW.%s' % column for column in EXPENSE_COLUMNS)
+
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER quotes_rent_annual_unit_rent_insert
+    AFTER INSERT ON quotes_rent FOR EACH ROW
+    BEGIN
+        UPDATE quotes_rent SET annual_unit_rent = NEW.monthly_rent * 12
+        WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER quotes_rent_annual_unit_rent_update
+    AFTER UPDATE OF monthly_rent, annual_unit_rent ON quotes_rent FOR EACH ROW
+    WHEN NEW.annual_unit_rent IS NOT NEW.monthly_rent * 12
+    BEGIN
+        UPDATE quotes_rent SET annual_unit_rent = NEW.monthly_rent * 12
+        WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER quotes_expense_annual_expense_insert
+    AFTER INSERT ON quotes_expense FOR EACH ROW
+    BEGIN
+        UPDATE quotes_expense SET annual_expense = %s
+        WHERE expense_id = NEW.expense_id;
+    END
+    """ % ANNUAL_EXPENSE,
+    """
+    CREATE TRIGGER quotes_expense_annual_expense_update
+    AFTER UPDATE OF %s, annual_expense ON quotes_expense FOR EACH ROW
+    WHEN NEW.annual_expense IS NOT (%s)
+    BEGIN
+        UPDATE quotes_expense SET annual_expense = %s
+        WHERE expense_id = NEW.expense_id;
+    END
+    """ % (', '.join(EXPENSE_COLUMNS), ANNUAL_EXPENSE, ANNUAL_EXPENSE),
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS quotes_rent_annual_unit_rent_insert",
+    "DROP TRIGGER IF EXISTS quotes_rent_annual_unit_rent_update",
+    "DROP TRIGGER IF EXISTS quotes_expense_annual_expense_insert",
+    "DROP TRIGGER IF EXISTS quotes_expense_annual_expense_update",
+]
+
+POSTGRESQL_TRIGGERS = [
+    """
+    CREATE OR REPLACE FUNCTION quotes_rent_annual_unit_rent() RETURNS trigger AS $$
+    BEGIN
+        NEW.annual_unit_rent := NEW.monthly_rent * 12;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER quotes_rent_annual_unit_rent
+    BEFORE INSERT OR UPDATE ON quotes_rent
+    FOR EACH ROW EXECUTE PROCEDURE quotes_rent_annual_unit_rent()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION quotes_expense_annual_expense() RETURNS trigger AS $$
+    BEGIN
+        NEW.annual_expense := %s;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """ % ANNUAL_EXPENSE,
+    """
+    CREATE TRIGGER quotes_expense_annual_expense
+    BEFORE INSERT OR UPDATE ON quotes_expense
+    FOR EACH ROW EXECUTE PROCEDURE quotes_expense_annual_expense()
+    """,
+]
+
+POSTGRESQL_DROP = [
+    "DROP TRIGGER IF EXISTS quotes_rent_annual_unit_rent ON quotes_rent",
+    "DROP FUNCTION IF EXISTS quotes_rent_annual_unit_rent()",
+    "DROP TRIGGER IF EXISTS quotes_expense_annual_expense ON quotes_expense",
+    "DROP FUNCTION IF EXISTS quotes_expense_annual_expense()",
+]
+
+TRIGGERS = {
+    'sqlite': (SQLITE_TRIGGERS, SQLITE_DROP),
+    'postgresql': (POSTGRESQL_TRIGGERS, POSTGRESQL_DROP),
+}
+
+
+def create_triggers(apps, schema_editor):
+    create, drop = TRIGGERS.get(schema_editor.connection.vendor, ([], []))
+    for statement in create:
+        schema_editor.execute(statement)
+
+
+def drop_triggers(apps, schema_editor):
+    create, drop = TRIGGERS.get(schema_editor.connection.vendor, ([], []))
+    for statement in drop:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0024_rent_roll_cursor_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.0.5 on 2026-10-18 17:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0025_derived_column_triggers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('all', 'portfolio'), ('state', 'state'), ('zip', 'zip code')], max_length=5, verbose_name='scope')),
+                ('key', models.CharField(blank=True, max_length=5, verbose_name='state or zip code')),
+                ('quotes', models.IntegerField(default=0, verbose_name='quotes')),
+                ('loan_amount', models.BigIntegerField(default=0, verbose_name='total Loan Amount')),
+                ('noi', models.BigIntegerField(default=0, verbose_name='total Net Operating Income')),
+                ('property_value', models.BigIntegerField(default=0, verbose_name='total Property Value')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='portfoliosummary',
+            unique_together={('scope', 'key')},
+        ),
+    ]
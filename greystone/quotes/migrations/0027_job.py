@@ -0,0 +1,39 @@
+# Generated by Django 2.0.5 on 2026-10-18 17:25
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0026_portfoliosummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=30, verbose_name='kind')),
+                ('payload', models.TextField(default='{}', verbose_name='payload (JSON)')),
+                ('status', models.CharField(choices=[('queued', 'queued'), ('running', 'running'), ('done', 'done'), ('failed', 'failed')], default='queued', max_length=10, verbose_name='status')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='attempts')),
+                ('max_attempts', models.PositiveIntegerField(default=3, verbose_name='max Attempts')),
+                ('progress', models.PositiveIntegerField(default=0, verbose_name='items done')),
+                ('total', models.PositiveIntegerField(blank=True, null=True, verbose_name='items in total')),
+                ('result', models.TextField(blank=True, verbose_name='result (JSON)')),
+                ('error', models.TextField(blank=True, verbose_name='last Error')),
+                ('worker', models.CharField(blank=True, max_length=100, verbose_name='claimed by')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='run after')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='started')),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True, verbose_name='last Heartbeat')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='finished')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', 'run_after', 'id'], name='quotes_job_status_179c7d_idx'),
+        ),
+    ]
@@ -1,6 +1,17 @@
+import json
+
 from django.db import models
-from django.db.models import Avg, Count, Min, Sum
+from django.db.models import (
+    Avg, Case, Count, ExpressionWrapper, F, Min, OuterRef, Subquery, Sum,
+    Value, When
+)
+from django.db.models.functions import Cast, Coalesce
 from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from quotes import cache, engine, rates
+from quotes.bulk import IN_LIST_SIZE, bulk_update, id_batches
 
 
 """
@@ -25,6 +36,95 @@ Shaun Cox 8/14/18
 """
 
 
+# Result figures totalled by PortfolioSummary
+SUMMARY_TOTALS = (
+    'loan_amount',
+    'noi',
+    'property_value',
+)
+
+
+def quote_inputs(address_ref, rents=True):
+    """
+    Annotations that fetch the inputs of a quote - rent roll total,
+    annual expense and cap rate - as correlated subqueries of the
+    address referenced by `address_ref`, so any number of quotes can be
+    read in one SQL statement.
+
+    With rents='unquoted' the rent roll is only summed for addresses
+    that have no Result yet; quoted addresses reuse the total kept
+    current by the Rent signals.
+    """
+    annotations = {
+        'annual_expense': Subquery(
+            Expense.objects. \
+                filter(address_id=OuterRef(address_ref)). \
+                values('annual_expense')[:1],
+            output_field=models.PositiveIntegerField(),
+        ),
+        'cap_rate': Subquery(
+            CapRate.objects. \
+                filter(address_id=OuterRef(address_ref)). \
+                values('cap_rate')[:1],
+            output_field=models.DecimalField(
+                decimal_places=2,
+                max_digits=5,
+            ),
+        ),
+    }
+    if rents:
+        rent_roll_total = Coalesce(
+            Subquery(
+                Rent.objects. \
+                    filter(address_id=OuterRef(address_ref)). \
+                    order_by(). \
+                    values('address_id'). \
+                    annotate(total=Sum('annual_unit_rent')). \
+                    values('total'),
+                output_field=models.IntegerField(),
+            ),
+            0,
+        )
+        if rents == 'unquoted':
+            rent_roll_total = Case(
+                When(result__isnull=True, then=rent_roll_total),
+                default=F('result__annual_property_rent'),
+                output_field=models.IntegerField(),
+            )
+        annotations['rent_roll_total'] = rent_roll_total
+    return annotations
+
+
+class AddressQuerySet(models.QuerySet):
+
+    def with_inputs(self, rents=True):
+        """
+        Annotate each address with the inputs of its quote
+        """
+        return self.annotate(**quote_inputs('pk', rents=rents))
+
+    def bump_version(self):
+        """
+        Mark the quotes of these addresses as changed (see
+        quotes/conditional.py)
+        """
+        bumped = self.update(version=F('version') + 1)
+        if bumped:
+            CollectionVersion.objects.db_manager(self.db).bump()
+        return bumped
+
+    def delete(self):
+        from quotes.signals import deferred_maintenance
+
+        # The quotes go with the addresses, so the cascade skips the
+        # per-row rent maintenance.
+        with deferred_maintenance(self.values_list('pk', flat=True)):
+            return super(AddressQuerySet, self).delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class Address(models.Model):
     """
     Address of the commercial property
@@ -45,6 +145,13 @@ class Address(models.Model):
         "zip Code",
         max_length=5,
     )
+    version = models.PositiveIntegerField(
+        "version",
+        default=0,
+        editable=False,
+    )
+
+    objects = AddressQuerySet.as_manager()
 
     class Meta:
         unique_together = [
@@ -53,10 +160,30 @@ class Address(models.Model):
             "state", 
             "zip_code"
         ]
+        indexes = [
+            models.Index(fields=["state", "id"]),
+            models.Index(fields=["zip_code", "id"]),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Address, cls).from_db(db, field_names, values)
+        instance._loaded_location = (
+            instance.__dict__.get('state'),
+            instance.__dict__.get('zip_code'),
+        )
+        return instance
 
     def __str__(self):
         return self.street
 
+    def delete(self, *args, **kwargs):
+        from quotes.signals import deferred_maintenance
+
+        # See AddressQuerySet.delete.
+        with deferred_maintenance([self.pk]):
+            return super(Address, self).delete(*args, **kwargs)
+
 
 class Expense(models.Model):
     """
@@ -99,6 +226,8 @@ class Expense(models.Model):
 
     def save(self, *args, **kwargs):
         self.expense_id = self.address.id
+        # Also maintained by a database trigger (migration 0025) where
+        # the backend supports it.
         self.annual_expense = self.get_annual_expense 
         super(Expense, self).save(*args, **kwargs)
 
@@ -130,6 +259,44 @@ class CapRate(models.Model):
         super(CapRate, self).save(*args, **kwargs)
 
 
+class RentQuerySet(models.QuerySet):
+
+    def scale_rents(self, percent):
+        """
+        Raise (or, for a negative `percent`, lower) the monthly rent of
+        every unit in the queryset by `percent`, rounded to whole
+        dollars, in one UPDATE, then requote the affected properties
+        from their full rent rolls.  Returns the number of units changed.
+        """
+        if percent <= -100:
+            raise ValueError("Rents cannot be lowered by 100% or more")
+        address_ids = set(
+            self.order_by().values_list('address_id', flat=True).distinct()
+        )
+        monthly_rent = Cast(
+            ExpressionWrapper(
+                F('monthly_rent') * Value(1 + percent / 100.0) + Value(0.5),
+                output_field=models.FloatField(),
+            ),
+            models.IntegerField(),
+        )
+        with transaction.atomic(using=self.db):
+            # annual_unit_rent is written too for databases without the
+            # triggers installed by migration 0025.
+            updated = self.update(
+                monthly_rent=monthly_rent,
+                annual_unit_rent=monthly_rent * 12,
+            )
+            for batch in id_batches(address_ids):
+                Address.objects.using(self.db). \
+                    filter(pk__in=batch). \
+                    bump_version()
+            Result.objects.db_manager(self.db). \
+                requote(address_ids, refresh_rents=True)
+        cache.invalidate_many(address_ids, using=self.db)
+        return updated
+
+
 class Rent(models.Model):
     """
     Rent for each unit of the commercial property
@@ -171,19 +338,191 @@ class Rent(models.Model):
         default=0,
     )
 
+    objects = RentQuerySet.as_manager()
+
     class Meta:
         unique_together = [
             "address",
             "unit_number", 
         ]
+        indexes = [
+            models.Index(fields=["address", "id"]),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Rent, cls).from_db(db, field_names, values)
+        instance._loaded_rent = (
+            instance.__dict__.get('address_id'),
+            instance.__dict__.get('annual_unit_rent'),
+        )
+        return instance
 
     @property
     def get_annual_unit_rent(self):
         return self.monthly_rent * 12
 
+    @property
+    def get_rent_deltas(self):
+        """
+        Change in annual rent per address caused by saving this unit
+        """
+        deltas = {}
+        old_address_id, old_rent = getattr(self, '_loaded_rent', (None, None))
+        if old_address_id is not None and old_rent is not None:
+            deltas[old_address_id] = -old_rent
+        deltas[self.address_id] = \
+            deltas.get(self.address_id, 0) + self.annual_unit_rent
+        return {
+            address_id: delta for address_id, delta in deltas.items()
+            if delta
+        }
+
     def save(self, *args, **kwargs):
+        # Also maintained by a database trigger (migration 0025) where
+        # the backend supports it.
         self.annual_unit_rent = self.get_annual_unit_rent 
         super(Rent, self).save(*args, **kwargs)
+        self._loaded_rent = (self.address_id, self.annual_unit_rent)
+
+
+class ResultQuerySet(models.QuerySet):
+
+    def with_inputs(self, rents=False):
+        """
+        Annotate each quote with its annual expense and cap rate (and the
+        live rent roll total when `rents` is set) in the same query
+        """
+        return self.annotate(**quote_inputs('address_id', rents=rents))
+
+
+class ResultManager(models.Manager.from_queryset(ResultQuerySet)):
+    """
+    Bulk quoting for many properties at once
+    """
+
+    def apply_rent_delta(self, address_id, delta):
+        """
+        Shift the stored annual rent of a property by `delta` in one
+        atomic UPDATE instead of re-summing its whole rent roll
+        """
+        return self.filter(address_id=address_id).update(
+            annual_property_rent=F('annual_property_rent') + delta
+        )
+
+    def reconcile_rents(self, repair=True):
+        """
+        Compare every stored annual_property_rent with the full rent roll
+        aggregate.  Returns {address_id: (stored, actual)} for every quote
+        that drifted, and requotes those when `repair` is True.
+        """
+        actual_by_address = dict(
+            Rent.objects.order_by(). \
+                values('address_id'). \
+                annotate(total=Sum('annual_unit_rent')). \
+                values_list('address_id', 'total')
+        )
+        drifted = {}
+        stored = self.values_list('address_id', 'annual_property_rent')
+        for address_id, stored_rent in stored.iterator():
+            actual_rent = actual_by_address.get(address_id) or 0
+            if stored_rent != actual_rent:
+                drifted[address_id] = (stored_rent, actual_rent)
+        if repair and drifted:
+            self.requote(drifted, refresh_rents=True)
+        return drifted
+
+    def requote(self, address_ids=None, refresh_rents=False, batch_size=500,
+            debt_rate=None):
+        """
+        Recompute the quote of every address in `address_ids` (or of every
+        address when None) in one engine pass: a single query reads the
+        inputs, then batched inserts/updates write the quotes.  Existing
+        quotes keep their incrementally maintained annual_property_rent
+        unless `refresh_rents` is set (needed after bulk rent writes,
+        which skip the Rent signals).  `debt_rate` defaults to the
+        configured rate source.  Addresses without an expense or cap rate
+        yet are skipped.  Longer `address_ids` lists are requoted
+        IN_LIST_SIZE addresses at a time, in one transaction.  Returns
+        the number of quotes written.
+        """
+        if debt_rate is None:
+            debt_rate = rates.get_debt_rate()
+        if address_ids is not None and len(address_ids) > IN_LIST_SIZE:
+            with transaction.atomic(using=self.db):
+                return sum(
+                    self.requote(batch, refresh_rents, batch_size, debt_rate)
+                    for batch in id_batches(address_ids)
+                )
+
+        addresses = Address.objects.using(self.db). \
+            with_inputs(rents=refresh_rents or 'unquoted'). \
+            filter(annual_expense__isnull=False, cap_rate__isnull=False). \
+            order_by('pk')
+        if address_ids is not None:
+            addresses = addresses.filter(pk__in=list(address_ids))
+        rows = list(addresses.values_list(
+            'pk',
+            'result__id',
+            'rent_roll_total',
+            'annual_expense',
+            'cap_rate',
+            'state',
+            'zip_code',
+            *['result__%s' % field for field in SUMMARY_TOTALS]
+        ))
+        if not rows:
+            return 0
+
+        quoted, result_ids, annual_property_rent, expenses, cap_rates, \
+            states, zip_codes = list(zip(*rows))[:7]
+        # Quote at the rate as stored, so the loans can be recomputed
+        # from the saved debt_rate.
+        debt_rate = round(debt_rate, 2)
+        computed = engine.underwrite(
+            annual_property_rent,
+            expenses,
+            cap_rates,
+            debt_rate,
+        )
+
+        to_create = []
+        to_update = []
+        summary_changes = []
+        for i, address_id in enumerate(quoted):
+            result = self.model(
+                id=result_ids[i],
+                address_id=address_id,
+                annual_property_rent=annual_property_rent[i],
+                debt_rate=debt_rate,
+            )
+            for field in engine.RESULT_FIELDS:
+                setattr(result, field, int(computed[field][i]))
+            if result.id is None:
+                to_create.append(result)
+            else:
+                to_update.append(result)
+            summary_changes.append(result.get_summary_change(
+                states[i],
+                zip_codes[i],
+                None if result.id is None else rows[i][7:],
+            ))
+
+        with transaction.atomic(using=self.db):
+            self.bulk_create(to_create, batch_size=batch_size)
+            bulk_update(
+                self.model,
+                to_update,
+                ('annual_property_rent', 'debt_rate') + engine.RESULT_FIELDS,
+                batch_size=batch_size,
+            )
+            PortfolioSummary.objects.db_manager(self.db). \
+                apply_changes(summary_changes)
+            Address.objects.using(self.db). \
+                filter(pk__in=quoted). \
+                bump_version()
+        cache.invalidate_many(quoted, using=self.db)
+        return len(quoted)
 
 
 class Result(models.Model):
@@ -247,12 +586,37 @@ class Result(models.Model):
             get(address=self.address)
         return cap_rate
 
+    objects = ResultManager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Result, cls).from_db(db, field_names, values)
+        instance._loaded_totals = tuple(
+            instance.__dict__.get(field) for field in SUMMARY_TOTALS
+        )
+        return instance
+
+    def get_summary_change(self, state, zip_code, old_totals=None):
+        """
+        This quote's change to the portfolio summary of its state and zip
+        code, coming from `old_totals` (None for a new quote), in the
+        form PortfolioSummaryManager.apply_changes takes
+        """
+        totals = [getattr(self, field) or 0 for field in SUMMARY_TOTALS]
+        if old_totals is None:
+            return (state, zip_code, 1, totals)
+        return (
+            state,
+            zip_code,
+            0,
+            [new - (old or 0) for new, old in zip(totals, old_totals)],
+        )
+
     @property
     def get_dscr_loan_amount(self):
-        loan = ((self.debt_payment / 12) * \
-            (1 - (1 / (1 + ((self.debt_rate / 100) / 12)) ** (10 * 12)))) / \
-            ((self.debt_rate / 100) / 12)
-        return loan
+        loan = (self.debt_payment / engine.PAYMENTS_PER_YEAR) * \
+            engine.cached_annuity_factor(self.debt_rate, engine.TERM_MONTHS)
+        return int(loan)
 
     @property
     def get_loan_amount(self):
@@ -262,15 +626,375 @@ class Result(models.Model):
             return self.dscr_loan_amount
 
     def save(self, *args, **kwargs):
-        self.annual_property_rent = self.get_annual_property_rent
-        annual_property_expense = self.get_annual_property_expense
-        cap_rate = self.get_cap_rate
-        self.debt_rate = 2.98 + 2.00
-        self.noi = self.annual_property_rent - annual_property_expense
-        self.debt_payment = (self.noi * 100) / 125
-        self.property_value = self.noi / (cap_rate / 100)
-        self.dscr_loan_amount = self.get_dscr_loan_amount
-        self.loan_amount = self.get_loan_amount
+        # Once a quote exists its annual_property_rent is kept current by
+        # the Rent signals, so only a new quote needs the full aggregate.
+        is_new = self.pk is None
+        inputs = Address.objects. \
+            with_inputs(rents=is_new). \
+            values(). \
+            get(pk=self.address_id)
+        if inputs['annual_expense'] is None:
+            raise Expense.DoesNotExist(
+                "Address %s has no expenses to quote" % self.address_id
+            )
+        if inputs['cap_rate'] is None:
+            raise CapRate.DoesNotExist(
+                "Address %s has no cap rate to quote" % self.address_id
+            )
+        if is_new:
+            self.annual_property_rent = inputs['rent_roll_total']
+        elif getattr(self, '_loaded_totals', None) is None:
+            self._loaded_totals = Result.objects. \
+                filter(pk=self.pk). \
+                values_list(*SUMMARY_TOTALS). \
+                first()
+        self._location = (inputs['state'], inputs['zip_code'])
+
+        self.debt_rate = round(rates.get_debt_rate(), 2)
+        computed = engine.underwrite_one(
+            self.annual_property_rent,
+            inputs['annual_expense'],
+            inputs['cap_rate'],
+            self.debt_rate,
+        )
+        for field, value in computed.items():
+            setattr(self, field, value)
         super(Result, self).save(*args, **kwargs)
+        self._loaded_totals = tuple(
+            getattr(self, field) for field in SUMMARY_TOTALS
+        )
+
+
+class CollectionVersionManager(models.Manager):
+
+    def bump(self):
+        """
+        Mark the quote collection as changed
+        """
+        if not self.filter(pk=CollectionVersion.ROW).update(version=F('version') + 1):
+            try:
+                with transaction.atomic(using=self.db):
+                    self.create(pk=CollectionVersion.ROW, version=1)
+            except IntegrityError:
+                self.filter(pk=CollectionVersion.ROW).update(version=F('version') + 1)
+
+    def current(self):
+        return self.filter(pk=CollectionVersion.ROW). \
+            values_list('version', flat=True). \
+            first() or 0
+
+
+class CollectionVersion(models.Model):
+    """
+    Single row counting changes to any address or quote input, so list
+    ETags cost one primary key lookup (see quotes/conditional.py)
+    """
+    ROW = 1
+
+    version = models.BigIntegerField(
+        "version",
+        default=0,
+    )
+
+    objects = CollectionVersionManager()
+
+
+class RepricingRun(models.Model):
+    """
+    Progress of a 'requote_all' repricing, committed with every chunk
+    so an interrupted run can resume where it stopped
+    """
+    debt_rate = models.DecimalField(
+        "debt Rate",
+        decimal_places=2,
+        max_digits=6,
+    )
+    started_at = models.DateTimeField(
+        "started",
+        auto_now_add=True,
+    )
+    finished_at = models.DateTimeField(
+        "finished",
+        null=True,
+        blank=True,
+    )
+    last_result_id = models.PositiveIntegerField(
+        "last Result repriced",
+        default=0,
+    )
+    requoted = models.PositiveIntegerField(
+        "quotes repriced",
+        default=0,
+    )
+
+    def __str__(self):
+        return "Repricing at %s%% from %s" % (self.debt_rate, self.started_at)
+
+
+class RateCurve(models.Model):
+    """
+    Index rate and spread for one loan tenor, effective from a date
+    until superseded by a later row of the same tenor
+    """
+    effective_date = models.DateField(
+        "effective Date",
+    )
+    tenor_months = models.PositiveIntegerField(
+        "tenor (in months)",
+        validators=[
+            MinValueValidator(1),
+        ],
+    )
+    index_rate = models.DecimalField(
+        "index Rate",
+        decimal_places=3,
+        max_digits=6,
+    )
+    spread = models.DecimalField(
+        "spread",
+        decimal_places=3,
+        max_digits=6,
+    )
+
+    class Meta:
+        unique_together = [
+            "tenor_months",
+            "effective_date",
+        ]
+
+    def __str__(self):
+        return "%s months from %s" % (self.tenor_months, self.effective_date)
+
+
+def summary_keys(state, zip_code):
+    """
+    (scope, key) of every PortfolioSummary row a quote counts towards
+    """
+    keys = [(PortfolioSummary.OVERALL, '')]
+    if state is not None:
+        keys.append((PortfolioSummary.STATE, state))
+    if zip_code is not None:
+        keys.append((PortfolioSummary.ZIP_CODE, zip_code))
+    return keys
+
+
+class PortfolioSummaryManager(models.Manager):
+
+    def apply_changes(self, changes):
+        """
+        Add quote changes - (state, zip code, change in quote count,
+        changes in SUMMARY_TOTALS) tuples - to the summary rows, with one
+        UPDATE per touched row
+        """
+        deltas = {}
+        for state, zip_code, quotes, totals in changes:
+            for key in summary_keys(state, zip_code):
+                delta = deltas.setdefault(key, [0] * (len(SUMMARY_TOTALS) + 1))
+                delta[0] += quotes
+                for i, total in enumerate(totals):
+                    delta[i + 1] += int(total)
+
+        for (scope, key), delta in sorted(deltas.items()):
+            if not any(delta):
+                continue
+            fields = ('quotes',) + SUMMARY_TOTALS
+            updates = {
+                field: F(field) + change for field, change in zip(fields, delta)
+            }
+            if self.filter(scope=scope, key=key).update(**updates):
+                continue
+            try:
+                with transaction.atomic(using=self.db):
+                    self.create(scope=scope, key=key, **dict(zip(fields, delta)))
+            except IntegrityError:
+                self.filter(scope=scope, key=key).update(**updates)
+
+    def rebuild(self):
+        """
+        Recompute every summary row from the quotes.  Returns the number
+        of rows written.
+        """
+        totals = dict(
+            quotes=Count('id'),
+            **{field: Coalesce(Sum(field), 0) for field in SUMMARY_TOTALS}
+        )
+        results = Result.objects.using(self.db).order_by()
+        rows = [
+            self.model(
+                scope=PortfolioSummary.OVERALL,
+                key='',
+                **results.aggregate(**totals)
+            ),
+        ]
+        for scope, lookup in ((PortfolioSummary.STATE, 'address__state'),
+                (PortfolioSummary.ZIP_CODE, 'address__zip_code')):
+            for values in results.values(lookup).annotate(**totals):
+                key = values.pop(lookup)
+                rows.append(self.model(scope=scope, key=key, **values))
+
+        with transaction.atomic(using=self.db):
+            self.all().delete()
+            self.bulk_create(rows)
+        return len(rows)
+
+
+class PortfolioSummary(models.Model):
+    """
+    Running totals of the quotes of the whole portfolio, of a state or
+    of a zip code, kept current as quotes are written and deleted
+    """
+    OVERALL = 'all'
+    STATE = 'state'
+    ZIP_CODE = 'zip'
+    SCOPES = (
+        (OVERALL, "portfolio"),
+        (STATE, "state"),
+        (ZIP_CODE, "zip code"),
+    )
+
+    scope = models.CharField(
+        "scope",
+        max_length=5,
+        choices=SCOPES,
+    )
+    key = models.CharField(
+        "state or zip code",
+        max_length=5,
+        blank=True,
+    )
+    quotes = models.IntegerField(
+        "quotes",
+        default=0,
+    )
+    loan_amount = models.BigIntegerField(
+        "total Loan Amount",
+        default=0,
+    )
+    noi = models.BigIntegerField(
+        "total Net Operating Income",
+        default=0,
+    )
+    property_value = models.BigIntegerField(
+        "total Property Value",
+        default=0,
+    )
+
+    objects = PortfolioSummaryManager()
+
+    class Meta:
+        unique_together = [
+            "scope",
+            "key",
+        ]
 
+    @property
+    def get_weighted_cap_rate(self):
+        """
+        Value-weighted cap rate: total NOI over total property value
+        """
+        if not self.property_value:
+            return None
+        return round(self.noi * 100 / self.property_value, 2)
+
+    def __str__(self):
+        return "%s %s" % (self.get_scope_display(), self.key)
+
+
+class Job(models.Model):
+    """
+    Background job run by 'manage.py run_quote_worker' (see quotes/jobs.py)
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, "queued"),
+        (RUNNING, "running"),
+        (DONE, "done"),
+        (FAILED, "failed"),
+    )
+
+    kind = models.CharField(
+        "kind",
+        max_length=30,
+    )
+    payload = models.TextField(
+        "payload (JSON)",
+        default='{}',
+    )
+    status = models.CharField(
+        "status",
+        max_length=10,
+        choices=STATUSES,
+        default=QUEUED,
+    )
+    attempts = models.PositiveIntegerField(
+        "attempts",
+        default=0,
+    )
+    max_attempts = models.PositiveIntegerField(
+        "max Attempts",
+        default=3,
+    )
+    progress = models.PositiveIntegerField(
+        "items done",
+        default=0,
+    )
+    total = models.PositiveIntegerField(
+        "items in total",
+        null=True,
+        blank=True,
+    )
+    result = models.TextField(
+        "result (JSON)",
+        blank=True,
+    )
+    error = models.TextField(
+        "last Error",
+        blank=True,
+    )
+    worker = models.CharField(
+        "claimed by",
+        max_length=100,
+        blank=True,
+    )
+    created_at = models.DateTimeField(
+        "created",
+        auto_now_add=True,
+    )
+    run_after = models.DateTimeField(
+        "run after",
+        default=timezone.now,
+    )
+    started_at = models.DateTimeField(
+        "started",
+        null=True,
+        blank=True,
+    )
+    heartbeat_at = models.DateTimeField(
+        "last Heartbeat",
+        null=True,
+        blank=True,
+    )
+    finished_at = models.DateTimeField(
+        "finished",
+        null=True,
+        blank=True,
+    )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_after", "id"]),
+        ]
+
+    @property
+    def get_payload(self):
+        return json.loads(self.payload or '{}')
+
+    @property
+    def get_result(self):
+        return json.loads(self.result) if self.result else None
+
+    def __str__(self):
+        return "%s job %s (%s)" % (self.kind, self.pk, self.status)
@@ -0,0 +1,67 @@
+import threading
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+
+"""
+Work deferred to the end of the current transaction.
+
+A CommitBatch collects ids per database alias and hands them to its
+callback in one call when the transaction commits, so touching the same
+row many times in a request costs one callback.  A rolled back
+transaction drops what it collected.  Outside a transaction the callback
+runs at once.
+"""
+
+
+class _Flush(object):
+    """
+    on_commit callback that hands a batch its collected ids
+    """
+
+    def __init__(self, batch, using):
+        self.batch = batch
+        self.using = using
+
+    def __call__(self):
+        ids = self.batch.pending(self.using)
+        self.batch._local.pending[self.using] = set()
+        if ids:
+            self.batch.callback(ids, self.using)
+
+
+class CommitBatch(object):
+    """
+    Calls `callback(ids, using)` with the ids added during a transaction
+    once it commits
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+        self._local = threading.local()
+
+    def pending(self, using):
+        if not hasattr(self._local, 'pending'):
+            self._local.pending = {}
+        return self._local.pending.setdefault(using, set())
+
+    def scheduled(self, using=None):
+        connection = transaction.get_connection(using or DEFAULT_DB_ALIAS)
+        return [
+            func for savepoint_ids, func in connection.run_on_commit
+            if isinstance(func, _Flush) and func.batch is self
+        ]
+
+    def add(self, ids, using=None):
+        using = using or DEFAULT_DB_ALIAS
+        connection = transaction.get_connection(using)
+        if not connection.in_atomic_block:
+            self.callback(set(ids), using)
+            return
+
+        pending = self.pending(using)
+        if not self.scheduled(using):
+            # Any ids left over belong to a rolled back transaction.
+            pending.clear()
+            transaction.on_commit(_Flush(self, using), using=using)
+        pending.update(ids)
@@ -0,0 +1,226 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from rest_framework import exceptions
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+"""
+Keyset (cursor) pagination shared by the quote list page and the API.
+
+Instead of OFFSET, each page continues from the sort key of the last row
+it showed, so every page is one indexed range scan however deep into the
+book it is.  The cursor is an opaque token carrying that sort key; both
+ResultListView and KeysetPagination accept and return the same tokens
+and the same `sort`, `state`, `zip` and `page_size` parameters.  A
+cursor that does not decode to a sort key of the right types is a 400
+from the API; the list page shows the first page instead.
+"""
+
+
+CURSOR_PARAM = 'cursor'
+PAGE_SIZE_PARAM = 'page_size'
+SORT_PARAM = 'sort'
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+# Every sort ends on a unique column so the keyset is total.
+RESULT_SORTS = {
+    'id': ('id',),
+    'state': ('address__state', 'address_id'),
+    'zip': ('address__zip_code', 'address_id'),
+}
+RESULT_FILTERS = {
+    'state': 'address__state',
+    'zip': 'address__zip_code',
+}
+
+
+def encode_cursor(values, reverse=False):
+    payload = json.dumps({'k': list(values), 'r': reverse})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def decode_cursor(token):
+    """
+    Returns (sort key values, reverse), or None for a missing token.
+    Raises InvalidCursor for a malformed one.
+    """
+    if not token:
+        return None
+    try:
+        payload = json.loads(
+            base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8')
+        )
+        return list(payload['k']), bool(payload['r'])
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursor("Invalid cursor.")
+
+
+def _sort_field(model, path):
+    for name in path.split('__'):
+        field = model._meta.get_field(name)
+        model = field.related_model
+    return field
+
+
+def _after(fields, values, descending):
+    """
+    Q matching rows that sort strictly after `values` on `fields`
+    """
+    lookup = 'lt' if descending else 'gt'
+    condition = Q()
+    for i in range(len(fields)):
+        clause = Q(**{'%s__%s' % (fields[i], lookup): values[i]})
+        for j in range(i):
+            clause &= Q(**{fields[j]: values[j]})
+        condition |= clause
+    return condition
+
+
+def _sort_value(obj, field):
+    for attr in field.split('__'):
+        obj = getattr(obj, attr)
+    return obj
+
+
+class KeysetPaginator(object):
+    """
+    Paginates a queryset on `fields` (descending when `descending`)
+    """
+
+    def __init__(self, queryset, fields, page_size=DEFAULT_PAGE_SIZE,
+            descending=False):
+        self.queryset = queryset
+        self.fields = fields
+        self.page_size = page_size
+        self.descending = descending
+
+    def sort_key(self, values):
+        """
+        Cursor `values` converted to the types of the sort fields
+        """
+        if len(values) != len(self.fields):
+            raise InvalidCursor("Invalid cursor.")
+        key = []
+        for field, value in zip(self.fields, values):
+            try:
+                value = _sort_field(self.queryset.model, field).to_python(value)
+            except (ValidationError, TypeError, ValueError):
+                raise InvalidCursor("Invalid cursor.")
+            if value is None:
+                raise InvalidCursor("Invalid cursor.")
+            key.append(value)
+        return key
+
+    def page(self, cursor=None):
+        """
+        Returns (rows, next cursor, previous cursor) for the page after
+        (or, for a reverse cursor, before) `cursor`.  Raises
+        InvalidCursor for a cursor that is not one of this paginator's.
+        """
+        decoded = decode_cursor(cursor)
+        values, reverse = decoded if decoded else (None, False)
+        if values is not None:
+            values = self.sort_key(values)
+        descending = self.descending != reverse
+        prefix = '-' if descending else ''
+
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(_after(self.fields, values, descending))
+        queryset = queryset.order_by(
+            *[prefix + field for field in self.fields]
+        )
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            first = [_sort_value(rows[0], field) for field in self.fields]
+            last = [_sort_value(rows[-1], field) for field in self.fields]
+            if has_more or reverse:
+                next_cursor = encode_cursor(last)
+            if values is not None and (has_more or not reverse):
+                previous_cursor = encode_cursor(first, reverse=True)
+        return rows, next_cursor, previous_cursor
+
+
+def get_page_size(query_params):
+    try:
+        page_size = int(query_params.get(PAGE_SIZE_PARAM, DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+def filter_results(queryset, query_params):
+    """
+    Apply the state/zip filters and return (queryset, sort fields,
+    descending) for a Result queryset
+    """
+    for param, field in RESULT_FILTERS.items():
+        value = query_params.get(param)
+        if value:
+            queryset = queryset.filter(**{field: value})
+    sort = query_params.get(SORT_PARAM, 'id')
+    descending = sort.startswith('-')
+    fields = RESULT_SORTS.get(sort.lstrip('-'), RESULT_SORTS['id'])
+    return queryset, fields, descending
+
+
+def paginate_results(queryset, query_params):
+    """
+    Filter, sort and keyset-paginate a Result queryset from request
+    query parameters.  Returns (rows, next cursor, previous cursor).
+    """
+    queryset, fields, descending = filter_results(queryset, query_params)
+    paginator = KeysetPaginator(
+        queryset,
+        fields,
+        page_size=get_page_size(query_params),
+        descending=descending,
+    )
+    return paginator.page(query_params.get(CURSOR_PARAM))
+
+
+def cursor_url(url, cursor):
+    if cursor is None:
+        return None
+    return replace_query_param(url, CURSOR_PARAM, cursor)
+
+
+class KeysetPagination(BasePagination):
+    """
+    DRF pagination class speaking the same cursor contract as the
+    quote list page
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            rows, self.next_cursor, self.previous_cursor = \
+                paginate_results(queryset, request.query_params)
+        except InvalidCursor as e:
+            raise exceptions.ValidationError({CURSOR_PARAM: [str(e)]})
+        return rows
+
+    def get_paginated_response(self, data):
+        url = self.request.build_absolute_uri()
+        return Response({
+            'next': cursor_url(url, self.next_cursor),
+            'previous': cursor_url(url, self.previous_cursor),
+            'results': data,
+        })
@@ -0,0 +1,147 @@
+import bisect
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+import numpy as np
+
+from quotes import engine
+
+
+"""
+Where the debt rate quoted on every loan comes from.
+
+QUOTES_RATE_SOURCE names a callable taking (as_of, term) and returning
+the debt rate in percent.  The default, curve_rate, prices off the
+RateCurve table: for every tenor the row in effect on the date is found
+by binary search over that tenor's sorted effective dates, the rate is
+index plus spread, and terms between tenors are interpolated linearly
+(flat beyond the shortest and longest tenor).  The table is held in
+memory by curve_cache, reloaded when a RateCurve row is saved or deleted
+in this process and at least every QUOTES_RATE_CURVE_TTL seconds for
+changes made by other processes, so a lookup costs no query.
+get_cached_debt_rate skips the TTL reload, for code paths that must not
+query at all.
+
+Without any curve rows in effect, constant_rate is used:
+QUOTES_BASE_RATE plus QUOTES_RATE_SPREAD (2.98 + 2.00 unless
+configured).  After the rates change, reprice the stored quotes with
+'manage.py requote_all'.
+"""
+
+
+DEFAULT_RATE_SOURCE = 'quotes.rates.curve_rate'
+
+
+class RateCurveCache(object):
+    """
+    In-memory copy of the RateCurve table: per tenor, effective dates
+    (as ordinals) and rates, both sorted by date
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tenors = []
+        self.dates = []
+        self.rates = []
+        self.loaded_at = None
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def _is_fresh(self, expire=True):
+        if self.loaded_at is None:
+            return False
+        ttl = getattr(settings, 'QUOTES_RATE_CURVE_TTL', 60)
+        return not expire or time.monotonic() - self.loaded_at < ttl
+
+    def _load(self):
+        RateCurve = apps.get_model('quotes', 'RateCurve')
+        rows = RateCurve.objects. \
+            order_by('tenor_months', 'effective_date'). \
+            values_list('tenor_months', 'effective_date', 'index_rate', 'spread')
+        tenors, dates, rates = [], [], []
+        for tenor, effective_date, index_rate, spread in rows:
+            if not tenors or tenors[-1] != tenor:
+                tenors.append(tenor)
+                dates.append([])
+                rates.append([])
+            dates[-1].append(effective_date.toordinal())
+            rates[-1].append(float(index_rate + spread))
+        self.tenors, self.dates, self.rates = tenors, dates, rates
+        self.loaded_at = time.monotonic()
+
+    def refresh(self, expire=True):
+        """
+        Reload the table if it was never loaded or was invalidated, and
+        with `expire` also once it is older than QUOTES_RATE_CURVE_TTL
+        """
+        if not self._is_fresh(expire):
+            with self.lock:
+                if not self._is_fresh(expire):
+                    self._load()
+
+    def rate(self, as_of, term, expire=True):
+        """
+        Rate in effect on date `as_of` for a `term` month loan, or None
+        when no tenor has a row in effect yet
+        """
+        self.refresh(expire)
+        day = as_of.toordinal()
+        tenors = []
+        rates = []
+        for tenor, dates, tenor_rates in zip(self.tenors, self.dates, self.rates):
+            i = bisect.bisect_right(dates, day)
+            if i:
+                tenors.append(tenor)
+                rates.append(tenor_rates[i - 1])
+        if not tenors:
+            return None
+        return float(np.interp(term, tenors, rates))
+
+
+curve_cache = RateCurveCache()
+
+
+def constant_rate(as_of=None, term=engine.TERM_MONTHS):
+    base_rate = getattr(settings, 'QUOTES_BASE_RATE', engine.BASE_RATE)
+    spread = getattr(settings, 'QUOTES_RATE_SPREAD', engine.RATE_SPREAD)
+    return float(base_rate) + float(spread)
+
+
+def curve_rate(as_of=None, term=engine.TERM_MONTHS, expire=True):
+    rate = curve_cache.rate(as_of or timezone.localdate(), term, expire)
+    if rate is None:
+        return constant_rate(as_of, term)
+    return rate
+
+
+def get_rate_source():
+    return import_string(
+        getattr(settings, 'QUOTES_RATE_SOURCE', DEFAULT_RATE_SOURCE)
+    )
+
+
+def get_debt_rate(as_of=None, term=engine.TERM_MONTHS):
+    """
+    Debt rate (in percent) quoted on a `term` month loan priced on
+    `as_of` (default: today)
+    """
+    return get_rate_source()(as_of, term)
+
+
+def get_cached_debt_rate(as_of=None, term=engine.TERM_MONTHS):
+    """
+    get_debt_rate() for requests that must not query the database.  With
+    the default source the curve already in memory is used however old;
+    it is only loaded when this process has none yet or after a RateCurve
+    row changed in it.
+    """
+    source = get_rate_source()
+    if source is curve_rate:
+        return curve_rate(as_of, term, expire=False)
+    return source(as_of, term)
@@ -0,0 +1,36 @@
+from django.conf import settings
+
+from quotes import jobs, oncommit
+from quotes.models import Result
+
+
+"""
+Deferred quote recomputation.
+
+Views call mark_dirty() for every address they touch instead of saving
+the Result themselves.  Within a transaction the marks are collected and
+deduplicated, and a single on_commit callback requotes all of them in
+one batch - so a request costs at most one Result write per address, and
+a rolled back request writes nothing.  Outside a transaction the quote
+is recomputed immediately.  With QUOTES_RECOMPUTE_IN_BACKGROUND the
+batch is handed to the job queue as one 'requote' job instead, so the
+request returns without waiting for it.
+"""
+
+
+def _requote(address_ids, using):
+    if getattr(settings, 'QUOTES_RECOMPUTE_IN_BACKGROUND', False):
+        jobs.enqueue('requote', {'address_ids': sorted(address_ids)})
+    else:
+        Result.objects.db_manager(using).requote(address_ids)
+
+
+dirty = oncommit.CommitBatch(_requote)
+
+
+def mark_dirty(address_id, using=None):
+    """
+    Schedule the quote of `address_id` to be recomputed when the current
+    transaction commits
+    """
+    dirty.add([address_id], using=using)
@@ -0,0 +1,398 @@
+import csv
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from quotes import cache
+from quotes.bulk import bulk_update, id_batches
+from quotes.models import Address, Rent, Result
+from quotes.signals import deferred_maintenance
+
+
+"""
+Rent roll bulk operations.
+
+import_rent_roll streams a CSV or JSONL rent roll in chunks: each chunk
+is validated in Python, written with one bulk_create, and every touched
+quote is recomputed once at the very end instead of once per unit.
+
+apply_rent_roll_changes edits one property's rent roll in a single
+transaction - one bulk_create, one bulk_update and one DELETE ... IN,
+with the per-row signal maintenance deferred - and then recomputes its
+quote once.  parse_rent_roll_changes validates
+a JSON change set for it.
+
+RentRollCursor walks a rent roll unit by unit for the update views;
+each step is one lookup on the (address, id) index.
+"""
+
+
+RENT_ROLL_FIELDS = (
+    'address_id',
+    'unit_number',
+    'monthly_rent',
+    'vacancy',
+    'bedrooms',
+    'bathrooms',
+)
+
+# Fields a rent roll edit may change; annual_unit_rent is derived.
+UNIT_FIELDS = RENT_ROLL_FIELDS[1:]
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+
+
+class RentRollCursor(object):
+    """
+    First, next and previous unit ids of one property's rent roll, in
+    unit id order
+    """
+
+    def __init__(self, address_id):
+        self.address_id = address_id
+
+    def _units(self):
+        return Rent.objects. \
+            filter(address_id=self.address_id). \
+            values_list('id', flat=True)
+
+    def first(self):
+        return self._units().order_by('id').first()
+
+    def next(self, unit_id):
+        return self._units().filter(id__gt=unit_id).order_by('id').first()
+
+    def previous(self, unit_id):
+        return self._units().filter(id__lt=unit_id).order_by('-id').first()
+
+
+def _decode_lines(lines, encoding='utf-8'):
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode(encoding)
+        yield line
+
+
+def find_undecodable_line(lines, encoding='utf-8'):
+    """
+    Number of the first of `lines` that is not valid `encoding` text, or
+    None when all of them are
+    """
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            try:
+                line.decode(encoding)
+            except UnicodeDecodeError:
+                return line_number
+    return None
+
+
+def read_rent_roll(lines, format='csv'):
+    """
+    Yield (line number, row dict) for every record of a CSV (with a
+    header row) or JSONL rent roll.  Malformed JSON lines are yielded
+    with a None row so the caller can report them.
+    """
+    lines = _decode_lines(lines)
+    if format == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+    elif format == 'jsonl':
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError:
+                yield line_number, None
+    else:
+        raise ValueError(
+            "Unknown rent roll format %r, expected one of %s"
+            % (format, ', '.join(IMPORT_FORMATS))
+        )
+
+
+def _build_rent(row):
+    values = {field: row.get(field) for field in RENT_ROLL_FIELDS}
+    if values['address_id'] in (None, ''):
+        values['address_id'] = row.get('address')
+    values['address_id'] = int(values['address_id'])
+    rent = Rent(**values)
+    rent.full_clean(exclude=['address'], validate_unique=False)
+    rent.annual_unit_rent = rent.get_annual_unit_rent
+    return rent
+
+
+def _import_chunk(chunk, seen, report):
+    """
+    Validate and bulk insert one chunk of (line number, row) pairs
+    """
+    rents = []
+    for line_number, row in chunk:
+        if not isinstance(row, dict):
+            report['errors'].append({
+                'line': line_number,
+                'error': "Malformed record",
+            })
+            continue
+        try:
+            rent = _build_rent(row)
+        except (ValidationError, TypeError, ValueError) as e:
+            messages = getattr(e, 'message_dict', None) or str(e)
+            report['errors'].append({
+                'line': line_number,
+                'error': messages,
+            })
+            continue
+        rents.append((line_number, rent))
+
+    address_ids = {rent.address_id for line_number, rent in rents}
+    known_addresses = set(
+        Address.objects. \
+            filter(id__in=address_ids). \
+            values_list('id', flat=True)
+    )
+    unit_numbers = {rent.unit_number for line_number, rent in rents}
+    existing = set(
+        Rent.objects. \
+            filter(
+                address_id__in=known_addresses,
+                unit_number__in=unit_numbers,
+            ). \
+            values_list('address_id', 'unit_number')
+    )
+
+    to_create = []
+    for line_number, rent in rents:
+        key = (rent.address_id, rent.unit_number)
+        if rent.address_id not in known_addresses:
+            report['errors'].append({
+                'line': line_number,
+                'error': "Address %s does not exist" % rent.address_id,
+            })
+        elif key in existing or key in seen:
+            report['duplicates'].append({
+                'line': line_number,
+                'address_id': rent.address_id,
+                'unit_number': rent.unit_number,
+            })
+        else:
+            seen.add(key)
+            to_create.append(rent)
+
+    with transaction.atomic():
+        Rent.objects.bulk_create(to_create)
+    report['created'] += len(to_create)
+    return {rent.address_id for rent in to_create}
+
+
+def import_rent_roll(lines, format='csv', chunk_size=400, progress=None):
+    """
+    Import a rent roll from an iterable of lines (an open file or an
+    upload).  Rows that fail validation or duplicate an existing
+    (address, unit_number) pair are reported rather than aborting the
+    import.  `progress`, when given, is called with the last line read
+    after every chunk written and every batch of quotes recomputed.
+    Returns a report dict.
+    """
+    report = {
+        'created': 0,
+        'duplicates': [],
+        'errors': [],
+        'requoted': 0,
+    }
+    progress = progress or (lambda line_number: None)
+    seen = set()
+    touched = set()
+    chunk = []
+    last_line = 0
+    for record in read_rent_roll(lines, format=format):
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            touched |= _import_chunk(chunk, seen, report)
+            last_line = chunk[-1][0]
+            progress(last_line)
+            chunk = []
+    if chunk:
+        touched |= _import_chunk(chunk, seen, report)
+        last_line = chunk[-1][0]
+        progress(last_line)
+    report['errors'].sort(key=lambda error: error['line'])
+
+    for batch in id_batches(touched, chunk_size):
+        requoted = Result.objects.requote(batch, refresh_rents=True)
+        if requoted < len(batch):
+            # Not quoted yet; the requote did not mark these changed.
+            unquoted = list(
+                Address.objects. \
+                    filter(pk__in=batch, result__isnull=True). \
+                    values_list('pk', flat=True)
+            )
+            Address.objects.filter(pk__in=unquoted).bump_version()
+            cache.invalidate_many(unquoted)
+        report['requoted'] += requoted
+        progress(last_line)
+    return report
+
+
+def duplicate_unit_numbers(address_id, creates=(), updates=(), deletes=()):
+    """
+    Unit numbers that would appear more than once in the rent roll of
+    `address_id` after applying the given changes
+    """
+    changed_ids = {rent.pk for rent in updates} | set(deletes)
+    unit_numbers = list(
+        Rent.objects. \
+            filter(address_id=address_id). \
+            exclude(pk__in=changed_ids). \
+            values_list('unit_number', flat=True)
+    )
+    unit_numbers += [rent.unit_number for rent in updates]
+    unit_numbers += [rent.unit_number for rent in creates]
+    seen = set()
+    duplicates = set()
+    for unit_number in unit_numbers:
+        if unit_number in seen:
+            duplicates.add(unit_number)
+        seen.add(unit_number)
+    return sorted(duplicates)
+
+
+def apply_rent_roll_changes(address_id, creates=(), updates=(),
+        deletes=(), batch_size=500):
+    """
+    Create, update and delete units of one rent roll in bulk and requote
+    the property once.  `creates` and `updates` are validated Rent
+    instances, `deletes` unit ids.  Returns a report dict.
+    """
+    for rent in list(creates) + list(updates):
+        rent.address_id = address_id
+        rent.annual_unit_rent = rent.get_annual_unit_rent
+
+    with transaction.atomic():
+        deleted = 0
+        if deletes:
+            # The quote is recomputed from the full rent roll below.
+            with deferred_maintenance([address_id]):
+                deleted, per_model = Rent.objects. \
+                    filter(address_id=address_id, pk__in=list(deletes)). \
+                    delete()
+        bulk_update(
+            Rent,
+            updates,
+            UNIT_FIELDS + ('annual_unit_rent',),
+            batch_size=batch_size,
+        )
+        Rent.objects.bulk_create(creates, batch_size=batch_size)
+        requoted = Result.objects.requote([address_id], refresh_rents=True)
+        if not requoted:
+            # Not quoted yet; the requote did not mark the address changed.
+            Address.objects.filter(pk=address_id).bump_version()
+    if not requoted:
+        cache.invalidate(address_id)
+
+    return {
+        'created': len(creates),
+        'updated': len(updates),
+        'deleted': deleted,
+        'requoted': requoted,
+    }
+
+
+def _unit_errors(rent):
+    try:
+        rent.full_clean(exclude=['address'], validate_unique=False)
+    except ValidationError as e:
+        return e.message_dict
+    return None
+
+
+def parse_rent_roll_changes(address_id, changes):
+    """
+    Validate a change set {"create": [units], "update": [units with an
+    id], "delete": [ids]} against the rent roll of `address_id`.
+    Returns (creates, updates, deletes, errors); errors is empty when
+    the whole change set is valid.
+    """
+    errors = {}
+    if not isinstance(changes, dict):
+        return [], [], [], {'non_field_errors': ["Expected an object."]}
+    sections = {}
+    for section in ('create', 'update', 'delete'):
+        sections[section] = changes.get(section) or []
+        if not isinstance(sections[section], list):
+            errors[section] = ["Expected a list."]
+    if errors:
+        return [], [], [], errors
+
+    deletes = []
+    for index, unit_id in enumerate(sections['delete']):
+        if isinstance(unit_id, int) and not isinstance(unit_id, bool):
+            deletes.append(unit_id)
+        else:
+            errors.setdefault('delete', {})[index] = ["Expected a unit id."]
+
+    update_ids = [
+        unit.get('id') for unit in sections['update']
+        if isinstance(unit, dict)
+    ]
+    existing = Rent.objects. \
+        filter(address_id=address_id). \
+        in_bulk([
+            unit_id for unit_id in update_ids + deletes
+            if isinstance(unit_id, int)
+        ])
+    for index, unit_id in enumerate(deletes):
+        if unit_id not in existing:
+            errors.setdefault('delete', {})[index] = \
+                ["Unit %s is not in this rent roll." % unit_id]
+
+    updates = []
+    for index, unit in enumerate(sections['update']):
+        if not isinstance(unit, dict):
+            errors.setdefault('update', {})[index] = ["Expected an object."]
+            continue
+        rent = existing.get(unit.get('id'))
+        if rent is None:
+            errors.setdefault('update', {})[index] = \
+                ["Unit %s is not in this rent roll." % unit.get('id')]
+            continue
+        for field in UNIT_FIELDS:
+            if field in unit:
+                setattr(rent, field, unit[field])
+        unit_errors = _unit_errors(rent)
+        if unit_errors:
+            errors.setdefault('update', {})[index] = unit_errors
+        updates.append(rent)
+
+    creates = []
+    for index, unit in enumerate(sections['create']):
+        if not isinstance(unit, dict):
+            errors.setdefault('create', {})[index] = ["Expected an object."]
+            continue
+        rent = Rent(
+            address_id=address_id,
+            **{field: unit.get(field) for field in UNIT_FIELDS}
+        )
+        unit_errors = _unit_errors(rent)
+        if unit_errors:
+            errors.setdefault('create', {})[index] = unit_errors
+        creates.append(rent)
+
+    updated_ids = [rent.pk for rent in updates]
+    if len(set(updated_ids)) != len(updated_ids) or \
+            set(updated_ids) & set(deletes):
+        errors['non_field_errors'] = [
+            "Each unit can be updated or deleted only once."
+        ]
+    if not errors:
+        duplicates = duplicate_unit_numbers(
+            address_id, creates, updates, deletes
+        )
+        if duplicates:
+            errors['non_field_errors'] = [
+                "Unit numbers must be unique: %s." % ', '.join(duplicates)
+            ]
+    return creates, updates, deletes, errors
@@ -0,0 +1,155 @@
+import time
+from collections import deque
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from quotes import rates
+from quotes.jobs import process_pool
+from quotes.models import RepricingRun, Result
+
+
+"""
+Mass repricing after the debt rate changes.
+
+requote_all() walks every Result in primary key order, chunk_size quotes
+at a time.  Each chunk is repriced by the bulk requote - one query for
+the inputs, one engine pass, batched UPDATEs - and a RepricingRun row
+records the last repriced Result in the same transaction, so a run that
+is interrupted resumes from its last committed chunk.  With workers > 1
+chunks are spread across a process pool; the checkpoint then only
+advances past chunks whose predecessors have all finished.
+"""
+
+
+def _chunks(after, chunk_size):
+    """
+    Lists of (result id, address id) in primary key order, starting
+    after result id `after`
+    """
+    while True:
+        chunk = list(
+            Result.objects. \
+                filter(pk__gt=after). \
+                order_by('pk'). \
+                values_list('pk', 'address_id')[:chunk_size]. \
+                iterator()
+        )
+        if not chunk:
+            return
+        yield chunk
+        after = chunk[-1][0]
+
+
+def _requote_chunk(address_ids, debt_rate, batch_size):
+    return Result.objects.requote(
+        address_ids,
+        debt_rate=debt_rate,
+        batch_size=batch_size,
+    )
+
+
+def _checkpoint(run, last_result_id, requoted):
+    run.last_result_id = last_result_id
+    run.requoted += requoted
+    run.save(update_fields=['last_result_id', 'requoted'])
+
+
+def _start_run(debt_rate, resume):
+    """
+    The unfinished run at `debt_rate` to resume, or a new run
+    """
+    debt_rate = Decimal(str(round(debt_rate, 2)))
+    if resume:
+        run = RepricingRun.objects. \
+            filter(finished_at__isnull=True, debt_rate=debt_rate). \
+            order_by('-pk'). \
+            first()
+        if run is not None:
+            return run
+    return RepricingRun.objects.create(debt_rate=debt_rate)
+
+
+def _requote_serial(run, debt_rate, chunk_size, batch_size, progress):
+    chunks = 0
+    for chunk in _chunks(run.last_result_id, chunk_size):
+        with transaction.atomic():
+            requoted = _requote_chunk(
+                [address_id for result_id, address_id in chunk],
+                debt_rate,
+                batch_size,
+            )
+            _checkpoint(run, chunk[-1][0], requoted)
+        chunks += 1
+        if progress:
+            progress(run)
+    return chunks
+
+
+def _requote_parallel(run, debt_rate, chunk_size, batch_size, workers,
+        progress):
+    pool = process_pool(workers)
+    chunks = 0
+    in_flight = deque()
+
+    def finish_oldest():
+        last_result_id, future = in_flight.popleft()
+        _checkpoint(run, last_result_id, future.result())
+        if progress:
+            progress(run)
+
+    with pool:
+        for chunk in _chunks(run.last_result_id, chunk_size):
+            in_flight.append((
+                chunk[-1][0],
+                pool.submit(
+                    _requote_chunk,
+                    [address_id for result_id, address_id in chunk],
+                    debt_rate,
+                    batch_size,
+                ),
+            ))
+            chunks += 1
+            if len(in_flight) > workers * 2:
+                finish_oldest()
+        while in_flight:
+            finish_oldest()
+    return chunks
+
+
+def requote_all(chunk_size=2000, batch_size=500, workers=1, resume=False,
+        progress=None):
+    """
+    Reprice every quote at the current debt rate.  `progress` is called
+    with the RepricingRun after each committed chunk.  Returns a report
+    with the number of quotes repriced and the throughput.
+    """
+    debt_rate = rates.get_debt_rate()
+    run = _start_run(debt_rate, resume)
+    resumed_from = run.last_result_id
+    requoted_before = run.requoted
+
+    start = time.perf_counter()
+    if workers > 1:
+        chunks = _requote_parallel(
+            run, debt_rate, chunk_size, batch_size, workers, progress
+        )
+    else:
+        chunks = _requote_serial(
+            run, debt_rate, chunk_size, batch_size, progress
+        )
+    seconds = time.perf_counter() - start
+
+    run.finished_at = timezone.now()
+    run.save(update_fields=['finished_at'])
+    requoted = run.requoted - requoted_before
+    return {
+        'run': run.pk,
+        'debt_rate': str(run.debt_rate),
+        'resumed_from': resumed_from,
+        'chunks': chunks,
+        'requoted': requoted,
+        'seconds': round(seconds, 3),
+        'quotes_per_second': round(requoted / seconds, 1) if seconds else None,
+    }
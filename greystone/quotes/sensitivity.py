@@ -0,0 +1,130 @@
+import math
+
+import numpy as np
+
+from quotes import engine, rates
+from quotes.models import Result
+
+
+"""
+Loan sizing sensitivity grids over debt rate x cap rate x amortization
+term x DSCR threshold, for one property or a whole portfolio.  The grid
+is broadcast in one pass by engine.sensitivity_grid; this module parses
+the axes and reads the NOI and cap rate columns.
+"""
+
+
+MAX_GRID_CELLS = 250000
+MAX_AXIS_POINTS = 500
+
+
+# (axis, lowest value, whether the lowest value itself is allowed)
+AXIS_BOUNDS = (
+    ('debt_rates', 0, True),
+    ('cap_rates', 0, False),
+    ('terms', 1, True),
+    ('dscrs', 0, False),
+)
+
+
+def _finite(points, value):
+    if not all(math.isfinite(point) for point in points):
+        raise ValueError("Axis values must be finite numbers, got %r" % value)
+    return points
+
+
+def parse_axis(value, default=None):
+    """
+    Parse a grid axis given as a comma separated list ("4.5,5,5.5") or
+    an inclusive range with a step ("3:8:0.25").  Returns a list of
+    floats, or `default` when `value` is empty.
+    """
+    if value is None or value == '':
+        return default
+    if isinstance(value, (list, tuple)):
+        return _finite([float(point) for point in value], value)
+    if ':' in value:
+        try:
+            start, stop, step = [float(part) for part in value.split(':')]
+        except ValueError:
+            raise ValueError("Ranges are written start:stop:step, got %r" % value)
+        _finite([start, stop, step], value)
+        if step <= 0 or stop < start:
+            raise ValueError("Invalid range %r" % value)
+        count = int(round((stop - start) / step)) + 1
+        if count > MAX_AXIS_POINTS:
+            raise ValueError("Range %r has more than %d points" % (value, MAX_AXIS_POINTS))
+        return [round(point, 6) for point in np.linspace(start, start + (count - 1) * step, count)]
+    return _finite([float(point) for point in value.split(',') if point.strip()], value)
+
+
+def parse_grid(params):
+    """
+    Read the four grid axes from a dict of query parameters / options.
+    A missing cap rate axis means each property keeps its own cap rate.
+    """
+    grid = {
+        'debt_rates': parse_axis(params.get('debt_rates'), [rates.get_debt_rate()]),
+        'cap_rates': parse_axis(params.get('cap_rates')),
+        'terms': parse_axis(params.get('terms'), [engine.TERM_MONTHS]),
+        'dscrs': parse_axis(params.get('dscrs'), [engine.DSCR]),
+    }
+    cells = 1
+    for axis in grid.values():
+        if axis is not None:
+            if not axis:
+                raise ValueError("Grid axes cannot be empty")
+            cells *= len(axis)
+    if cells > MAX_GRID_CELLS:
+        raise ValueError(
+            "The grid has %d cells, the limit is %d" % (cells, MAX_GRID_CELLS)
+        )
+    for name, lowest, inclusive in AXIS_BOUNDS:
+        for point in grid[name] or ():
+            if point < lowest or (point == lowest and not inclusive):
+                raise ValueError("%s must be %s %s" % (
+                    name,
+                    'at least' if inclusive else 'greater than',
+                    lowest,
+                ))
+    if any(term != int(term) for term in grid['terms']):
+        raise ValueError("terms must be whole months")
+    return grid
+
+
+def sensitivity(grid, address_id=None, state=None, zip_code=None):
+    """
+    Loan amount matrix for one address, or the portfolio total over all
+    quotes (optionally filtered by state/zip).  Returns a JSON-ready dict
+    with the axes and `loan_amounts` nested as [rate][cap rate][term][dscr].
+    """
+    results = Result.objects.with_inputs()
+    if address_id is not None:
+        results = results.filter(address_id=address_id)
+    if state:
+        results = results.filter(address__state=state)
+    if zip_code:
+        results = results.filter(address__zip_code=zip_code)
+    rows = list(results.values_list('noi', 'cap_rate'))
+    if address_id is not None and not rows:
+        raise Result.DoesNotExist("Address %s has no quote" % address_id)
+
+    noi = np.array([row[0] for row in rows], dtype=np.float64)
+    cap_rate = np.array([row[1] or 0 for row in rows], dtype=np.float64)
+    loan_amounts = engine.sensitivity_grid(
+        noi,
+        cap_rate,
+        grid['debt_rates'],
+        grid['terms'],
+        grid['dscrs'],
+        cap_rates=grid['cap_rates'],
+    )
+    return {
+        'address': address_id,
+        'properties': len(rows),
+        'debt_rates': grid['debt_rates'],
+        'cap_rates': grid['cap_rates'],
+        'terms': [int(term) for term in grid['terms']],
+        'dscrs': grid['dscrs'],
+        'loan_amounts': np.trunc(loan_amounts).astype(np.int64).tolist(),
+    }
@@ -1,4 +1,9 @@
-from quotes.models import Address, Rent, Expense, CapRate, Result
+from collections import Counter
+
+from quotes.models import (
+    Address, Rent, Expense, CapRate, Result, PortfolioSummary, Job
+)
+from quotes.documents import ADDRESS_FIELDS, existing_addresses
 
 from rest_framework import serializers
 
@@ -24,7 +29,7 @@ class RentSerializer(serializers.HyperlinkedModelSerializer):
             'vacancy',
             'bedrooms',
             'bathrooms',
-            'annual_rent'
+            'annual_unit_rent'
         )
 
 class ExpenseSerializer(serializers.HyperlinkedModelSerializer):
@@ -50,14 +55,197 @@ class CapRateSerializer(serializers.HyperlinkedModelSerializer):
         )
 
 
-class ResultSerializer(serializers.HyperlinkedModelSerializer):
+class ResultAddressSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Address
+        fields = (
+            'id',
+            'street',
+            'city',
+            'state',
+            'zip_code',
+        )
+
+
+class ResultExpenseSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Expense
+        fields = (
+            'marketing',
+            'taxes',
+            'insurance',
+            'repairs',
+            'administration',
+            'annual_expense',
+        )
+
+
+class ResultRentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Rent
+        fields = (
+            'id',
+            'unit_number',
+            'monthly_rent',
+            'vacancy',
+            'bedrooms',
+            'bathrooms',
+            'annual_unit_rent',
+        )
+
+
+class ResultSerializer(serializers.ModelSerializer):
+    """
+    A complete quote: its address, expense breakdown, cap rate and
+    computed figures, plus the rent roll when the 'include_rent_roll'
+    context flag is set.  Expects the queryset from
+    ResultViewSet.get_queryset, which loads all of it up front.
+    """
+    address = ResultAddressSerializer(read_only=True)
+    expense = ResultExpenseSerializer(source='address.expense', read_only=True)
+    cap_rate = serializers.DecimalField(
+        source='address.caprate.cap_rate',
+        max_digits=5,
+        decimal_places=2,
+        read_only=True,
+    )
+    rent_roll = ResultRentSerializer(
+        source='address.rent_set',
+        many=True,
+        read_only=True,
+    )
+
     class Meta:
         model = Result
         fields = (
+            'id',
             'address',
+            'expense',
+            'cap_rate',
+            'annual_property_rent',
+            'noi',
+            'debt_payment',
+            'property_value',
+            'dscr_loan_amount',
             'loan_amount',
             'debt_rate',
+            'rent_roll',
+        )
+
+    def __init__(self, *args, **kwargs):
+        super(ResultSerializer, self).__init__(*args, **kwargs)
+        if not self.context.get('include_rent_roll'):
+            self.fields.pop('rent_roll')
+
+
+class PortfolioSummarySerializer(serializers.ModelSerializer):
+    weighted_cap_rate = serializers.ReadOnlyField(source='get_weighted_cap_rate')
+
+    class Meta:
+        model = PortfolioSummary
+        fields = (
+            'scope',
+            'key',
+            'quotes',
+            'loan_amount',
+            'noi',
+            'property_value',
+            'weighted_cap_rate',
+        )
+
+
+class JobSerializer(serializers.ModelSerializer):
+    result = serializers.ReadOnlyField(source='get_result')
+
+    class Meta:
+        model = Job
+        fields = (
+            'id',
+            'kind',
+            'status',
+            'attempts',
+            'max_attempts',
+            'progress',
+            'total',
+            'result',
+            'error',
+            'created_at',
+            'started_at',
+            'finished_at',
+        )
+
+
+class QuoteExpenseSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Expense
+        fields = (
+            'marketing',
+            'taxes',
+            'insurance',
+            'repairs',
+            'administration',
+        )
+
+
+class QuoteRentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Rent
+        fields = (
+            'unit_number',
+            'monthly_rent',
+            'vacancy',
+            'bedrooms',
+            'bathrooms',
         )
 
 
+class QuoteDocumentListSerializer(serializers.ListSerializer):
+
+    def to_internal_value(self, data):
+        documents = super(QuoteDocumentListSerializer, self). \
+            to_internal_value(data)
+        keys = [
+            tuple(document[field] for field in ADDRESS_FIELDS)
+            for document in documents
+        ]
+        repeated = {key for key, count in Counter(keys).items() if count > 1}
+        existing = existing_addresses(documents)
+        errors = []
+        for key in keys:
+            if key in repeated:
+                errors.append({'address': ["Address appears more than once in this request."]})
+            elif key in existing:
+                errors.append({'address': ["Address already exists."]})
+            else:
+                errors.append({})
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return documents
+
+
+class QuoteDocumentSerializer(serializers.Serializer):
+    """
+    A complete quote: address, expenses, cap rate and rent roll
+    """
+    street = serializers.CharField(max_length=100)
+    city = serializers.CharField(max_length=75)
+    state = serializers.CharField(max_length=2)
+    zip_code = serializers.CharField(max_length=5)
+    expense = QuoteExpenseSerializer()
+    cap_rate = serializers.DecimalField(decimal_places=2, max_digits=5)
+    rent_roll = QuoteRentSerializer(many=True, required=False)
+
+    class Meta:
+        list_serializer_class = QuoteDocumentListSerializer
+
+    def validate_rent_roll(self, rent_roll):
+        unit_numbers = [unit['unit_number'] for unit in rent_roll]
+        if len(set(unit_numbers)) != len(unit_numbers):
+            raise serializers.ValidationError("Unit numbers must be unique.")
+        return rent_roll
 
+    def validate(self, document):
+        # Lists check every address at once in QuoteDocumentListSerializer.
+        if self.parent is None and existing_addresses([document]):
+            raise serializers.ValidationError({'address': ["Address already exists."]})
+        return document
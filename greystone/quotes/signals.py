@@ -0,0 +1,176 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from quotes import cache, rates
+from quotes.models import (
+    SUMMARY_TOTALS, Address, CapRate, CollectionVersion, Expense,
+    PortfolioSummary, RateCurve, Rent, Result
+)
+
+
+"""
+Keeps derived values in step with the rows they are derived from.
+Connected in QuotesConfig.ready().
+"""
+
+
+_local = threading.local()
+
+
+def _deferred_addresses():
+    if not hasattr(_local, 'deferred'):
+        _local.deferred = set()
+    return _local.deferred
+
+
+def _maintenance_deferred(instance):
+    """
+    Whether `instance` belongs to an address whose quote is deleted or
+    recomputed wholesale, so there is nothing to keep in step row by row
+    """
+    return instance.address_id in _deferred_addresses()
+
+
+@contextmanager
+def deferred_maintenance(address_ids):
+    """
+    Skip the per-row rent delta, version and cache receivers for rows of
+    `address_ids` within the block; the caller requotes or deletes those
+    addresses.  Used by Address.delete() and AddressQuerySet.delete().
+    """
+    deferred = _deferred_addresses()
+    added = set(address_ids) - deferred
+    deferred |= added
+    try:
+        yield
+    finally:
+        deferred -= added
+
+
+@receiver(post_save, sender=Rent)
+def apply_rent_save_delta(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    for address_id, delta in instance.get_rent_deltas.items():
+        Result.objects.apply_rent_delta(address_id, delta)
+
+
+@receiver(post_delete, sender=Rent)
+def apply_rent_delete_delta(sender, instance, **kwargs):
+    if instance.annual_unit_rent and not _maintenance_deferred(instance):
+        Result.objects.apply_rent_delta(
+            instance.address_id,
+            -instance.annual_unit_rent
+        )
+
+
+@receiver(post_save, sender=Address)
+def address_changed(sender, instance, created, raw=False, **kwargs):
+    if created:
+        CollectionVersion.objects.db_manager(kwargs.get('using')).bump()
+    else:
+        Address.objects.filter(pk=instance.pk).bump_version()
+    cache.invalidate(instance.pk, using=kwargs.get('using'))
+
+
+@receiver(post_save, sender=Address)
+def move_address_summary(sender, instance, created, raw=False, **kwargs):
+    """
+    Move the quote of an address whose state or zip code changed to its
+    new summary rows
+    """
+    old_location = getattr(instance, '_loaded_location', None)
+    new_location = (instance.state, instance.zip_code)
+    instance._loaded_location = new_location
+    if created or raw or old_location in (None, new_location):
+        return
+    totals = Result.objects. \
+        filter(address_id=instance.pk). \
+        values_list(*SUMMARY_TOTALS). \
+        first()
+    if totals is None:
+        return
+    PortfolioSummary.objects.apply_changes([
+        old_location + (-1, [-total for total in totals]),
+        new_location + (1, list(totals)),
+    ])
+
+
+@receiver(post_delete, sender=Address)
+def address_deleted(sender, instance, **kwargs):
+    CollectionVersion.objects.db_manager(kwargs.get('using')).bump()
+    cache.invalidate(instance.pk, using=kwargs.get('using'))
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+@receiver(post_save, sender=CapRate)
+@receiver(post_delete, sender=CapRate)
+@receiver(post_save, sender=Rent)
+@receiver(post_delete, sender=Rent)
+@receiver(post_save, sender=Result)
+@receiver(post_delete, sender=Result)
+def quote_changed(sender, instance, raw=False, **kwargs):
+    if _maintenance_deferred(instance):
+        return
+    address_ids = {instance.address_id}
+    # a rent moved to another address changes the quote it left as well
+    old_address_id = getattr(instance, '_loaded_rent', (None, None))[0]
+    if old_address_id is not None:
+        address_ids.add(old_address_id)
+    Address.objects.filter(pk__in=address_ids).bump_version()
+    cache.invalidate_many(address_ids, using=kwargs.get('using'))
+
+
+@receiver(post_save, sender=RateCurve)
+@receiver(post_delete, sender=RateCurve)
+def reload_rate_curve(sender, **kwargs):
+    rates.curve_cache.invalidate()
+
+
+def _location(result):
+    location = getattr(result, '_location', None)
+    if location is None:
+        location = Address.objects. \
+            filter(pk=result.address_id). \
+            values_list('state', 'zip_code'). \
+            first() or (None, None)
+    return location
+
+
+@receiver(post_save, sender=Result)
+def add_result_to_summary(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    state, zip_code = _location(instance)
+    old_totals = None if created else getattr(instance, '_loaded_totals', None)
+    PortfolioSummary.objects.apply_changes([
+        instance.get_summary_change(state, zip_code, old_totals),
+    ])
+
+
+@receiver(pre_delete, sender=Result)
+def read_result_summary(sender, instance, **kwargs):
+    """
+    Read the location and totals the quote counts towards while its rows
+    still exist; None when it has been deleted already
+    """
+    instance._summary_row = Result.objects. \
+        filter(pk=instance.pk). \
+        values_list('address__state', 'address__zip_code', *SUMMARY_TOTALS). \
+        first()
+
+
+@receiver(post_delete, sender=Result)
+def remove_result_from_summary(sender, instance, **kwargs):
+    row = getattr(instance, '_summary_row', None)
+    instance._summary_row = None
+    if row is None:
+        return
+    state, zip_code = row[:2]
+    PortfolioSummary.objects.apply_changes([
+        (state, zip_code, -1, [-(total or 0) for total in row[2:]]),
+    ])
@@ -0,0 +1,194 @@
+import os
+import random
+import sqlite3
+import statistics
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+from django.db.models import F
+from django.db.utils import load_backend
+
+from quotes import jobs
+from quotes.models import Rent, Result
+
+
+"""
+Concurrent-writer benchmark for SQLite.
+
+Every scenario starts from its own copy of a synthetic portfolio and
+runs `writers` spawned processes, each committing `transactions` wizard
+style edits: raise the rents of one property and requote it.
+
+- stock: django.db.backends.sqlite3 with a rollback journal, requoting
+  in the writer's transaction.
+- tuned: the production profile (quotes.backends.sqlite3 with WAL, tuned
+  pragmas, BEGIN IMMEDIATE and retried lock errors), requoting in the
+  writer's transaction.
+- tuned_queued: the production profile with the requote queued as a job;
+  one worker then drains the queue, coalescing the jobs into batched
+  requotes.
+
+Edits that still fail with a lock error are counted, not retried.
+"""
+
+
+STOCK_ENGINE = 'django.db.backends.sqlite3'
+PROFILE_ENGINE = 'quotes.backends.sqlite3'
+
+
+def _copy_database(source, target, journal_mode):
+    source_db = sqlite3.connect(source)
+    target_db = sqlite3.connect(target)
+    try:
+        source_db.backup(target_db)
+        target_db.execute('PRAGMA journal_mode = %s' % journal_mode)
+    finally:
+        target_db.close()
+        source_db.close()
+
+
+def _started(pause):
+    time.sleep(pause)
+    return os.getpid()
+
+
+def _use_database(engine, name, options):
+    """
+    Point this process's default connection at database `name`
+    """
+    settings_dict = dict(
+        connections['default'].settings_dict,
+        ENGINE=engine,
+        NAME=name,
+        OPTIONS=options,
+    )
+    connections['default'] = load_backend(engine).DatabaseWrapper(
+        settings_dict,
+        'default',
+    )
+
+
+def _write(engine, name, options, address_ids, transactions, queued, seed):
+    """
+    One writer process: returns the latency (ms) of every committed edit
+    and the number of edits that failed with a lock error
+    """
+    _use_database(engine, name, options)
+    rng = random.Random(seed)
+    latencies = []
+    locked = 0
+    for i in range(transactions):
+        address_id = rng.choice(address_ids)
+        start = time.perf_counter()
+        try:
+            with transaction.atomic():
+                Rent.objects. \
+                    filter(address_id=address_id). \
+                    update(monthly_rent=F('monthly_rent') + 1)
+                if queued:
+                    jobs.enqueue(
+                        'requote',
+                        {'address_ids': [address_id], 'refresh_rents': True},
+                    )
+                else:
+                    Result.objects.requote([address_id], refresh_rents=True)
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+    connections['default'].close()
+    return latencies, locked
+
+
+def _drain(engine, name, options):
+    """
+    Run the job queue dry with one worker; returns (seconds, runs)
+    """
+    _use_database(engine, name, options)
+    runs = []
+    start = time.perf_counter()
+    jobs.run_worker(burst=True, log=lambda job_id, outcome: runs.append(outcome))
+    seconds = time.perf_counter() - start
+    connections['default'].close()
+    return seconds, len(runs)
+
+
+def _run_scenario(pool, template, directory, scenario, address_ids, writers,
+        transactions):
+    engine, options, journal_mode, queued = scenario
+    name = os.path.join(directory, 'scenario.sqlite3')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(name + suffix):
+            os.remove(name + suffix)
+    _copy_database(template, name, journal_mode)
+
+    start = time.perf_counter()
+    futures = [
+        pool.submit(
+            _write, engine, name, options, address_ids, transactions,
+            queued, seed,
+        )
+        for seed in range(writers)
+    ]
+    latencies = []
+    locked = 0
+    for future in futures:
+        writer_latencies, writer_locked = future.result()
+        latencies += writer_latencies
+        locked += writer_locked
+    seconds = time.perf_counter() - start
+
+    report = {
+        'committed': len(latencies),
+        'locked_errors': locked,
+        'seconds': round(seconds, 3),
+        'commits_per_second': round(len(latencies) / seconds, 1),
+    }
+    if latencies:
+        latencies.sort()
+        report['median_ms'] = round(statistics.median(latencies), 3)
+        report['p95_ms'] = round(latencies[int(len(latencies) * 0.95) - 1], 3)
+    if queued:
+        drain_seconds, runs = pool.submit(_drain, engine, name, options).result()
+        report['drain_seconds'] = round(drain_seconds, 3)
+        report['worker_runs'] = runs
+        report['requotes_per_second'] = round(
+            len(latencies) / (seconds + drain_seconds), 1
+        )
+    return report
+
+
+def run_writer_benchmark(template, directory, address_ids, writers=8,
+        transactions=50):
+    """
+    Run every scenario against copies of the SQLite database `template`,
+    made in `directory`.  Returns a JSON-ready report.
+    """
+    profile = settings.QUOTES_SQLITE_PRODUCTION_OPTIONS
+    scenarios = (
+        ('stock', (STOCK_ENGINE, {}, 'DELETE', False)),
+        ('tuned', (PROFILE_ENGINE, profile, 'WAL', False)),
+        ('tuned_queued', (PROFILE_ENGINE, profile, 'WAL', True)),
+    )
+    report = {
+        'sqlite': sqlite3.sqlite_version,
+        'properties': len(address_ids),
+        'writers': writers,
+        'transactions_per_writer': transactions,
+        'scenarios': {},
+    }
+    pool = jobs.process_pool(writers)
+    with pool:
+        # Start every process before the clock runs.
+        started = [pool.submit(_started, 0.5) for i in range(writers)]
+        for future in started:
+            future.result()
+        for label, scenario in scenarios:
+            report['scenarios'][label] = _run_scenario(
+                pool, template, directory, scenario, address_ids, writers,
+                transactions,
+            )
+    return report
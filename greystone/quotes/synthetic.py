@@ -0,0 +1,102 @@
+import random
+from decimal import Decimal
+
+from django.db import transaction
+
+from quotes.bulk import bulk_create_with_ids
+from quotes.models import Address, CapRate, Expense, Rent, Result
+
+
+"""
+Deterministic synthetic portfolios for benchmarking.
+
+generate_portfolio(n, seed=...) always produces the same addresses,
+expenses, cap rates and rent rolls for the same arguments, written with
+bulk inserts, and then quotes them with one bulk requote.
+"""
+
+
+STATES = ('CA', 'FL', 'IL', 'NY', 'TX', 'WA')
+STREETS = ('Main St', 'Oak Ave', 'Park Blvd', 'Elm St', 'Lake Dr', 'Hill Rd')
+
+
+def _address(rng, seed, i):
+    return Address(
+        street="%d %s #%d-%d" % (rng.randint(1, 9999), rng.choice(STREETS), seed, i),
+        city="Synthetic",
+        state=rng.choice(STATES),
+        zip_code="%05d" % rng.randint(501, 99950),
+    )
+
+
+def _rents(rng, address_id, units):
+    rents = []
+    for unit in range(1, units + 1):
+        monthly_rent = rng.randint(600, 4500)
+        rents.append(Rent(
+            address_id=address_id,
+            unit_number=str(unit),
+            monthly_rent=monthly_rent,
+            vacancy=rng.randint(0, 15),
+            bedrooms=rng.randint(1, 4),
+            bathrooms=rng.randint(1, 3),
+            annual_unit_rent=monthly_rent * 12,
+        ))
+    return rents
+
+
+def generate_portfolio(properties, min_units=10, max_units=1000, seed=0,
+        batch_size=500):
+    """
+    Create `properties` addresses, each with an expense, a cap rate and
+    a rent roll of min_units..max_units units, then quote them.  Returns
+    the list of new address ids.
+    """
+    rng = random.Random(seed)
+    addresses = [_address(rng, seed, i) for i in range(properties)]
+
+    with transaction.atomic():
+        bulk_create_with_ids(
+            Address,
+            addresses,
+            ('street', 'city', 'state', 'zip_code'),
+            batch_size=batch_size,
+        )
+        address_ids = [address.pk for address in addresses]
+
+        expenses = []
+        cap_rates = []
+        for address_id in address_ids:
+            expense = Expense(
+                expense_id=address_id,
+                address_id=address_id,
+                marketing=rng.randint(1000, 20000),
+                taxes=rng.randint(10000, 200000),
+                insurance=rng.randint(5000, 60000),
+                repairs=rng.randint(5000, 80000),
+                administration=rng.randint(2000, 40000),
+            )
+            expense.annual_expense = expense.get_annual_expense
+            expenses.append(expense)
+            cap_rates.append(CapRate(
+                cap_rate_id=address_id,
+                address_id=address_id,
+                cap_rate=Decimal(rng.randint(400, 900)) / 100,
+            ))
+        Expense.objects.bulk_create(expenses, batch_size=batch_size)
+        CapRate.objects.bulk_create(cap_rates, batch_size=batch_size)
+
+        rents = []
+        for address_id in address_ids:
+            rents.extend(_rents(rng, address_id, rng.randint(min_units, max_units)))
+            if len(rents) >= batch_size:
+                Rent.objects.bulk_create(rents, batch_size=batch_size)
+                rents = []
+        Rent.objects.bulk_create(rents, batch_size=batch_size)
+
+    for start in range(0, len(address_ids), batch_size):
+        Result.objects.requote(
+            address_ids[start:start + batch_size],
+            refresh_rents=True,
+        )
+    return address_ids
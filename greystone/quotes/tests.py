@@ -1,3 +1,1445 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from concurrent.futures import Future
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import OperationalError, connection, transaction
+from django.db.models.signals import post_delete
+from django.middleware.csrf import get_token
+from django.test import (
+    RequestFactory, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.views.generic import DetailView
+
+from rest_framework.request import Request
+
+from quotes import (
+    bulk, cache, engine, instrumentation, jobs, rates, recompute, views
+)
+from quotes.backends.sqlite3 import base as sqlite3_backend
+from quotes.benchmarks import run_benchmarks
+from quotes.models import (
+    Address, CapRate, Expense, Job, PortfolioSummary, RateCurve, RepricingRun,
+    Rent, Result
+)
+from quotes.rentroll import RentRollCursor, import_rent_roll
+from quotes.repricing import requote_all
+from quotes.sensitivity import parse_grid, sensitivity
+from quotes.synthetic import generate_portfolio
+from quotes.whatif import parse_scenarios, quote_scenarios
+
+
+def create_property(street='1 Main St', state='NY', zip_code='10001',
+        rents=(1000,), cap_rate='6.50'):
+    """
+    An address with an expense, a cap rate and one unit per monthly rent
+    """
+    address = Address.objects.create(
+        street=street,
+        city='Springfield',
+        state=state,
+        zip_code=zip_code,
+    )
+    Expense.objects.create(
+        address=address,
+        marketing=100,
+        taxes=2000,
+        insurance=500,
+        repairs=300,
+        administration=200,
+    )
+    CapRate.objects.create(address=address, cap_rate=Decimal(cap_rate))
+    for i, monthly_rent in enumerate(rents):
+        Rent.objects.create(
+            address=address,
+            unit_number=str(i + 1),
+            bedrooms=1,
+            bathrooms=1,
+            vacancy=0,
+            monthly_rent=monthly_rent,
+        )
+    return address
+
+
+def create_quote(**kwargs):
+    address = create_property(**kwargs)
+    Result.objects.requote([address.pk])
+    return Result.objects.get(address=address)
+
+
+def summary(scope=PortfolioSummary.OVERALL, key=''):
+    return PortfolioSummary.objects. \
+        filter(scope=scope, key=key). \
+        values_list('quotes', 'loan_amount'). \
+        first() or (0, 0)
+
+
+class ApiTestCase(TestCase):
+
+    def setUp(self):
+        cache.get_cache().clear()
+        user = User.objects.create_user('analyst', password='analyst')
+        self.client.force_login(user)
+
+
+def legacy_quote(annual_rent, annual_expense, cap_rate, debt_rate):
+    """
+    Result.save as it was before the engine
+    """
+    noi = annual_rent - annual_expense
+    debt_payment = (noi * 100) / 125
+    property_value = noi / (cap_rate / 100)
+    dscr_loan_amount = ((debt_payment / 12) *
+        (1 - (1 / (1 + ((debt_rate / 100) / 12)) ** (10 * 12)))) / \
+        ((debt_rate / 100) / 12)
+    return {
+        'noi': int(noi),
+        'debt_payment': int(debt_payment),
+        'property_value': int(property_value),
+        'dscr_loan_amount': int(dscr_loan_amount),
+        'loan_amount': int(min(property_value, int(dscr_loan_amount))),
+    }
+
+
+class EngineTests(TestCase):
+
+    def test_matches_the_legacy_result_math(self):
+        cases = [
+            (12000, 3100, Decimal('6.50')),
+            (540000, 125000, Decimal('5.25')),
+            (84000, 91000, Decimal('7.10')),
+            (2400000, 310000, Decimal('12.00')),
+        ]
+        for annual_rent, annual_expense, cap_rate in cases:
+            self.assertEqual(
+                engine.underwrite_one(annual_rent, annual_expense, cap_rate, 4.98),
+                legacy_quote(annual_rent, annual_expense, cap_rate, 4.98),
+            )
+
+    def test_requote_matches_the_legacy_result_math(self):
+        result = create_quote(rents=[1500, 2250, 900], cap_rate='5.75')
+        expected = legacy_quote(
+            result.annual_property_rent,
+            3100,
+            Decimal('5.75'),
+            float(result.debt_rate),
+        )
+        for field, value in expected.items():
+            self.assertEqual(getattr(result, field), value, field)
+
+    def test_cached_annuity_factor_matches_the_closed_form(self):
+        for debt_rate in (0.01, 3.5, 4.98, 7.125, 14.99, 18.0):
+            for term in (60, 120, 97):
+                self.assertAlmostEqual(
+                    engine.cached_annuity_factor(debt_rate, term),
+                    float(engine.annuity_factor(debt_rate, term)),
+                    places=9,
+                )
+
+
+class BulkUpdateTests(TestCase):
+
+    def test_batches_stay_within_the_parameter_limit(self):
+        results = [
+            create_quote(street='%d Main St' % i, rents=[1000 + i])
+            for i in range(120)
+        ]
+        for result in results:
+            result.noi += 1
+        params = []
+
+        def record(execute, sql, sql_params, many, context):
+            if sql.startswith('UPDATE'):
+                params.append(len(sql_params))
+            return execute(sql, sql_params, many, context)
+
+        fields = ('annual_property_rent', 'debt_rate') + engine.RESULT_FIELDS
+        with connection.execute_wrapper(record):
+            updated = bulk.bulk_update(Result, results, fields)
+        self.assertEqual(updated, 120)
+        self.assertLessEqual(
+            max(params),
+            connection.features.max_query_params or 999,
+        )
+        self.assertEqual(Result.objects.get(pk=results[0].pk).noi, results[0].noi)
+
+
+class InlinePool(object):
+    """
+    Runs submitted work at once, in this process and connection
+    """
+
+    def __init__(self, processes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, func, *args):
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+
+class Interrupted(Exception):
+    pass
+
+
+class RequoteAllTests(TestCase):
+
+    def setUp(self):
+        self.results = [
+            create_quote(street='%d Main St' % i, rents=[1000 + i])
+            for i in range(5)
+        ]
+        Result.objects.update(noi=0)
+
+    def repriced(self):
+        return list(
+            Result.objects.order_by('pk').values_list('noi', flat=True)
+        )
+
+    def test_interrupted_run_resumes_after_its_last_chunk(self):
+        def stop(run):
+            raise Interrupted
+
+        with self.assertRaises(Interrupted):
+            requote_all(chunk_size=2, progress=stop)
+        run = RepricingRun.objects.get()
+        self.assertEqual(run.requoted, 2)
+        self.assertEqual(run.last_result_id, self.results[1].pk)
+        self.assertIsNone(run.finished_at)
+        self.assertEqual(self.repriced()[2:], [0, 0, 0])
+
+        report = requote_all(chunk_size=2, resume=True)
+        self.assertEqual(report['run'], run.pk)
+        self.assertEqual(report['resumed_from'], self.results[1].pk)
+        self.assertEqual(report['chunks'], 2)
+        self.assertEqual(report['requoted'], 3)
+        self.assertEqual(self.repriced(), [result.noi for result in self.results])
+        run.refresh_from_db()
+        self.assertIsNotNone(run.finished_at)
+
+    def test_workers_checkpoint_every_chunk_in_order(self):
+        checkpoints = []
+        with mock.patch('quotes.repricing.process_pool', InlinePool):
+            report = requote_all(
+                chunk_size=2,
+                workers=2,
+                progress=lambda run: checkpoints.append(run.last_result_id),
+            )
+        self.assertEqual(report['chunks'], 3)
+        self.assertEqual(report['requoted'], 5)
+        self.assertEqual(
+            checkpoints,
+            [self.results[1].pk, self.results[3].pk, self.results[4].pk],
+        )
+        self.assertEqual(self.repriced(), [result.noi for result in self.results])
+
+    def test_long_id_lists_stay_within_the_parameter_limit(self):
+        params = []
+
+        def record(execute, sql, sql_params, many, context):
+            params.append(len(sql_params or ()))
+            return execute(sql, sql_params, many, context)
+
+        address_ids = [result.address_id for result in self.results] + \
+            list(range(10 ** 6, 10 ** 6 + 2000))
+        with connection.execute_wrapper(record):
+            requoted = Result.objects.requote(address_ids)
+        self.assertEqual(requoted, 5)
+        self.assertLessEqual(max(params), 999)
+        self.assertEqual(self.repriced(), [result.noi for result in self.results])
+
+
+class PortfolioSummaryTests(TestCase):
+
+    def test_delete_through_view_removes_quote_once(self):
+        kept = create_quote(street='1 Main St', state='NY')
+        deleted = create_quote(street='2 Main St', state='CA', zip_code='90001')
+        response = self.client.post(
+            reverse('result_delete', kwargs={'pk': deleted.pk})
+        )
+        self.assertRedirects(response, reverse('result_list'), fetch_redirect_response=False)
+        self.assertFalse(Address.objects.filter(pk=deleted.address_id).exists())
+        self.assertEqual(summary(), (1, kept.loan_amount))
+        self.assertEqual(summary(PortfolioSummary.STATE, 'NY'), (1, kept.loan_amount))
+        self.assertEqual(summary(PortfolioSummary.STATE, 'CA'), (0, 0))
+
+    def test_new_quotes_are_added(self):
+        first = create_quote(street='1 Main St', state='NY')
+        second = create_quote(street='2 Main St', state='NY', zip_code='10002')
+        total = first.loan_amount + second.loan_amount
+        self.assertEqual(summary(), (2, total))
+        self.assertEqual(summary(PortfolioSummary.STATE, 'NY'), (2, total))
+        self.assertEqual(
+            summary(PortfolioSummary.ZIP_CODE, '10002'),
+            (1, second.loan_amount),
+        )
+
+    def test_moved_address_moves_its_quote(self):
+        result = create_quote(state='NY', zip_code='10001')
+        address = result.address
+        address.state = 'NJ'
+        address.zip_code = '07001'
+        address.save()
+        self.assertEqual(summary(), (1, result.loan_amount))
+        self.assertEqual(summary(PortfolioSummary.STATE, 'NY'), (0, 0))
+        self.assertEqual(summary(PortfolioSummary.ZIP_CODE, '10001'), (0, 0))
+        self.assertEqual(summary(PortfolioSummary.STATE, 'NJ'), (1, result.loan_amount))
+        self.assertEqual(summary(PortfolioSummary.ZIP_CODE, '07001'), (1, result.loan_amount))
+
+    def test_deleting_a_deleted_quote_again_changes_nothing(self):
+        kept = create_quote(street='1 Main St')
+        result = create_quote(street='2 Main St')
+        stale = Result.objects.get(pk=result.pk)
+        result.delete()
+        stale.delete()
+        self.assertEqual(summary(), (1, kept.loan_amount))
+
+
+def count_queries(func, *args, **kwargs):
+    with CaptureQueriesContext(connection) as captured:
+        func(*args, **kwargs)
+    return len(captured)
+
+
+class RentDeltaTests(TestCase):
+
+    def test_deleting_an_address_skips_per_unit_maintenance(self):
+        small = create_quote(street='1 Main St', rents=[1000] * 2).address
+        large = create_quote(street='2 Main St', rents=[1000] * 20).address
+        self.assertEqual(
+            count_queries(small.delete),
+            count_queries(large.delete),
+        )
+        self.assertEqual(summary(), (0, 0))
+        self.assertFalse(Rent.objects.exists())
+
+    def test_failed_delete_leaves_maintenance_on(self):
+        result = create_quote(rents=[1000, 1200])
+        address = result.address
+
+        def fail(sender, instance, **kwargs):
+            raise Interrupted
+
+        post_delete.connect(fail, sender=Rent)
+        try:
+            with self.assertRaises(Interrupted):
+                with transaction.atomic():
+                    address.delete()
+        finally:
+            post_delete.disconnect(fail, sender=Rent)
+        Rent.objects.get(address=address, unit_number='1').delete()
+        result.refresh_from_db()
+        self.assertEqual(result.annual_property_rent, 1200 * 12)
+
+    def test_deleting_addresses_through_a_queryset(self):
+        kept = create_quote(street='1 Main St')
+        create_quote(street='2 Main St', rents=[1000] * 5)
+        create_quote(street='3 Main St', rents=[1000] * 5)
+        Address.objects.exclude(pk=kept.address_id).delete()
+        self.assertEqual(summary(), (1, kept.loan_amount))
+        self.assertEqual(Rent.objects.count(), 1)
+
+    def test_rent_changes_adjust_the_quote(self):
+        result = create_quote(rents=[1000, 1200])
+        unit = Rent.objects.get(address=result.address, unit_number='1')
+        unit.monthly_rent = 1100
+        unit.save()
+        Rent.objects.create(
+            address=result.address,
+            unit_number='3',
+            bedrooms=1,
+            bathrooms=1,
+            vacancy=0,
+            monthly_rent=800,
+        )
+        Rent.objects.get(address=result.address, unit_number='2').delete()
+        result.refresh_from_db()
+        self.assertEqual(result.annual_property_rent, (1100 + 800) * 12)
+
+    def test_reconcile_rents_repairs_drift(self):
+        result = create_quote(rents=[1000, 1200])
+        kept = create_quote(street='2 Main St')
+        # A set-based write skips the rent signals.
+        Rent.objects.filter(address=result.address).update(monthly_rent=1500)
+        drifted = Result.objects.reconcile_rents(repair=False)
+        self.assertEqual(drifted, {result.address_id: (26400, 36000)})
+        self.assertEqual(Result.objects.reconcile_rents(), drifted)
+        self.assertEqual(Result.objects.reconcile_rents(), {})
+        result.refresh_from_db()
+        self.assertEqual(result.annual_property_rent, 36000)
+        self.assertEqual(summary(), (2, result.loan_amount + kept.loan_amount))
+
+
+@unittest.skipUnless(
+    connection.vendor in ('sqlite', 'postgresql'),
+    "Derived column triggers are installed on SQLite and PostgreSQL only",
+)
+class DerivedColumnTriggerTests(TestCase):
+
+    def test_set_based_updates_maintain_derived_columns(self):
+        address = create_property(rents=[1000, 1200])
+        Rent.objects.filter(address=address).update(monthly_rent=1500)
+        annual_rents = Rent.objects. \
+            filter(address=address). \
+            values_list('annual_unit_rent', flat=True)
+        self.assertEqual(list(annual_rents), [18000, 18000])
+        Expense.objects.filter(address=address).update(taxes=5000)
+        self.assertEqual(Expense.objects.get(address=address).annual_expense, 6100)
+
+    def test_bulk_created_units_get_their_annual_rent(self):
+        address = create_property(rents=[])
+        Rent.objects.bulk_create([
+            Rent(
+                address=address,
+                unit_number='1',
+                bedrooms=1,
+                bathrooms=1,
+                vacancy=0,
+                monthly_rent=900,
+            ),
+        ])
+        self.assertEqual(Rent.objects.get(address=address).annual_unit_rent, 10800)
+
+    def test_scale_rents_requotes_from_fresh_totals(self):
+        result = create_quote(rents=[1000, 2000])
+        updated = Rent.objects.filter(address=result.address).scale_rents(10)
+        self.assertEqual(updated, 2)
+        result.refresh_from_db()
+        self.assertEqual(result.annual_property_rent, (1100 + 2200) * 12)
+
+
+class RecomputeTests(TransactionTestCase):
+
+    def scheduled_flushes(self):
+        return recompute.dirty.scheduled()
+
+    def test_marks_are_requoted_once_on_commit(self):
+        first = create_property(street='1 Main St')
+        second = create_property(street='2 Main St')
+        with transaction.atomic():
+            for address in (first, second, first, first):
+                recompute.mark_dirty(address.pk)
+            self.assertEqual(len(self.scheduled_flushes()), 1)
+            self.assertFalse(Result.objects.exists())
+        self.assertEqual(
+            sorted(Result.objects.values_list('address_id', flat=True)),
+            [first.pk, second.pk],
+        )
+
+    def test_rolled_back_marks_are_dropped(self):
+        address = create_property()
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                recompute.mark_dirty(address.pk)
+                raise ValueError
+        self.assertFalse(Result.objects.exists())
+        # Nor are they requoted by the next transaction to commit.
+        other = create_property(street='2 Main St')
+        with transaction.atomic():
+            recompute.mark_dirty(other.pk)
+        self.assertEqual(
+            list(Result.objects.values_list('address_id', flat=True)),
+            [other.pk],
+        )
+
+    def test_outside_a_transaction_the_quote_is_recomputed_at_once(self):
+        address = create_property()
+        recompute.mark_dirty(address.pk)
+        self.assertTrue(Result.objects.filter(address=address).exists())
+
+
+class CsrfAddressView(cache.CachedDetailMixin, DetailView):
+    model = Address
+    template_name = 'quotes/address_detail.html'
+
+    def get_cache_address_id(self, obj):
+        return obj.pk
+
+    def render_to_response(self, context, **kwargs):
+        get_token(self.request)
+        return super(CsrfAddressView, self).render_to_response(context, **kwargs)
+
+
+class QuoteCacheTests(TransactionTestCase):
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.address = create_quote().address
+        self.url = reverse('address_detail', kwargs={'pk': self.address.pk})
+        self.key = 'page:address:%s' % self.address.pk
+
+    def test_detail_page_is_cached_until_the_address_changes(self):
+        self.client.get(self.url)
+        self.assertIsNotNone(cache.get_cache().get(self.key))
+        self.address.street = '9 Elm St'
+        self.address.save()
+        self.assertIsNone(cache.get_cache().get(self.key))
+        self.assertContains(self.client.get(self.url), '9 Elm St')
+
+    def test_invalidation_waits_for_commit(self):
+        self.client.get(self.url)
+        with transaction.atomic():
+            self.address.street = '9 Elm St'
+            self.address.save()
+            self.assertIsNotNone(cache.get_cache().get(self.key))
+        self.assertIsNone(cache.get_cache().get(self.key))
+
+    def test_rolled_back_change_keeps_the_entry(self):
+        self.client.get(self.url)
+        try:
+            with transaction.atomic():
+                self.address.save()
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertIsNotNone(cache.get_cache().get(self.key))
+
+    def test_pages_with_a_csrf_token_are_not_cached(self):
+        request = RequestFactory().get(self.url)
+        response = CsrfAddressView.as_view()(request, pk=self.address.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(cache.get_cache().get(self.key))
+
+
+class ConditionalGetTests(ApiTestCase):
+
+    def setUp(self):
+        super(ConditionalGetTests, self).setUp()
+        self.result = create_quote()
+        self.address = self.result.address
+
+    def test_unchanged_address_revalidates_with_304(self):
+        url = reverse('address-detail', kwargs={'pk': self.address.pk})
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changing_a_rent_changes_the_etag(self):
+        url = reverse('address-detail', kwargs={'pk': self.address.pk})
+        etag = self.client.get(url)['ETag']
+        rent = Rent.objects.get(address=self.address)
+        rent.monthly_rent = 1500
+        rent.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_sparse_fieldsets_get_their_own_etag(self):
+        url = reverse('address-detail', kwargs={'pk': self.address.pk})
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, {'fields': 'street'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {'street'})
+
+    def test_list_etag_ignores_parameter_order(self):
+        url = reverse('address-list')
+        etag = self.client.get(url + '?fields=street,city&page_size=5')['ETag']
+        response = self.client.get(
+            url + '?page_size=5&fields=street,city',
+            HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_etag_reads_one_row(self):
+        url = reverse('address-list')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(3):
+            # session, user and the collection version
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_importing_units_of_an_unquoted_address_changes_the_etag(self):
+        address = create_property(street='2 Main St', rents=[1000])
+        Expense.objects.filter(address=address).delete()
+        url = reverse('rent-list')
+        etag = self.client.get(url)['ETag']
+        report = import_rent_roll(
+            ['address_id,unit_number,monthly_rent,vacancy,bedrooms,bathrooms\n',
+             '%d,2,1200,0,1,1\n' % address.pk]
+        )
+        self.assertEqual((report['created'], report['requoted']), (1, 0))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 3)
+
+    def test_new_address_changes_the_list_etag(self):
+        url = reverse('address-list')
+        etag = self.client.get(url)['ETag']
+        create_property(street='2 Main St')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class RentRollPatchTests(ApiTestCase):
+
+    def setUp(self):
+        super(RentRollPatchTests, self).setUp()
+        self.result = create_quote(rents=[1000, 1100, 1200])
+        self.address = self.result.address
+        self.url = reverse('rent_roll', kwargs={'pk': self.address.pk})
+        self.units = list(Rent.objects.filter(address=self.address).order_by('id'))
+
+    def patch(self, changes):
+        return self.client.patch(
+            self.url,
+            json.dumps(changes),
+            content_type='application/json',
+        )
+
+    def test_changes_are_applied_and_quote_recomputed_once(self):
+        response = self.patch({
+            'create': [{
+                'unit_number': '4',
+                'bedrooms': 2,
+                'bathrooms': 1,
+                'vacancy': 0,
+                'monthly_rent': 2000,
+            }],
+            'update': [{'id': self.units[0].pk, 'monthly_rent': 1500}],
+            'delete': [self.units[1].pk],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {'created': 1, 'updated': 1, 'deleted': 1, 'requoted': 1},
+        )
+        result = Result.objects.get(pk=self.result.pk)
+        self.assertEqual(result.annual_property_rent, (1500 + 1200 + 2000) * 12)
+        self.assertEqual(summary(), (1, result.loan_amount))
+
+    def test_invalid_change_set_changes_nothing(self):
+        response = self.patch({
+            'update': [{'id': self.units[0].pk, 'monthly_rent': 'lots'}],
+            'delete': [self.units[1].pk, 999999],
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'update', 'delete'})
+        self.assertEqual(Rent.objects.filter(address=self.address).count(), 3)
+
+    def test_duplicate_unit_numbers_are_rejected(self):
+        response = self.patch({
+            'update': [{'id': self.units[0].pk, 'unit_number': '2'}],
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+def rent_roll_csv(address, units):
+    lines = ['address_id,unit_number,monthly_rent,vacancy,bedrooms,bathrooms']
+    for unit_number in range(units):
+        lines.append('%d,U%d,1000,0,1,1' % (address.pk, unit_number))
+    return '\n'.join(lines) + '\n'
+
+
+class RentRollImportTests(ApiTestCase):
+
+    def upload(self, content):
+        return self.client.post(reverse('rent_roll_import'), {
+            'file': SimpleUploadedFile('rent_roll.csv', content),
+        })
+
+    def test_bad_rows_are_reported_and_the_rest_imported(self):
+        result = create_quote(rents=[])
+        csv = rent_roll_csv(result.address, 2) + \
+            '%d,U9,lots,0,1,1\n999999,U1,1000,0,1,1\n%d,U0,1000,0,1,1\n' % (
+                result.address_id,
+                result.address_id,
+            )
+        response = self.upload(csv.encode('utf-8'))
+        self.assertEqual(response.status_code, 201)
+        report = response.json()
+        self.assertEqual(report['created'], 2)
+        self.assertEqual(report['requoted'], 1)
+        self.assertEqual([error['line'] for error in report['errors']], [4, 5])
+        self.assertEqual(
+            report['duplicates'],
+            [{'line': 6, 'address_id': result.address_id, 'unit_number': 'U0'}],
+        )
+        result.refresh_from_db()
+        self.assertEqual(result.annual_property_rent, 2 * 1000 * 12)
+
+    def test_undecodable_upload_is_a_bad_request(self):
+        address = create_quote(rents=[]).address
+        content = rent_roll_csv(address, 3).encode('utf-8') + \
+            b'%d,Caf\xe9,1000,0,1,1\n' % address.pk
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(),
+            {'errors': [{'line': 5, 'error': "Line is not valid UTF-8 text"}]},
+        )
+        self.assertEqual(Rent.objects.count(), 0)
+
+
+class JobQueueTests(ApiTestCase):
+
+    def run_worker(self):
+        outcomes = []
+        jobs.run_worker(
+            burst=True,
+            log=lambda job_id, outcome: outcomes.append((job_id, outcome)),
+        )
+        return outcomes
+
+    def test_requote_jobs_are_coalesced_into_one_run(self):
+        addresses = [create_property(street='%d Main St' % i) for i in range(3)]
+        queued = [
+            jobs.enqueue('requote', {'address_ids': [address.pk]})
+            for address in addresses
+        ]
+        self.assertEqual(self.run_worker(), [(queued[0].pk, Job.DONE)])
+        self.assertEqual(Result.objects.count(), 3)
+        for job in Job.objects.all():
+            self.assertEqual(job.status, Job.DONE)
+            self.assertEqual(
+                job.get_result['coalesced_jobs'],
+                [job.pk for job in queued],
+            )
+
+    def test_failed_job_is_retried_later_then_fails(self):
+        job = jobs.enqueue('import_rent_roll', {'format': 'csv'}, max_attempts=2)
+        self.assertEqual(self.run_worker(), [(job.pk, Job.QUEUED)])
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('KeyError', job.error)
+        self.assertGreater(job.run_after, job.started_at)
+        # Not runnable before its backoff has passed.
+        self.assertEqual(self.run_worker(), [])
+
+        Job.objects.filter(pk=job.pk).update(run_after=job.created_at)
+        self.assertEqual(self.run_worker(), [(job.pk, Job.FAILED)])
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_import_reports_progress_every_chunk(self):
+        address = create_quote().address
+        lines = []
+        report = import_rent_roll(
+            rent_roll_csv(address, 5).splitlines(True),
+            chunk_size=2,
+            progress=lines.append,
+        )
+        self.assertEqual(report['created'], 5)
+        self.assertEqual(lines, [3, 5, 6, 6])
+
+    def test_background_requote_all_returns_the_job(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.force_login(admin)
+        create_quote()
+        response = self.client.post(
+            reverse('requote_all') + '?background=1',
+            {'chunk_size': 10},
+        )
+        self.assertEqual(response.status_code, 202)
+        self.run_worker()
+        status = self.client.get(response['Location']).json()
+        self.assertEqual(status['status'], Job.DONE)
+        self.assertEqual(status['result']['requoted'], 1)
+
+    def test_list_body_is_a_bad_request(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.force_login(admin)
+        response = self.client.post(
+            reverse('requote_all'),
+            json.dumps([1, 2]),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class RateCurveTestCase(ApiTestCase):
+    """
+    Prices at 5.627%, which Result stores as 5.63
+    """
+
+    def setUp(self):
+        super(RateCurveTestCase, self).setUp()
+        rates.curve_cache.invalidate()
+        RateCurve.objects.create(
+            effective_date='2000-01-01',
+            tenor_months=engine.TERM_MONTHS,
+            index_rate=Decimal('3.500'),
+            spread=Decimal('2.127'),
+        )
+
+    def tearDown(self):
+        rates.curve_cache.invalidate()
+
+
+class DebtRateTests(RateCurveTestCase):
+
+    def test_loans_are_sized_at_the_stored_rate(self):
+        result = create_quote()
+        result.refresh_from_db()
+        self.assertEqual(result.debt_rate, Decimal('5.63'))
+        self.assertEqual(result.dscr_loan_amount, result.get_dscr_loan_amount)
+        Result.objects.filter(pk=result.pk).update(dscr_loan_amount=0)
+        result = Result.objects.get(pk=result.pk)
+        result.save()
+        self.assertEqual(result.dscr_loan_amount, result.get_dscr_loan_amount)
+
+    def test_created_quotes_render_the_rate_as_a_string(self):
+        response = self.client.post(
+            reverse('quote_create'),
+            json.dumps({
+                'street': '1 Main St',
+                'city': 'Springfield',
+                'state': 'NY',
+                'zip_code': '10001',
+                'expense': {
+                    'marketing': 100,
+                    'taxes': 2000,
+                    'insurance': 500,
+                    'repairs': 300,
+                    'administration': 200,
+                },
+                'cap_rate': '6.50',
+                'rent_roll': [],
+            }),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['debt_rate'], '5.63')
+
+
+class WhatIfTests(RateCurveTestCase):
+
+    def test_quotes_match_the_stored_result(self):
+        result = create_quote(rents=[1500, 2250])
+        response = self.client.post(
+            reverse('what_if'),
+            json.dumps({
+                'annual_rent': result.annual_property_rent,
+                'annual_expense': 3100,
+                'cap_rate': '6.50',
+            }),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        quote = response.json()
+        for field in engine.RESULT_FIELDS:
+            self.assertEqual(quote[field], getattr(result, field), field)
+
+    def test_out_of_range_inputs_are_a_bad_request(self):
+        valid = {'annual_rent': 36000, 'annual_expense': 3100, 'cap_rate': 6.5}
+        for changes in (
+            {'annual_rent': 1e30},
+            {'annual_expense': 10 ** 13},
+            {'cap_rate': 0},
+            {'cap_rate': 1e-9},
+            {'debt_rate': 1e6},
+            {'term': 1e9},
+            {'term': 0},
+            {'dscr': 1e-12},
+            {'dscr': 'nan'},
+        ):
+            response = self.client.post(
+                reverse('what_if'),
+                json.dumps(dict(valid, **changes)),
+                content_type='application/json',
+            )
+            self.assertEqual(response.status_code, 400, changes)
+        response = self.client.post(
+            reverse('what_if'),
+            json.dumps({'scenarios': [
+                dict(valid, term=600, dscr=100, debt_rate=100),
+                {'rent_roll': [{'monthly_rent': 10 ** 11}] * 2,
+                 'annual_expense': 0, 'cap_rate': 5},
+            ]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()['scenarios']), ['1'])
+
+    @override_settings(QUOTES_RATE_CURVE_TTL=0)
+    def test_no_queries_once_the_curve_is_loaded(self):
+        rates.get_debt_rate()
+        with self.assertNumQueries(0):
+            quotes = quote_scenarios(parse_scenarios([
+                {'annual_rent': 36000, 'annual_expense': 3100, 'cap_rate': 6.5},
+            ])[0])
+        self.assertEqual(quotes[0]['debt_rate'], 5.63)
+
+
+class SensitivityTests(ApiTestCase):
+
+    def test_invalid_axes_are_a_bad_request(self):
+        create_quote()
+        for params in (
+            {'debt_rates': 'nan'},
+            {'debt_rates': '1e400'},
+            {'debt_rates': '1:inf:1'},
+            {'debt_rates': '-5'},
+            {'cap_rates': '0'},
+            {'dscrs': '0'},
+            {'dscrs': '-1'},
+            {'terms': '0'},
+            {'terms': '120.5'},
+        ):
+            response = self.client.get(reverse('sensitivity'), params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('detail', response.json())
+        response = self.client.get(reverse('sensitivity'), {'debt_rates': '0,5'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_single_point_grid_matches_the_stored_quotes(self):
+        first = create_quote(street='1 Main St', rents=[1500, 2500])
+        second = create_quote(street='2 Main St', rents=[900], cap_rate='7.25')
+        grid = parse_grid({'debt_rates': str(first.debt_rate)})
+        self.assertEqual(
+            sensitivity(grid, address_id=first.address_id)['loan_amounts'],
+            [[[[first.loan_amount]]]],
+        )
+        self.assertEqual(
+            sensitivity(grid)['loan_amounts'],
+            [[[[first.loan_amount + second.loan_amount]]]],
+        )
+
+    def test_cap_rate_axis_totals_match_per_property_sums(self):
+        results = [
+            create_quote(street='%d Main St' % i, rents=[1000 * i])
+            for i in range(1, 4)
+        ]
+        grid = parse_grid({
+            'debt_rates': str(results[0].debt_rate),
+            'cap_rates': '6.5,20',
+        })
+        totals = sensitivity(grid)['loan_amounts'][0]
+        # Summed before truncating, so within a dollar per property.
+        self.assertAlmostEqual(
+            totals[0][0][0],
+            sum(result.loan_amount for result in results),
+            delta=len(results),
+        )
+        self.assertLess(totals[1][0][0], totals[0][0][0])
+
+
+class QueryStatsTests(ApiTestCase):
+
+    def setUp(self):
+        super(QueryStatsTests, self).setUp()
+        self.stats_dir = tempfile.mkdtemp()
+        self.settings = override_settings(
+            QUOTES_STATS_SAMPLE_RATE=1,
+            QUOTES_STATS_DIR=self.stats_dir,
+        )
+        self.settings.enable()
+        instrumentation.route_stats.reset()
+
+    def tearDown(self):
+        self.settings.disable()
+        instrumentation.route_stats.reset()
+        for name in os.listdir(self.stats_dir):
+            os.remove(os.path.join(self.stats_dir, name))
+        os.rmdir(self.stats_dir)
+
+    def test_queries_run_while_streaming_are_counted(self):
+        create_quote(street='1 Main St')
+        create_quote(street='2 Main St')
+        response = self.client.get(
+            reverse('quote_export', kwargs={'export_format': 'csv'})
+        )
+        self.assertNotIn('quote_export', instrumentation.route_stats.snapshot())
+        with CaptureQueriesContext(connection) as streamed:
+            b''.join(response.streaming_content)
+        response.close()
+        self.assertGreater(len(streamed), 0)
+        stats = instrumentation.route_stats.snapshot()['quote_export']
+        self.assertEqual(stats['requests'], 1)
+        self.assertGreaterEqual(stats['queries'], len(streamed))
+
+    def test_snapshots_of_exited_processes_are_folded_together(self):
+        exited = subprocess.Popen([sys.executable, '-c', ''])
+        exited.wait()
+        instrumentation.route_stats.record('quote_list', 0.02, 3, 0.01, {})
+        instrumentation.route_stats.flush(force=True)
+        os.rename(
+            os.path.join(self.stats_dir, '%d.json' % os.getpid()),
+            os.path.join(self.stats_dir, '%d.json' % exited.pid),
+        )
+        instrumentation.route_stats.flush(force=True)
+
+        for i in range(2):
+            routes = instrumentation.merge_snapshots(
+                instrumentation.load_snapshots()
+            )
+            self.assertEqual(routes['quote_list']['requests'], 2)
+            self.assertEqual(routes['quote_list']['queries'], 6)
+        self.assertEqual(
+            sorted(os.listdir(self.stats_dir)),
+            sorted(['%d.json' % os.getpid(), instrumentation.RETIRED_SNAPSHOT]),
+        )
+
+
+class KeysetPaginationTests(ApiTestCase):
+
+    def setUp(self):
+        super(KeysetPaginationTests, self).setUp()
+        self.results = [
+            create_quote(street='%d Main St' % i, state=state)
+            for i, state in enumerate(['NY', 'CA', 'NY', 'TX', 'CA', 'NY', 'TX'])
+        ]
+
+    def walk(self, url, direction):
+        ids = []
+        while url:
+            page = self.client.get(url).json()
+            ids.append([row['id'] for row in page['results']])
+            url = page[direction]
+        return ids
+
+    def test_pages_forward_then_back(self):
+        ids = [result.pk for result in self.results]
+        forward = self.walk(reverse('result-list') + '?page_size=3', 'next')
+        self.assertEqual(forward, [ids[0:3], ids[3:6], ids[6:7]])
+
+        last = self.client.get(reverse('result-list') + '?page_size=3')
+        for i in range(2):
+            last = self.client.get(last.json()['next'])
+        backward = self.walk(last.json()['previous'], 'previous')
+        self.assertEqual(backward, [ids[3:6], ids[0:3]])
+
+    def test_sorted_pages_do_not_skip_or_repeat_ties(self):
+        url = reverse('result-list') + '?page_size=2&sort=-state'
+        forward = [pk for page in self.walk(url, 'next') for pk in page]
+        expected = [
+            result.pk for result in sorted(
+                self.results,
+                key=lambda result: (result.address.state, result.address_id),
+                reverse=True,
+            )
+        ]
+        self.assertEqual(forward, expected)
+
+    def test_tampered_cursors_are_rejected(self):
+        for key in (['abc'], [[]], [None], [1, 2], 'abc'):
+            token = base64.urlsafe_b64encode(
+                json.dumps({'k': key, 'r': False}).encode('utf-8')
+            ).decode('ascii')
+            for url in (reverse('result-list'), reverse('result_list')):
+                response = self.client.get(url, {'cursor': token})
+                if url == reverse('result-list'):
+                    self.assertEqual(response.status_code, 400, key)
+                    self.assertEqual(list(response.json()), ['cursor'])
+                else:
+                    self.assertEqual(response.status_code, 200, key)
+                    self.assertEqual(
+                        [result.pk for result in response.context['result_list']],
+                        [result.pk for result in self.results],
+                    )
+        response = self.client.get(reverse('result-list'), {'cursor': '%%%'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_rent_roll_cursor_steps_both_ways(self):
+        address = create_property(street='9 Elm St', rents=[1000, 1100, 1200])
+        units = list(
+            Rent.objects. \
+                filter(address=address). \
+                order_by('id'). \
+                values_list('id', flat=True)
+        )
+        cursor = RentRollCursor(address.pk)
+        self.assertEqual(cursor.first(), units[0])
+        self.assertEqual(cursor.next(units[0]), units[1])
+        self.assertEqual(cursor.next(units[2]), None)
+        self.assertEqual(cursor.previous(units[2]), units[1])
+        self.assertEqual(cursor.previous(units[0]), None)
+
+
+class ExportTests(ApiTestCase):
+
+    def setUp(self):
+        super(ExportTests, self).setUp()
+        self.small = create_quote(street='1 Main St', rents=[1000])
+        self.large = create_quote(
+            street='2 Main St', state='CA', zip_code='90001',
+            rents=[4000, 4000, 4000],
+        )
+
+    def export(self, export_format='csv', **params):
+        response = self.client.get(
+            reverse('quote_export', kwargs={'export_format': export_format}),
+            params,
+        )
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_has_one_row_per_quote(self):
+        response, content = self.export()
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        rows = list(csv.DictReader(io.StringIO(content.decode('utf-8'))))
+        self.assertEqual(
+            [int(row['result_id']) for row in rows],
+            [self.small.pk, self.large.pk],
+        )
+        self.assertEqual(rows[1]['state'], 'CA')
+        self.assertEqual(rows[1]['annual_expense'], '3100')
+        self.assertEqual(int(rows[1]['loan_amount']), self.large.loan_amount)
+
+    def test_gzipped_ndjson_matches_the_plain_export(self):
+        response, plain = self.export('ndjson')
+        response, compressed = self.export('ndjson', gzip='1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('quotes.ndjson.gz', response['Content-Disposition'])
+        self.assertEqual(gzip.decompress(compressed), plain)
+        lines = [json.loads(line) for line in plain.decode('utf-8').splitlines()]
+        self.assertEqual(
+            [line['address_id'] for line in lines],
+            [self.small.address_id, self.large.address_id],
+        )
+
+    def test_filters_narrow_the_export(self):
+        for params, expected in (
+                ({'state': 'CA'}, [self.large]),
+                ({'zip': '10001'}, [self.small]),
+                ({'min_loan': self.large.loan_amount}, [self.large]),
+                ({'max_loan': self.small.loan_amount}, [self.small])):
+            response, content = self.export(**params)
+            rows = list(csv.DictReader(io.StringIO(content.decode('utf-8'))))
+            self.assertEqual(
+                [int(row['result_id']) for row in rows],
+                [result.pk for result in expected],
+                params,
+            )
+
+    def test_bad_parameters_are_a_bad_request(self):
+        for export_format, params in (('xml', {}), ('csv', {'min_loan': 'x'})):
+            response = self.client.get(
+                reverse('quote_export', kwargs={'export_format': export_format}),
+                params,
+            )
+            self.assertEqual(response.status_code, 400)
+
+
+def quote_document(street='1 Main St', rents=(1000,)):
+    return {
+        'street': street,
+        'city': 'Springfield',
+        'state': 'NY',
+        'zip_code': '10001',
+        'expense': {
+            'marketing': 100,
+            'taxes': 2000,
+            'insurance': 500,
+            'repairs': 300,
+            'administration': 200,
+        },
+        'cap_rate': '6.50',
+        'rent_roll': [
+            {
+                'unit_number': str(i + 1),
+                'monthly_rent': monthly_rent,
+                'vacancy': 0,
+                'bedrooms': 1,
+                'bathrooms': 1,
+            }
+            for i, monthly_rent in enumerate(rents)
+        ],
+    }
+
+
+class QuoteCreateTests(ApiTestCase):
+
+    def post(self, data):
+        return self.client.post(
+            reverse('quote_create'),
+            json.dumps(data),
+            content_type='application/json',
+        )
+
+    def test_document_is_quoted_like_the_wizard(self):
+        expected = create_quote(street='9 Elm St', rents=[1500, 900])
+        response = self.post(quote_document(rents=[1500, 900]))
+        self.assertEqual(response.status_code, 201)
+        quote = response.json()
+        self.assertEqual(quote['loan_amount'], expected.loan_amount)
+        self.assertEqual(
+            Rent.objects.filter(address_id=quote['address_id']).count(), 2
+        )
+
+    def test_list_documents_are_created_in_order(self):
+        response = self.post([
+            quote_document(street='1 Main St'),
+            quote_document(street='2 Main St', rents=[2000]),
+        ])
+        self.assertEqual(response.status_code, 201)
+        address_ids = [quote['address_id'] for quote in response.json()]
+        self.assertEqual(
+            [Address.objects.get(pk=pk).street for pk in address_ids],
+            ['1 Main St', '2 Main St'],
+        )
+
+    def test_existing_address_is_rejected(self):
+        create_property(street='1 Main St')
+        response = self.post(quote_document(street='1 Main St'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('address', response.json())
+
+        response = self.post([
+            quote_document(street='2 Main St'),
+            quote_document(street='1 Main St'),
+        ])
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()
+        self.assertEqual(errors[0], {})
+        self.assertIn('address', errors[1])
+        self.assertEqual(Address.objects.count(), 1)
+
+    def test_repeated_documents_in_a_list_are_rejected(self):
+        response = self.post([
+            quote_document(street='1 Main St'),
+            quote_document(street='2 Main St'),
+            quote_document(street='1 Main St'),
+        ])
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()
+        self.assertIn('address', errors[0])
+        self.assertEqual(errors[1], {})
+        self.assertIn('address', errors[2])
+        self.assertFalse(Address.objects.exists())
+
+    def test_repeated_unit_numbers_are_rejected(self):
+        document = quote_document(rents=[1000, 1100])
+        document['rent_roll'][1]['unit_number'] = '1'
+        response = self.post(document)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('rent_roll', response.json())
+        self.assertFalse(Address.objects.exists())
+
+
+class FastReadTests(ApiTestCase):
+
+    def setUp(self):
+        super(FastReadTests, self).setUp()
+        create_property(street='1 Main St', rents=[1000, 1250])
+        create_property(street='2 Main St', rents=[900], cap_rate='5.75')
+
+    def serialized(self, viewset):
+        request = Request(RequestFactory().get('/'))
+        serializer = viewset.serializer_class(
+            viewset.queryset.all(),
+            many=True,
+            context={'request': request},
+        )
+        return json.loads(json.dumps(serializer.data, cls=DjangoJSONEncoder))
+
+    def test_reads_match_the_serializers(self):
+        for route, viewset in (
+                ('address', views.AddressesViewSet),
+                ('expense', views.ExpenseViewSet),
+                ('caprate', views.CapRateViewSet),
+                ('rent', views.RentViewSet)):
+            expected = self.serialized(viewset)
+            response = self.client.get(reverse('%s-list' % route))
+            self.assertEqual(response.status_code, 200, route)
+            self.assertEqual(response.json(), expected, route)
+
+            first = viewset.queryset.first()
+            response = self.client.get(
+                reverse('%s-detail' % route, args=[first.pk])
+            )
+            self.assertEqual(response.json(), expected[0], route)
+
+    def test_sparse_fieldsets(self):
+        response = self.client.get(
+            reverse('caprate-list'), {'fields': 'cap_rate'}
+        )
+        self.assertEqual(
+            [list(row) for row in response.json()],
+            [['cap_rate'], ['cap_rate']],
+        )
+        self.assertEqual(
+            [row['cap_rate'] for row in response.json()],
+            ['6.50', '5.75'],
+        )
+
+    def test_unknown_fields_are_a_bad_request(self):
+        for url in (reverse('rent-list'), reverse('address-detail', args=[
+                Address.objects.first().pk])):
+            response = self.client.get(url, {'fields': 'street,secret'})
+            self.assertEqual(response.status_code, 400, url)
+            self.assertEqual(list(response.json()), ['fields'])
+
+
+class ResultApiQueryTests(ApiTestCase):
+
+    def queries(self, params):
+        # Only the page itself; the list ETag has its own test.
+        with mock.patch('quotes.conditional.collection_version', return_value=0):
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(reverse('result-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, [
+            query['sql'] for query in captured.captured_queries
+            if 'quotes_' in query['sql']
+        ]
+
+    def test_a_page_costs_the_same_queries_whatever_its_size(self):
+        create_quote(street='1 Main St', rents=[1000, 1100])
+        small = {
+            params: len(self.queries(params)[1])
+            for params in ((), (('include', 'rent_roll'),))
+        }
+        self.assertEqual(small, {(): 1, (('include', 'rent_roll'),): 2})
+
+        for i in range(2, 8):
+            create_quote(street='%d Main St' % i, rents=[1000] * i)
+        for params, count in small.items():
+            response, queries = self.queries(params)
+            self.assertEqual(len(response.json()['results']), 7)
+            self.assertEqual(len(queries), count, params)
+
+    def test_nested_rent_roll_is_in_unit_order(self):
+        result = create_quote(rents=[1000, 1100, 1200])
+        response, queries = self.queries({'include': 'rent_roll'})
+        quote = response.json()['results'][0]
+        self.assertEqual(quote['address']['street'], result.address.street)
+        self.assertEqual(quote['cap_rate'], '6.50')
+        self.assertEqual(
+            [unit['monthly_rent'] for unit in quote['rent_roll']],
+            [1000, 1100, 1200],
+        )
+
+
+class SyntheticPortfolioTests(TestCase):
+
+    def snapshot(self, address_ids):
+        addresses = Address.objects.filter(pk__in=address_ids).order_by('pk')
+        return [
+            (
+                address.street,
+                address.state,
+                address.zip_code,
+                address.expense.annual_expense,
+                address.caprate.cap_rate,
+                list(
+                    address.rent_set. \
+                        order_by('id'). \
+                        values_list('unit_number', 'monthly_rent', 'vacancy')
+                ),
+                address.result.loan_amount,
+            )
+            for address in addresses
+        ]
+
+    def test_same_seed_same_portfolio(self):
+        first = self.snapshot(generate_portfolio(4, min_units=2, max_units=5, seed=7))
+        Address.objects.all().delete()
+        second = self.snapshot(generate_portfolio(4, min_units=2, max_units=5, seed=7))
+        self.assertEqual(first, second)
+
+        other = self.snapshot(generate_portfolio(4, min_units=2, max_units=5, seed=8))
+        self.assertNotEqual(first, other)
+
+    def test_every_address_is_quoted_from_its_rent_roll(self):
+        address_ids = generate_portfolio(5, min_units=2, max_units=5, seed=1)
+        self.assertEqual(len(address_ids), 5)
+        for address_id in address_ids:
+            rents = Rent.objects.filter(address_id=address_id)
+            self.assertTrue(2 <= rents.count() <= 5)
+            result = Result.objects.get(address_id=address_id)
+            self.assertEqual(
+                result.annual_property_rent,
+                sum(rent.annual_unit_rent for rent in rents),
+            )
+
+    def test_benchmarks_run_every_hot_path_cleanly(self):
+        report = run_benchmarks(properties=3, min_units=1, max_units=3, repeat=1)
+        self.assertEqual(report['properties'], 3)
+        benchmarks = report['benchmarks']
+        for name in ('result_save', 'bulk_requote', 'result_list',
+                'rent_update_navigation', 'api:result-list'):
+            self.assertIn(name, benchmarks)
+        for name, stats in benchmarks.items():
+            self.assertNotIn('errors', stats, name)
+
+
+class SQLiteBackendTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.settings_dict = dict(
+            connection.settings_dict,
+            ENGINE='quotes.backends.sqlite3',
+            NAME=os.path.join(directory, 'quotes.sqlite3'),
+            OPTIONS={
+                'timeout': 0,
+                'lock_retries': 3,
+                'pragmas': {'journal_mode': 'WAL', 'synchronous': 'NORMAL'},
+            },
+        )
+        self.first = self.open()
+        self.first.cursor().execute('CREATE TABLE unit (number integer)')
+
+    def open(self):
+        wrapper = sqlite3_backend.DatabaseWrapper(self.settings_dict, 'writer')
+        wrapper.ensure_connection()
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        cursor = self.open().cursor()
+        cursor.execute('PRAGMA journal_mode')
+        self.assertEqual(cursor.fetchone(), ('wal',))
+        cursor.execute('PRAGMA synchronous')
+        self.assertEqual(cursor.fetchone(), (1,))
+
+    def test_transactions_take_the_write_lock_when_they_begin(self):
+        second = self.open()
+        self.first._start_transaction_under_autocommit()
+        with mock.patch.object(sqlite3_backend.time, 'sleep') as sleep:
+            with self.assertRaisesMessage(
+                    OperationalError, 'locked'):
+                second._start_transaction_under_autocommit()
+        self.assertEqual(sleep.call_count, 3)
+
+        self.first.connection.rollback()
+        second._start_transaction_under_autocommit()
+        self.assertTrue(second.connection.in_transaction)
+
+    def test_locked_statements_are_retried_outside_a_transaction(self):
+        second = self.open()
+        self.first._start_transaction_under_autocommit()
+        self.first.cursor().execute('INSERT INTO unit VALUES (1)')
+        # The writer commits while the second connection backs off.
+        with mock.patch.object(
+                sqlite3_backend.time, 'sleep',
+                side_effect=lambda delay: self.first.connection.commit()):
+            second.cursor().execute('INSERT INTO unit VALUES (2)')
+        cursor = second.cursor()
+        cursor.execute('SELECT number FROM unit ORDER BY number')
+        self.assertEqual(cursor.fetchall(), [(1,), (2,)])
+
+    def test_statements_inside_a_transaction_are_not_retried(self):
+        second = self.open()
+        second.cursor().execute('BEGIN')
+        second.cursor().execute('SELECT * FROM unit')
+        self.first._start_transaction_under_autocommit()
+        self.first.cursor().execute('INSERT INTO unit VALUES (1)')
+        with mock.patch.object(sqlite3_backend.time, 'sleep') as sleep:
+            with self.assertRaisesMessage(
+                    OperationalError, 'locked'):
+                second.cursor().execute('INSERT INTO unit VALUES (2)')
+        self.assertFalse(sleep.called)
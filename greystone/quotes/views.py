@@ -1,13 +1,17 @@
 from django.shortcuts import get_object_or_404
 from django.shortcuts import redirect, render
-from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect,
+    StreamingHttpResponse
+)
 from django.views.generic import (
     ListView, DetailView, CreateView, 
-    DeleteView, UpdateView, TemplateView
+    DeleteView, UpdateView, TemplateView, View
 )
 from django.urls.base import reverse_lazy
 from django.db.models.query import QuerySet
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
 
 from django import forms
 
@@ -22,22 +26,82 @@ from rest_framework.decorators import (
     api_view, list_route, detail_route
 )
 from rest_framework.reverse import reverse
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
 
 from quotes.serializers import (
     AddressSerializer, RentSerializer,
-    ExpenseSerializer, CapRateSerializer, ResultSerializer
+    ExpenseSerializer, CapRateSerializer, ResultSerializer,
+    QuoteDocumentSerializer, PortfolioSummarySerializer, JobSerializer
 )
 from quotes.models import (
-    Address, Rent, Expense, CapRate, Result
+    Address, Rent, Expense, CapRate, Result, PortfolioSummary, Job
+)
+from quotes.rentroll import (
+    IMPORT_FORMATS, UNIT_FIELDS, RentRollCursor, apply_rent_roll_changes,
+    find_undecodable_line, import_rent_roll, parse_rent_roll_changes
 )
+from quotes.forms import RentRollFormSet
+from quotes import jobs, recompute
+from quotes.cache import CachedDetailMixin, CachedRetrieveMixin
+from quotes.conditional import ConditionalDetailMixin, ConditionalViewSetMixin
+from quotes.fastread import ValuesReadMixin
+from quotes.documents import create_quotes
+from quotes.whatif import ScenarioError, parse_scenarios, quote_scenarios
+from quotes.sensitivity import parse_grid, sensitivity
+from quotes.repricing import requote_all
+from quotes.export import ExportError, export_chunks, export_filters
+from quotes.pagination import (
+    CURSOR_PARAM, InvalidCursor, KeysetPagination, RESULT_SORTS, cursor_url,
+    paginate_results
+)
+
 
+def run_in_background(request):
+    """
+    Whether the client asked with ?background=1 (or a "background" field)
+    for the work to be queued instead of done before responding
+    """
+    value = request.query_params.get('background')
+    if value is None and isinstance(request.data, dict):
+        value = request.data.get('background')
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
 
-class AddressesViewSet(viewsets.ModelViewSet):
+
+def job_accepted(request, job):
+    """
+    202 response pointing at the status of a queued job
+    """
+    data = JobSerializer(job).data
+    data['url'] = reverse('job_status', kwargs={'pk': job.pk}, request=request)
+    return Response(
+        data,
+        status=status.HTTP_202_ACCEPTED,
+        headers={'Location': data['url']},
+    )
+
+
+class RecomputeQuoteMixin(object):
+    """
+    Saves the form and schedules a single recompute of the quote for
+    when the request's transaction commits.
+    """
+
+    def form_valid(self, form):
+        with transaction.atomic():
+            response = super(RecomputeQuoteMixin, self).form_valid(form)
+            recompute.mark_dirty(self.object.address_id)
+        return response
+
+
+class AddressesViewSet(ConditionalViewSetMixin, ValuesReadMixin,
+        CachedRetrieveMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows Addresses to be viewed or edited.
     """
     queryset = Address.objects.all().order_by('street')
     serializer_class = AddressSerializer
+    address_field = 'id'
 
 
 class AddressListView(ListView):
@@ -46,10 +110,13 @@ class AddressListView(ListView):
     template_name = 'quotes/address_list.html'
 
 
-class AddressDetailView(DetailView):
+class AddressDetailView(ConditionalDetailMixin, CachedDetailMixin, DetailView):
     model = Address
     template_name = 'quotes/address_detail.html'
 
+    def get_cache_address_id(self, obj):
+        return obj.pk
+
 
 class AddressCreateView(CreateView):
     model = Address
@@ -87,7 +154,8 @@ class AddressUpdateView(UpdateView):
         return success_url
 
 
-class ExpenseViewSet(viewsets.ModelViewSet):
+class ExpenseViewSet(ConditionalViewSetMixin, ValuesReadMixin,
+        CachedRetrieveMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows Expenses to be viewed or edited.
     """
@@ -118,7 +186,7 @@ class ExpenseCreateView(CreateView):
         return super(ExpenseCreateView, self).form_valid(form)
 
 
-class ExpenseUpdateView(UpdateView):
+class ExpenseUpdateView(RecomputeQuoteMixin, UpdateView):
     model = Expense
     template_name = 'quotes/expense_update_form.html'
     fields = [
@@ -134,9 +202,6 @@ class ExpenseUpdateView(UpdateView):
             'cap_rate_update', 
             kwargs={'pk': self.object.address.id}
         )
-        obj, created = Result.objects.update_or_create(
-            address_id=self.object.address.id
-        )
         return success_url
 
     def form_valid(self, form):
@@ -144,7 +209,8 @@ class ExpenseUpdateView(UpdateView):
         return super(ExpenseUpdateView, self).form_valid(form)
 
 
-class CapRateViewSet(viewsets.ModelViewSet):
+class CapRateViewSet(ConditionalViewSetMixin, ValuesReadMixin,
+        CachedRetrieveMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows CapRates to be viewed or edited.
     """
@@ -169,32 +235,29 @@ class CapRateCreateView(CreateView):
         return super(CapRateCreateView, self).form_valid(form)
 
 
-class CapRateUpdateView(UpdateView):
+class CapRateUpdateView(RecomputeQuoteMixin, UpdateView):
     model = CapRate
     template_name = 'quotes/caprate_update_form.html'
     fields = ['cap_rate']
 
     def get_success_url(self):
-        rent_ids = Rent.objects.filter(address_id=self.object.address.id)
-        rent_ids_list = rent_ids.values_list('id', flat=True)
+        first_unit_id = RentRollCursor(self.object.address_id).first()
 
-        if len(rent_ids_list) > 0:
+        if first_unit_id is not None:
             success_url = reverse_lazy(
                 'rent_update', 
-                kwargs={'pk': rent_ids_list[0]}
+                kwargs={'pk': first_unit_id}
             )
         else:
             success_url = reverse_lazy(
                 'rent_create',
                 kwargs={'pk': self.object.address.id}
             )
-        obj, created = Result.objects.update_or_create(
-            address_id=self.object.address.id
-        )
         return success_url
 
 
-class RentViewSet(viewsets.ModelViewSet):
+class RentViewSet(ConditionalViewSetMixin, ValuesReadMixin,
+        CachedRetrieveMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows Rents to be viewed or edited.
     """
@@ -203,7 +266,118 @@ class RentViewSet(viewsets.ModelViewSet):
     template_name = 'quotes/rent.html'
 
 
-class RentCreateView(CreateView):
+class RentRollImportView(APIView):
+    """
+    API endpoint that bulk imports a CSV or JSONL rent roll upload.
+    With ?background=1 the import is queued and the job returned.
+    """
+    parser_classes = (MultiPartParser,)
+
+    def post(self, request, format=None):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {'file': ["No rent roll file was submitted."]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        roll_format = request.data.get('format')
+        if not roll_format:
+            if upload.name.lower().endswith(('.jsonl', '.ndjson')):
+                roll_format = 'jsonl'
+            else:
+                roll_format = 'csv'
+        if roll_format not in IMPORT_FORMATS:
+            return Response(
+                {'format': ["Expected one of: %s." % ', '.join(IMPORT_FORMATS)]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        line_number = find_undecodable_line(upload)
+        if line_number is not None:
+            return Response(
+                {'errors': [{
+                    'line': line_number,
+                    'error': "Line is not valid UTF-8 text",
+                }]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        upload.seek(0)
+
+        if run_in_background(request):
+            job = jobs.enqueue('import_rent_roll', {
+                'format': roll_format,
+                'rent_roll': upload.read().decode('utf-8'),
+            })
+            return job_accepted(request, job)
+        report = import_rent_roll(upload, format=roll_format)
+        return Response(report, status=status.HTTP_201_CREATED)
+
+
+class RentRollView(APIView):
+    """
+    API endpoint for a property's whole rent roll.  PATCH takes
+    {"create": [...], "update": [...], "delete": [...]}, validates every
+    unit and applies all changes at once.
+    """
+
+    def get(self, request, pk, format=None):
+        address = get_object_or_404(Address, pk=pk)
+        units = Rent.objects. \
+            filter(address=address). \
+            order_by('id'). \
+            values('id', *UNIT_FIELDS)
+        return Response(list(units))
+
+    def patch(self, request, pk, format=None):
+        address = get_object_or_404(Address, pk=pk)
+        creates, updates, deletes, errors = parse_rent_roll_changes(
+            address.pk,
+            request.data
+        )
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        report = apply_rent_roll_changes(address.pk, creates, updates, deletes)
+        return Response(report)
+
+
+class RentRollEditView(TemplateView):
+    """
+    Edits every unit of a rent roll on one page
+    """
+    template_name = 'quotes/rent_roll_form.html'
+
+    def get_formset(self):
+        return RentRollFormSet(
+            self.request.POST or None,
+            queryset=Rent.objects. \
+                filter(address_id=self.address.pk). \
+                order_by('id'),
+            address_id=self.address.pk,
+        )
+
+    def dispatch(self, request, *args, **kwargs):
+        self.address = get_object_or_404(Address, pk=kwargs['pk'])
+        return super(RentRollEditView, self).dispatch(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        return self.render_to_response(
+            self.get_context_data(formset=self.get_formset(), address=self.address)
+        )
+
+    def post(self, request, *args, **kwargs):
+        formset = self.get_formset()
+        if not formset.is_valid():
+            return self.render_to_response(
+                self.get_context_data(formset=formset, address=self.address)
+            )
+        apply_rent_roll_changes(self.address.pk, *formset.get_changes())
+        if 'finish' in request.POST:
+            return redirect('result_list')
+        return redirect('rent_roll_edit', pk=self.address.pk)
+
+
+class RentCreateView(RecomputeQuoteMixin, CreateView):
     model = Rent
     template_name = 'quotes/rent_create_form.html'
     fields = [
@@ -225,9 +399,6 @@ class RentCreateView(CreateView):
                 kwargs={'pk': self.object.address.id}
             )
 
-        obj, created = Result.objects.update_or_create(
-            address_id=self.object.address.id
-        )
         return success_url
 
     def form_valid(self, form):
@@ -248,7 +419,7 @@ class RentDuplicateView(TemplateView):
     template_name = 'quotes/rent_duplicate.html'
 
 
-class RentUpdateView(UpdateView):
+class RentUpdateView(RecomputeQuoteMixin, UpdateView):
     model = Rent
     template_name = 'quotes/rent_update_form.html'
     fields = [
@@ -264,23 +435,19 @@ class RentUpdateView(UpdateView):
             success_url = reverse_lazy(
                 'result_list'
             )
-        elif 'update_rent' in self.request.POST:
-            current_rent_id = self.object.pk
-            print ("\nRent ID:", current_rent_id)
-            rent_roll = Rent.objects.filter(address=self.object.address)
-
-            if len(rent_roll) > 1:
-                for unit in rent_roll:
-                    if unit.id > current_rent_id:
-                        success_url = reverse_lazy(
-                            'rent_update', 
-                            kwargs={'pk': unit.id}
-                        )
-                        break
-                    else:
-                        success_url = reverse_lazy(
-                            'result_list'
-                        )
+        elif 'update_rent' in self.request.POST or \
+                'previous_rent' in self.request.POST:
+            cursor = RentRollCursor(self.object.address_id)
+            if 'previous_rent' in self.request.POST:
+                unit_id = cursor.previous(self.object.pk)
+            else:
+                unit_id = cursor.next(self.object.pk)
+
+            if unit_id is not None:
+                success_url = reverse_lazy(
+                    'rent_update', 
+                    kwargs={'pk': unit_id}
+                )
             else:
                 success_url = reverse_lazy(
                     'result_list'
@@ -296,20 +463,25 @@ class RentUpdateView(UpdateView):
                 kwargs={'pk': self.object.address.id}
             )
 
-        obj, created = Result.objects.update_or_create(
-            address_id=self.object.address.id
-        )
         return success_url
 
 
 class RentDeleteView(DeleteView):
     model = Rent
 
+    def delete(self, request, *args, **kwargs):
+        with transaction.atomic():
+            response = super(RentDeleteView, self). \
+                delete(request, *args, **kwargs)
+            recompute.mark_dirty(self.object.address_id)
+        return response
+
     def get_success_url(self):
-        if self.object.pk+1:
+        unit_id = RentRollCursor(self.object.address_id).next(self.object.pk)
+        if unit_id is not None:
             success_url = reverse_lazy(
                 'rent_update',
-                kwargs={'pk': self.object.pk+1}
+                kwargs={'pk': unit_id}
             )
         else:
             success_url = reverse_lazy(
@@ -319,10 +491,235 @@ class RentDeleteView(DeleteView):
         return success_url
 
 
+class ResultViewSet(ConditionalViewSetMixin, CachedRetrieveMixin,
+        viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint that allows Results to be viewed, a cursor page at a time,
+    each nested with its address, expenses and cap rate.  ?include=rent_roll
+    nests the rent roll too.  A page costs the same two queries (one
+    without the rent roll) whatever its size.
+    """
+    queryset = Result.objects.select_related(
+        'address',
+        'address__expense',
+        'address__caprate',
+    )
+    serializer_class = ResultSerializer
+    pagination_class = KeysetPagination
+
+    def include_rent_roll(self):
+        include = self.request.query_params.get('include', '')
+        return 'rent_roll' in include.split(',')
+
+    def get_queryset(self):
+        queryset = super(ResultViewSet, self).get_queryset()
+        if self.include_rent_roll():
+            queryset = queryset.prefetch_related(Prefetch(
+                'address__rent_set',
+                queryset=Rent.objects.order_by('id'),
+            ))
+        return queryset
+
+    def get_serializer_context(self):
+        context = super(ResultViewSet, self).get_serializer_context()
+        context['include_rent_roll'] = self.include_rent_roll()
+        return context
+
+
+class QuoteCreateView(APIView):
+    """
+    API endpoint that creates complete quotes - address, expenses, cap
+    rate and rent roll - in one transaction.  Accepts a single quote
+    document or a list of them.
+    """
+
+    def post(self, request, format=None):
+        many = isinstance(request.data, list)
+        serializer = QuoteDocumentSerializer(data=request.data, many=many)
+        serializer.is_valid(raise_exception=True)
+        documents = serializer.validated_data if many \
+            else [serializer.validated_data]
+
+        address_ids = create_quotes(documents)
+        rows = Result.objects. \
+            filter(address_id__in=address_ids). \
+            values(
+                'id',
+                'address_id',
+                'annual_property_rent',
+                'noi',
+                'property_value',
+                'dscr_loan_amount',
+                'loan_amount',
+                'debt_rate',
+            )
+        results = {}
+        for result in rows:
+            # A string, as ResultSerializer renders it.
+            result['debt_rate'] = str(result['debt_rate'])
+            results[result['address_id']] = result
+        quotes = [results.get(address_id) for address_id in address_ids]
+        return Response(
+            quotes if many else quotes[0],
+            status=status.HTTP_201_CREATED
+        )
+
+
+class WhatIfView(APIView):
+    """
+    API endpoint that sizes hypothetical quotes without saving anything.
+    Accepts one scenario or {"scenarios": [...]}.
+    """
+
+    def post(self, request, format=None):
+        many = isinstance(request.data, dict) and 'scenarios' in request.data
+        scenarios = request.data['scenarios'] if many else [request.data]
+        try:
+            columns, errors = parse_scenarios(scenarios)
+        except ScenarioError as e:
+            return Response(
+                {'detail': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if errors:
+            return Response(
+                {'scenarios': errors} if many else {'detail': errors[0]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        quotes = quote_scenarios(columns)
+        return Response({'scenarios': quotes} if many else quotes[0])
+
+
+class RequoteAllView(APIView):
+    """
+    API endpoint that reprices every quote at the current debt rate.
+    Runs in this process unless ?background=1 queues it for the quote
+    worker; use 'manage.py requote_all --workers' to spread a large
+    portfolio across processes.
+    """
+    permission_classes = (IsAdminUser,)
+
+    def post(self, request, format=None):
+        if not isinstance(request.data, dict):
+            return Response(
+                {'non_field_errors': ["Expected an object."]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        options = {}
+        for name, default in (('chunk_size', 2000), ('batch_size', 500)):
+            try:
+                options[name] = int(request.data.get(name, default))
+            except (TypeError, ValueError):
+                options[name] = 0
+            if options[name] < 1:
+                return Response(
+                    {name: ["Expected a positive integer."]},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        options['resume'] = bool(request.data.get('resume', False))
+        if run_in_background(request):
+            return job_accepted(request, jobs.enqueue('requote_all', options))
+        report = requote_all(**options)
+        return Response(report)
+
+
+class JobView(generics.RetrieveAPIView):
+    """
+    API endpoint with the status and progress of a background job.
+    """
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+
+
+class PortfolioSummaryView(APIView):
+    """
+    API endpoint with portfolio totals - overall and per state, or for
+    one ?state= or ?zip= - read from the maintained summary rows.
+    """
+
+    def get(self, request, format=None):
+        for param, scope in (('state', PortfolioSummary.STATE),
+                ('zip', PortfolioSummary.ZIP_CODE)):
+            key = request.query_params.get(param)
+            if key:
+                summary = PortfolioSummary.objects. \
+                    filter(scope=scope, key=key). \
+                    first() or PortfolioSummary(scope=scope, key=key)
+                return Response(PortfolioSummarySerializer(summary).data)
+
+        summaries = PortfolioSummary.objects. \
+            filter(scope__in=[PortfolioSummary.OVERALL, PortfolioSummary.STATE]). \
+            order_by('scope', 'key')
+        overall = PortfolioSummary(scope=PortfolioSummary.OVERALL)
+        states = []
+        for summary in summaries:
+            if summary.scope == PortfolioSummary.OVERALL:
+                overall = summary
+            else:
+                states.append(summary)
+        return Response({
+            'overall': PortfolioSummarySerializer(overall).data,
+            'states': PortfolioSummarySerializer(states, many=True).data,
+        })
+
+
+class SensitivityView(APIView):
+    """
+    API endpoint returning the loan amount matrix over a grid of debt
+    rates, cap rates, amortization terms and DSCR thresholds, for one
+    address or the whole portfolio.
+    """
+
+    def get(self, request, format=None):
+        params = request.query_params
+        try:
+            grid = parse_grid(params)
+            address_id = params.get('address')
+            if address_id is not None:
+                address_id = int(address_id)
+        except ValueError as e:
+            return Response(
+                {'detail': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            matrix = sensitivity(
+                grid,
+                address_id=address_id,
+                state=params.get('state'),
+                zip_code=params.get('zip'),
+            )
+        except Result.DoesNotExist as e:
+            return Response(
+                {'detail': str(e)},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(matrix)
+
+
 class ResultListView(ListView):
     model = Result 
-    queryset = Result.objects.all()
+    queryset = Result.objects.select_related('address')
     template_name = 'quotes/result_list.html'
+    context_object_name = 'result_list'
+
+    def get_context_data(self, **kwargs):
+        query_params = self.request.GET
+        try:
+            rows, next_cursor, previous_cursor = \
+                paginate_results(self.object_list, query_params)
+        except InvalidCursor:
+            query_params = query_params.copy()
+            del query_params[CURSOR_PARAM]
+            rows, next_cursor, previous_cursor = \
+                paginate_results(self.object_list, query_params)
+        kwargs['object_list'] = rows
+        url = self.request.get_full_path()
+        kwargs['next_url'] = cursor_url(url, next_cursor)
+        kwargs['previous_url'] = cursor_url(url, previous_cursor)
+        kwargs['sorts'] = sorted(RESULT_SORTS)
+        return super(ResultListView, self).get_context_data(**kwargs)
 
     def get_success_url(self):
         if 'update_quote' in self.request.POST:
@@ -338,21 +735,53 @@ class ResultListView(ListView):
         return success_url
 
 
-class ResultDetailView(DetailView):
+class QuoteExportView(View):
+    """
+    Streams every quote, joined with its address, expense and cap rate,
+    as CSV or NDJSON; ?gzip=1 compresses on the fly.  Accepts the state,
+    zip, min_loan and max_loan filters.
+    """
+    content_types = {
+        'csv': 'text/csv; charset=utf-8',
+        'ndjson': 'application/x-ndjson; charset=utf-8',
+    }
+
+    def get(self, request, export_format):
+        compress = request.GET.get('gzip') in ('1', 'true')
+        try:
+            chunks = export_chunks(
+                export_format,
+                filters=export_filters(request.GET),
+                compress=compress,
+            )
+        except ExportError as e:
+            return HttpResponseBadRequest(str(e))
+
+        filename = 'quotes.%s' % export_format
+        if compress:
+            filename += '.gz'
+        response = StreamingHttpResponse(
+            chunks,
+            content_type='application/gzip' if compress
+                else self.content_types[export_format],
+        )
+        response['Content-Disposition'] = \
+            'attachment; filename="%s"' % filename
+        return response
+
+
+class ResultDetailView(ConditionalDetailMixin, CachedDetailMixin, DetailView):
     model = Result
+    queryset = Result.objects.with_inputs().select_related('address')
     template_name = 'quotes/result_detail.html'
 
 
 class ResultDeleteView(DeleteView):
     model = Result
+    success_url = reverse_lazy('result_list')
 
-    def get_success_url(self):
-        success_url = reverse_lazy(
-            'result_list'
-        )
-        address = Address.objects.get(id=self.object.address.id)
-        address.delete()
-        return success_url
-
-
-
+    def delete(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        # Deleting the address takes its quote with it.
+        self.object.address.delete()
+        return HttpResponseRedirect(self.get_success_url())
@@ -0,0 +1,163 @@
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+
+from quotes import engine, rates
+from quotes.documents import EXPENSE_FIELDS
+
+
+"""
+Stateless "what-if" quotes.
+
+Scenarios arrive as plain dicts and are turned straight into column
+arrays for engine.underwrite - no models, no ORM - so thousands of
+scenarios are sized in one vectorized pass with exactly the math of
+Result.  The default debt rate comes from the rate curve held in memory
+(rates.get_cached_debt_rate), which is only read from the database when
+the process has not loaded it yet or a RateCurve row changed in it.
+
+A scenario gives either `annual_rent` or a `rent_roll` of units with a
+`monthly_rent`, either `annual_expense` or an `expense` breakdown, and a
+`cap_rate`.  `debt_rate`, `term` (months) and `dscr` are optional and
+default to the rates used for saved quotes.  Amounts, rates, terms and
+DSCRs outside sane ranges are rejected rather than overflowing the
+engine.
+"""
+
+
+MAX_SCENARIOS = 5000
+# Input ranges that keep every figure well within the engine's int64
+# columns.
+MAX_AMOUNT = 10 ** 12
+MAX_RATE = 100
+MIN_CAP_RATE = Decimal('0.01')
+MIN_DSCR = Decimal('0.01')
+MAX_DSCR = 100
+MAX_TERM = 600
+
+
+class ScenarioError(ValueError):
+    pass
+
+
+def _number(scenario, field, minimum=0, maximum=MAX_AMOUNT, integer=False):
+    value = scenario.get(field)
+    if value is None or isinstance(value, bool):
+        raise ScenarioError("%s is required." % field)
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        raise ScenarioError("%s must be a number." % field)
+    if not number.is_finite() or number < minimum:
+        raise ScenarioError("%s must be at least %s." % (field, minimum))
+    if number > maximum:
+        raise ScenarioError("%s must be at most %s." % (field, maximum))
+    if integer and number != number.to_integral_value():
+        raise ScenarioError("%s must be a whole number." % field)
+    return float(number)
+
+
+def _annual_rent(scenario):
+    if 'annual_rent' in scenario:
+        return _number(scenario, 'annual_rent', integer=True)
+    rent_roll = scenario.get('rent_roll')
+    if not isinstance(rent_roll, list):
+        raise ScenarioError("Either annual_rent or rent_roll is required.")
+    total = 0
+    for unit in rent_roll:
+        if not isinstance(unit, dict):
+            raise ScenarioError("rent_roll units must be objects.")
+        total += _number(unit, 'monthly_rent', integer=True) * 12
+    if total > MAX_AMOUNT:
+        raise ScenarioError("The rent roll must total at most %s a year." % MAX_AMOUNT)
+    return total
+
+
+def _annual_expense(scenario):
+    if 'annual_expense' in scenario:
+        return _number(scenario, 'annual_expense', integer=True)
+    expense = scenario.get('expense')
+    if not isinstance(expense, dict):
+        raise ScenarioError("Either annual_expense or expense is required.")
+    return sum(
+        _number(expense, field, integer=True) for field in EXPENSE_FIELDS
+    )
+
+
+def parse_scenarios(scenarios):
+    """
+    Turn scenario dicts into input columns.  Returns (columns, errors)
+    where errors maps scenario index to message.
+    """
+    if not isinstance(scenarios, list) or not scenarios:
+        raise ScenarioError("Expected a non-empty list of scenarios.")
+    if len(scenarios) > MAX_SCENARIOS:
+        raise ScenarioError(
+            "At most %d scenarios can be quoted per request." % MAX_SCENARIOS
+        )
+
+    # Rounded as Result stores and quotes it.
+    default_debt_rate = round(rates.get_cached_debt_rate(), 2)
+    columns = {
+        'annual_rent': [],
+        'annual_expense': [],
+        'cap_rate': [],
+        'debt_rate': [],
+        'term': [],
+        'dscr': [],
+    }
+    errors = {}
+    for i, scenario in enumerate(scenarios):
+        if not isinstance(scenario, dict):
+            errors[i] = "Scenarios must be objects."
+            continue
+        try:
+            row = {
+                'annual_rent': _annual_rent(scenario),
+                'annual_expense': _annual_expense(scenario),
+                'cap_rate': _number(
+                    scenario, 'cap_rate', minimum=MIN_CAP_RATE, maximum=MAX_RATE,
+                ),
+                'debt_rate': _number(scenario, 'debt_rate', maximum=MAX_RATE)
+                    if 'debt_rate' in scenario else default_debt_rate,
+                'term': _number(
+                    scenario, 'term', minimum=1, maximum=MAX_TERM, integer=True,
+                ) if 'term' in scenario else engine.TERM_MONTHS,
+                'dscr': _number(
+                    scenario, 'dscr', minimum=MIN_DSCR, maximum=MAX_DSCR,
+                ) if 'dscr' in scenario else engine.DSCR,
+            }
+        except ScenarioError as e:
+            errors[i] = str(e)
+            continue
+        for field, value in row.items():
+            columns[field].append(value)
+    return columns, errors
+
+
+def quote_scenarios(columns):
+    """
+    Size every scenario in one engine pass.  Returns a list of dicts.
+    """
+    computed = engine.underwrite(
+        columns['annual_rent'],
+        columns['annual_expense'],
+        columns['cap_rate'],
+        np.asarray(columns['debt_rate']),
+        term=np.asarray(columns['term']),
+        dscr=np.asarray(columns['dscr']),
+    )
+    quotes = []
+    for i in range(len(columns['annual_rent'])):
+        quote = {
+            'annual_property_rent': int(columns['annual_rent'][i]),
+            'annual_expense': int(columns['annual_expense'][i]),
+            'cap_rate': columns['cap_rate'][i],
+            'debt_rate': round(columns['debt_rate'][i], 4),
+            'term': int(columns['term'][i]),
+            'dscr': columns['dscr'][i],
+        }
+        for field in engine.RESULT_FIELDS:
+            quote[field] = int(computed[field][i])
+        quotes.append(quote)
+    return quotes